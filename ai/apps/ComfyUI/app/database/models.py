@@ -1,3 +1,4 @@
+from sqlalchemy import Column, Float, Integer, String, Text
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,4 +12,30 @@ def to_dict(obj):
         if (val := getattr(obj, field))
     }
 
-# TODO: Define models here
+
+class PromptHistory(Base):
+    """
+    A completed prompt. `data` holds the JSON encoded history entry exactly as
+    returned by the /history endpoints.
+    """
+    __tablename__ = "prompt_history"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, nullable=False, unique=True, index=True)
+    completed_at = Column(Float, nullable=False, index=True)
+    status = Column(String, nullable=True)
+    data = Column(Text, nullable=False)
+
+
+class PromptQueueItem(Base):
+    """
+    A prompt that has been queued but not completed yet, kept so that pending
+    work can be recovered after a crash or restart. Sensitive extra data (API
+    keys) is never stored.
+    """
+    __tablename__ = "prompt_queue"
+
+    prompt_id = Column(String, primary_key=True)
+    number = Column(Float, nullable=False)
+    created_at = Column(Float, nullable=False)
+    data = Column(Text, nullable=False)
@@ -0,0 +1,415 @@
+"""
+In-memory index of the files under the model folders.
+
+folder_paths.get_filename_list normally validates its cache with a stat of
+every directory it has seen and rescans all roots of a folder when any of them
+changed. With --model-index the listings are instead kept by a
+ModelFolderIndex that is updated incrementally while the server runs:
+
+- inotify (Linux): one watch per directory, file and directory creations,
+  deletions and renames are applied as they happen. Lookups never touch the
+  disk.
+- polling: a background thread stats the known directories every
+  POLL_INTERVAL seconds and rescans only the ones whose mtime changed. Used
+  where inotify is unavailable, when the watch limit is reached, and for
+  network mounts (inotify does not see changes made by other machines).
+
+A root is scanned the first time one of its listings is requested.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+from collections.abc import Collection
+
+POLL_INTERVAL = 5.0
+EXCLUDED_DIR_NAMES = (".git",)
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class RootIndex:
+    """The files of one model folder root, by directory relative to the root."""
+    def __init__(self, path: str):
+        self.path = path
+        self.exists = False
+        self.polled = False
+        self.generation = 0
+        # relative dir ("" for the root) -> file names in it
+        self.dirs: dict[str, set[str]] = {}
+        # relative dir -> (st_mtime_ns, (st_dev, st_ino)), used by polling and loop detection
+        self.stats: dict[str, tuple[int, tuple[int, int]]] = {}
+        self.listing: list[str] | None = None
+
+    def full_path(self, rel_dir: str) -> str:
+        return os.path.join(self.path, rel_dir) if rel_dir else self.path
+
+    def files(self) -> list[str]:
+        if self.listing is None:
+            self.listing = [os.path.join(d, f) if d else f for d, names in self.dirs.items() for f in names]
+        return self.listing
+
+    def changed(self) -> None:
+        self.generation += 1
+        self.listing = None
+
+    def drop_tree(self, rel_dir: str) -> list[str]:
+        """Forgets rel_dir and everything below it. Returns the dropped directories."""
+        prefix = rel_dir + os.sep
+        dropped = [d for d in self.dirs if d == rel_dir or d.startswith(prefix)]
+        for d in dropped:
+            del self.dirs[d]
+            self.stats.pop(d, None)
+        return dropped
+
+
+class InotifyWatcher:
+    """Applies inotify events to the roots of a ModelFolderIndex on a background thread."""
+    def __init__(self, index: ModelFolderIndex):
+        self.index = index
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # A directory shared by overlapping roots has a single watch descriptor
+        self.watches: dict[int, set[tuple[RootIndex, str]]] = {}
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="model_index_inotify", daemon=True)
+        self.thread.start()
+
+    def watch(self, root: RootIndex, rel_dir: str) -> bool:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root.full_path(rel_dir)), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logging.warning("Model index: inotify watch limit reached (fs.inotify.max_user_watches), polling {} instead.".format(root.path))
+            return False
+        self.watches.setdefault(wd, set()).add((root, rel_dir))
+        return True
+
+    def unwatch(self, root: RootIndex, rel_dirs: Collection[str]) -> None:
+        rel_dirs = set(rel_dirs)
+        for wd, targets in list(self.watches.items()):
+            remaining = {(r, d) for r, d in targets if r is not root or d not in rel_dirs}
+            if remaining:
+                self.watches[wd] = remaining
+            else:
+                del self.watches[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def close(self) -> None:
+        self.running = False
+        self.thread.join()
+        os.close(self.fd)
+
+    def run(self) -> None:
+        while self.running:
+            ready, _, _ = select.select([self.fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                continue
+            with self.index.lock:
+                self.apply(data)
+
+    def apply(self, data: bytes) -> None:
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logging.warning("Model index: inotify queue overflowed, rescanning.")
+                for root in list(self.index.roots.values()):
+                    self.index.rescan(root)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            for root, rel_dir in list(self.watches.get(wd, ())):
+                if rel_dir not in root.dirs:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    if rel_dir == "":
+                        # The root itself went away, it is rescanned when it shows up again
+                        self.unwatch(root, root.drop_tree(""))
+                        root.exists = False
+                        root.changed()
+                    continue
+                self.index.entry_changed(root, rel_dir, name, is_dir=bool(mask & IN_ISDIR),
+                                         added=bool(mask & (IN_CREATE | IN_MOVED_TO)))
+
+
+class ModelFolderIndex:
+    """
+    Usage:
+        index = ModelFolderIndex("auto")
+        files = index.filename_list("checkpoints", paths, extensions)
+
+    mode: "inotify", "poll" or "auto" (inotify when available).
+    """
+    def __init__(self, mode: str = "auto", poll_interval: float = POLL_INTERVAL,
+                 excluded_dir_names: Collection[str] = EXCLUDED_DIR_NAMES):
+        self.lock = threading.RLock()
+        self.roots: dict[str, RootIndex] = {}
+        self.excluded_dir_names = set(excluded_dir_names)
+        self.poll_interval = poll_interval
+        # folder name -> (key of the roots/extensions/generations it was built from, sorted files)
+        self.folder_lists: dict[str, tuple[tuple, list[str]]] = {}
+        self.inotify: InotifyWatcher | None = None
+        self.poll_thread: threading.Thread | None = None
+        self.stop = threading.Event()
+
+        if mode not in ("auto", "inotify", "poll"):
+            raise ValueError(f"Unknown model index mode: {mode}")
+        if mode != "poll" and sys.platform.startswith("linux"):
+            try:
+                self.inotify = InotifyWatcher(self)
+            except (OSError, AttributeError) as e:
+                logging.warning(f"Model index: inotify unavailable ({e}), falling back to polling.")
+        elif mode == "inotify":
+            logging.warning("Model index: inotify is only available on Linux, falling back to polling.")
+
+    @property
+    def mode(self) -> str:
+        return "poll" if self.inotify is None else "inotify"
+
+    def close(self) -> None:
+        self.stop.set()
+        if self.inotify is not None:
+            self.inotify.close()
+        if self.poll_thread is not None:
+            self.poll_thread.join()
+
+    def filename_list(self, folder_name: str, paths: Collection[str], extensions: Collection[str]) -> list[str]:
+        """Sorted relative paths of the files under paths with one of extensions (all files if empty)."""
+        with self.lock:
+            roots = [self.get_root(path) for path in paths]
+            key = (tuple(paths), frozenset(extensions), tuple(root.generation for root in roots))
+            cached = self.folder_lists.get(folder_name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+            files = set()
+            for root in roots:
+                root_files = root.files()
+                if len(extensions) == 0:
+                    files.update(root_files)
+                else:
+                    files.update(f for f in root_files if os.path.splitext(f)[-1].lower() in extensions)
+            result = sorted(files)
+            self.folder_lists[folder_name] = (key, result)
+            return result
+
+    def get_root(self, path: str) -> RootIndex:
+        root = self.roots.get(path)
+        if root is None:
+            root = RootIndex(path)
+            self.roots[path] = root
+        if not root.exists and os.path.isdir(path):
+            self.rescan(root)
+        return root
+
+    def rescan(self, root: RootIndex) -> None:
+        if self.inotify is not None:
+            self.inotify.unwatch(root, list(root.dirs))
+        root.dirs.clear()
+        root.stats.clear()
+        root.exists = os.path.isdir(root.path)
+        if self.inotify is None:
+            self.start_polling(root)
+        if root.exists:
+            logging.debug("model index: scanning {}".format(root.path))
+            self.scan_tree(root, "", set())
+        root.changed()
+
+    def scan_tree(self, root: RootIndex, rel_dir: str, visited: set[tuple[int, int]]) -> None:
+        """Adds rel_dir and everything below it, following symlinks like recursive_search."""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            full = root.full_path(current)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            inode = (st.st_dev, st.st_ino)
+            if inode in visited:
+                logging.warning("Model index: skipping symlink loop at {}".format(full))
+                continue
+            visited.add(inode)
+            # Watch before listing so nothing created in between is missed
+            if self.inotify is not None and not root.polled and not self.inotify.watch(root, current):
+                self.start_polling(root)
+            names, subdirs = self.list_dir(full)
+            if names is None:
+                continue
+            root.dirs[current] = names
+            root.stats[current] = (st.st_mtime_ns, inode)
+            stack.extend(os.path.join(current, d) if current else d for d in subdirs)
+
+    def list_dir(self, full: str) -> tuple[set[str] | None, list[str]]:
+        names = set()
+        subdirs = []
+        try:
+            with os.scandir(full) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if entry.name not in self.excluded_dir_names:
+                            subdirs.append(entry.name)
+                    else:
+                        names.add(entry.name)
+        except OSError:
+            logging.warning("Warning: Unable to access {}. Skipping this path.".format(full))
+            return None, []
+        return names, subdirs
+
+    def entry_changed(self, root: RootIndex, rel_dir: str, name: str, is_dir: bool, added: bool) -> None:
+        rel_path = os.path.join(rel_dir, name) if rel_dir else name
+        if added:
+            # Symlinks to directories are not reported as directories
+            if is_dir or os.path.isdir(root.full_path(rel_path)):
+                if name not in self.excluded_dir_names and rel_path not in root.dirs:
+                    visited = {inode for _, inode in root.stats.values()}
+                    self.scan_tree(root, rel_path, visited)
+            else:
+                root.dirs[rel_dir].add(name)
+        else:
+            if rel_path in root.dirs:
+                dropped = root.drop_tree(rel_path)
+                if self.inotify is not None:
+                    self.inotify.unwatch(root, dropped)
+            root.dirs[rel_dir].discard(name)
+        root.changed()
+
+    def start_polling(self, root: RootIndex) -> None:
+        root.polled = True
+        if self.poll_thread is None:
+            self.poll_thread = threading.Thread(target=self.poll_loop, name="model_index_poll", daemon=True)
+            self.poll_thread.start()
+
+    def poll_loop(self) -> None:
+        while not self.stop.wait(self.poll_interval):
+            with self.lock:
+                roots = [root for root in self.roots.values() if root.polled]
+            for root in roots:
+                self.poll(root)
+
+    def poll(self, root: RootIndex) -> None:
+        """Rescans the directories of root whose mtime changed since the last poll."""
+        with self.lock:
+            known = list(root.stats.items())
+        changed = []
+        for rel_dir, (mtime_ns, _) in known:
+            try:
+                if os.stat(root.full_path(rel_dir)).st_mtime_ns != mtime_ns:
+                    changed.append(rel_dir)
+            except OSError:
+                changed.append(rel_dir)
+        if not changed:
+            return
+
+        with self.lock:
+            if not os.path.isdir(root.path):
+                root.drop_tree("")
+                root.exists = False
+                root.changed()
+                return
+            for rel_dir in changed:
+                if rel_dir not in root.dirs:
+                    continue
+                full = root.full_path(rel_dir)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    root.drop_tree(rel_dir)
+                    continue
+                names, subdirs = self.list_dir(full)
+                if names is None:
+                    continue
+                root.dirs[rel_dir] = names
+                root.stats[rel_dir] = (st.st_mtime_ns, (st.st_dev, st.st_ino))
+                children = {os.path.join(rel_dir, d) if rel_dir else d for d in subdirs}
+                prefix = rel_dir + os.sep if rel_dir else ""
+                for d in [d for d in root.dirs if d.startswith(prefix) and d != rel_dir and os.sep not in d[len(prefix):]]:
+                    if d not in children:
+                        root.drop_tree(d)
+                visited = {inode for _, inode in root.stats.values()}
+                for d in children:
+                    if d not in root.dirs:
+                        self.scan_tree(root, d, visited)
+            root.changed()
+
+
+def benchmark_tree(base: str, dirs: int, files_per_dir: int) -> int:
+    """Creates dirs folders of files_per_dir empty .safetensors files under base. Returns the file count."""
+    for d in range(dirs):
+        folder = os.path.join(base, f"group_{d // 50:03}", f"set_{d:04}")
+        os.makedirs(folder, exist_ok=True)
+        for f in range(files_per_dir):
+            with open(os.path.join(folder, f"model_{f:04}.safetensors"), "w"):
+                pass
+    return dirs * files_per_dir
+
+
+if __name__ == "__main__":
+    import tempfile
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import folder_paths
+
+    for dirs, per_dir in ((100, 100), (400, 100)):
+        with tempfile.TemporaryDirectory() as base:
+            count = benchmark_tree(base, dirs, per_dir)
+            exts = folder_paths.supported_pt_extensions
+
+            start = time.perf_counter()
+            files, mtimes = folder_paths.recursive_search(base, excluded_dir_names=[".git"])
+            folder_paths.filter_files_extensions(files, exts)
+            scan = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(20):
+                for folder in mtimes:
+                    os.path.getmtime(folder)
+            validate = (time.perf_counter() - start) / 20
+
+            for mode in ("inotify", "poll"):
+                index = ModelFolderIndex(mode)
+                start = time.perf_counter()
+                index.filename_list("bench", [base], exts)
+                first = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in range(20):
+                    index.filename_list("bench", [base], exts)
+                lookup = (time.perf_counter() - start) / 20
+                index.close()
+                print(f"{count} files in {dirs} dirs: recursive_search {scan * 1000:.1f} ms, "  # noqa: T201
+                      f"mtime validation {validate * 1000:.2f} ms/call, {index.mode} index: first {first * 1000:.1f} ms, "
+                      f"lookup {lookup * 1000:.4f} ms/call")
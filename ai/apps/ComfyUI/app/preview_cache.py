@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from io import BytesIO
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+# Total size of encoded previews kept in memory.
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# PIL releases the GIL while decoding/encoding, so a small thread pool keeps
+# transcoding off the event loop without the overhead of worker processes.
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class Preview(NamedTuple):
+    body: bytes
+    content_type: str
+    etag: str
+    last_modified: str
+
+
+class PreviewValidator(NamedTuple):
+    """Cache key and conditional request validators of a preview, known without rendering it."""
+    key: tuple
+    etag: str
+    last_modified: str
+
+
+def render_preview(file: str, preview: Optional[str], channel: str) -> tuple[bytes, str]:
+    """
+    Transcode an image file the way /view serves it. Returns (body, content_type).
+
+    preview is the raw "format;quality" query value or None and channel the raw
+    channel query value ('' when absent). Without a preview only the "rgb" and
+    "a" channels are transcodes; anything else is served as the file itself.
+    """
+    with Image.open(file) as img:
+        buffer = BytesIO()
+        if preview is not None:
+            preview_info = preview.split(';')
+            image_format = preview_info[0]
+            if image_format not in ['webp', 'jpeg'] or 'a' in channel:
+                image_format = 'webp'
+
+            quality = 90
+            if preview_info[-1].isdigit():
+                quality = int(preview_info[-1])
+
+            if image_format in ['jpeg'] or channel == 'rgb':
+                img = img.convert("RGB")
+            img.save(buffer, format=image_format, quality=quality)
+            return buffer.getvalue(), f'image/{image_format}'
+
+        if channel == 'rgb':
+            if img.mode == "RGBA":
+                r, g, b, a = img.split()
+                new_img = Image.merge('RGB', (r, g, b))
+            else:
+                new_img = img.convert("RGB")
+            new_img.save(buffer, format='PNG')
+            return buffer.getvalue(), 'image/png'
+
+        if channel == 'a':
+            if img.mode == "RGBA":
+                _, _, _, a = img.split()
+            else:
+                a = Image.new('L', img.size, 255)
+
+            # alpha img
+            alpha_img = Image.new('RGBA', img.size)
+            alpha_img.putalpha(a)
+            alpha_img.save(buffer, format='PNG')
+            return buffer.getvalue(), 'image/png'
+
+    raise ValueError(f"Unsupported channel '{channel}'")
+
+
+def is_not_modified(request_headers, preview: Preview | PreviewValidator) -> bool:
+    """Evaluates If-None-Match / If-Modified-Since against a preview or its validator."""
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or preview.etag in tags or f"W/{preview.etag}" in tags
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(preview.last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class PreviewCache:
+    """
+    Size bounded LRU of transcoded /view previews keyed by
+    (path, mtime, size, format, quality, channel).
+
+    Misses are rendered in a thread pool and concurrent requests for the same
+    preview share a single render.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_CACHE_BYTES, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries: OrderedDict[tuple, Preview] = OrderedDict()
+        self.pending: dict[tuple, asyncio.Future] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preview")
+
+    def _lookup(self, key) -> Optional[Preview]:
+        with self.lock:
+            preview = self.entries.get(key)
+            if preview is not None:
+                self.entries.move_to_end(key)
+            return preview
+
+    def _store(self, key, preview: Preview):
+        size = len(preview.body)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = preview
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted.body)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def validator(self, file: str, preview: Optional[str], channel: str) -> PreviewValidator:
+        """Stats the file to build the ETag and Last-Modified a rendered preview would get."""
+        stat = os.stat(file)
+        key = (os.path.abspath(file), stat.st_mtime_ns, stat.st_size, preview, channel)
+        etag = '"{}"'.format(hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest())
+        return PreviewValidator(key, etag, formatdate(stat.st_mtime, usegmt=True))
+
+    async def get(self, file: str, preview: Optional[str], channel: str, validator: Optional[PreviewValidator] = None) -> Preview:
+        if validator is None:
+            validator = self.validator(file, preview, channel)
+        key = validator.key
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        # The render is its own task so a client disconnecting mid render
+        # doesn't cancel it for other requests waiting on the same preview.
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._render(validator, file, preview, channel))
+            self.pending[key] = task
+        return await asyncio.shield(task)
+
+    async def _render(self, validator: PreviewValidator, file, preview, channel) -> Preview:
+        try:
+            loop = asyncio.get_running_loop()
+            body, content_type = await loop.run_in_executor(self.executor, render_preview, file, preview, channel)
+            result = Preview(body, content_type, validator.etag, validator.last_modified)
+            self._store(validator.key, result)
+            return result
+        finally:
+            del self.pending[validator.key]
@@ -0,0 +1,100 @@
+import json
+import logging
+import time
+
+from sqlalchemy import delete, func, select
+
+from app.database.db import create_session
+from app.database.models import PromptHistory, PromptQueueItem
+
+
+def _dumps(value):
+    # History entries are already sent to clients as JSON; anything odd a
+    # custom node put in its ui output is stored as its string form.
+    return json.dumps(value, default=str)
+
+
+class PromptStore:
+    """
+    Database backed storage for the prompt history and pending queue items.
+
+    Every method opens its own short lived session so it can be called from the
+    server event loop and the prompt worker thread without holding the
+    PromptQueue mutex.
+    """
+    def __init__(self, max_history_size=None, session_factory=create_session):
+        self.max_history_size = max_history_size
+        self.session_factory = session_factory
+
+    def add_queue_item(self, item):
+        number, prompt_id = item[0], item[1]
+        # item[5] holds sensitive extra data (API keys) and is never persisted
+        with self.session_factory() as session:
+            session.merge(PromptQueueItem(prompt_id=prompt_id, number=number, created_at=time.time(), data=_dumps(list(item[:5]))))
+            session.commit()
+
+    def remove_queue_item(self, prompt_id):
+        with self.session_factory() as session:
+            session.execute(delete(PromptQueueItem).where(PromptQueueItem.prompt_id == prompt_id))
+            session.commit()
+
+    def clear_queue(self, keep_prompt_ids=()):
+        with self.session_factory() as session:
+            session.execute(delete(PromptQueueItem).where(PromptQueueItem.prompt_id.not_in(list(keep_prompt_ids))))
+            session.commit()
+
+    def get_queue_items(self):
+        """Returns the stored queue items in the order they were queued, without sensitive data."""
+        with self.session_factory() as session:
+            rows = session.scalars(select(PromptQueueItem).order_by(PromptQueueItem.created_at)).all()
+            items = []
+            for row in rows:
+                try:
+                    items.append(tuple(json.loads(row.data)) + ({},))
+                except ValueError:
+                    logging.warning("Skipping unreadable queue item {}".format(row.prompt_id))
+            return items
+
+    def add_history(self, prompt_id, entry):
+        status = entry.get("status") or {}
+        with self.session_factory() as session:
+            session.execute(delete(PromptHistory).where(PromptHistory.prompt_id == prompt_id))
+            session.add(PromptHistory(prompt_id=prompt_id, completed_at=time.time(), status=status.get("status_str"), data=_dumps(entry)))
+            session.execute(delete(PromptQueueItem).where(PromptQueueItem.prompt_id == prompt_id))
+            if self.max_history_size is not None:
+                cutoff = select(PromptHistory.id).order_by(PromptHistory.id.desc()).offset(self.max_history_size).limit(1).scalar_subquery()
+                session.execute(delete(PromptHistory).where(PromptHistory.id <= cutoff))
+            session.commit()
+
+    def count_history(self):
+        with self.session_factory() as session:
+            return session.scalar(select(func.count()).select_from(PromptHistory))
+
+    def get_history(self, prompt_id=None, max_items=None, offset=-1):
+        """
+        Same semantics as PromptQueue.get_history: entries in completion
+        order, a negative offset with max_items returns the latest max_items.
+        """
+        with self.session_factory() as session:
+            query = select(PromptHistory.prompt_id, PromptHistory.data)
+            if prompt_id is not None:
+                query = query.where(PromptHistory.prompt_id == prompt_id)
+            else:
+                if offset < 0 and max_items is not None:
+                    offset = session.scalar(select(func.count()).select_from(PromptHistory)) - max_items
+                query = query.order_by(PromptHistory.id)
+                if offset > 0:
+                    query = query.offset(offset)
+                if max_items is not None:
+                    query = query.limit(max_items)
+            return {row.prompt_id: json.loads(row.data) for row in session.execute(query)}
+
+    def delete_history(self, prompt_id):
+        with self.session_factory() as session:
+            session.execute(delete(PromptHistory).where(PromptHistory.prompt_id == prompt_id))
+            session.commit()
+
+    def wipe_history(self):
+        with self.session_factory() as session:
+            session.execute(delete(PromptHistory))
+            session.commit()
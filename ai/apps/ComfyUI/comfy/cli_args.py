@@ -106,6 +106,7 @@ cache_group.add_argument("--cache-classic", action="store_true", help="Use the o
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
 cache_group.add_argument("--cache-none", action="store_true", help="Reduced RAM/VRAM usage at the expense of executing every node for each run.")
 cache_group.add_argument("--cache-ram", nargs='?', const=4.0, type=float, default=0, help="Use RAM pressure caching with the specified headroom threshold. If available RAM drops below the threhold the cache remove large items to free RAM. Default 4GB")
+cache_group.add_argument("--cache-disk", nargs='?', const=16.0, type=float, default=0, help="Use RAM pressure caching with a 4GB headroom threshold, but spill removed items to an on-disk cache in the temp directory of at most N GB instead of discarding them. Default 16GB")
 
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
@@ -165,6 +166,10 @@ parser.add_argument("--quick-test-for-ci", action="store_true", help="Quick test
 parser.add_argument("--windows-standalone-build", action="store_true", help="Windows standalone build: Enable convenient things that most people using the standalone windows build will probably enjoy (like auto opening the page on startup).")
 
 parser.add_argument("--disable-metadata", action="store_true", help="Disable saving prompt metadata in files.")
+parser.add_argument("--async-image-save", action="store_true", help="Let the next node run while the images of SaveImage and PreviewImage are still being encoded. The files are complete before the prompt shows up in the history. Ignored with --prompt-workers.")
+parser.add_argument("--model-index", nargs='?', const="auto", default=None, choices=["auto", "inotify", "poll"], help="Keep the model folder listings in an index that is updated as files are added or removed, instead of checking the folders for changes on every lookup. Uses inotify on Linux, otherwise (or with 'poll', e.g. for network mounts changed from other machines) polls the folders in the background.")
+parser.add_argument("--lazy-nodes", action="store_true", help="Register the built-in extra and API nodes from a cached node manifest and only import their modules when a node is used. The manifest is rebuilt when ComfyUI, its comfy packages or the custom nodes change.")
+parser.add_argument("--prompt-workers", type=int, default=0, metavar="N", help="Execute prompts on N worker processes, each with its own model cache. Queued prompts go to the worker that last used the same models. 0 (default) runs prompts in the server process.")
 parser.add_argument("--disable-all-custom-nodes", action="store_true", help="Disable loading all custom nodes.")
 parser.add_argument("--whitelist-custom-nodes", type=str, nargs='+', default=[], help="Specify custom node folders to load even when --disable-all-custom-nodes is enabled.")
 parser.add_argument("--disable-api-nodes", action="store_true", help="Disable loading all api nodes. Also prevents the frontend from communicating with the internet.")
@@ -224,6 +229,7 @@ database_default_path = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "user", "comfyui.db")
 )
 parser.add_argument("--database-url", type=str, default=f"sqlite:///{database_default_path}", help="Specify the database URL, e.g. for an in-memory database you can use 'sqlite:///:memory:'.")
+parser.add_argument("--persistent-history", action="store_true", help="Keep the prompt history and pending queue in the database so they survive restarts. Prompts still pending when ComfyUI stopped are queued again on startup.")
 
 if comfy.options.args_parsing:
     args = parser.parse_args()
@@ -1,9 +1,10 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from fractions import Fraction
-from typing import Optional, Union, IO
+from typing import Iterator, Optional, Union, IO
 import io
 import av
+import torch
 from .._util import VideoContainer, VideoCodec, VideoComponents
 
 class VideoInput(ABC):
@@ -34,6 +35,26 @@ class VideoInput(ABC):
         """
         pass
 
+    def iter_frames(self, chunk_size: int = 16, start: int = 0, end: Optional[int] = None, stride: int = 1,
+                    size: Optional[tuple[int, int]] = None, dtype: torch.dtype = torch.float32) -> Iterator[torch.Tensor]:
+        """
+        Iterates over the frames start, start + stride, ... before end in
+        (chunk_size, H, W, 3) tensors, resized to size = (width, height) if given.
+        Floating point frames are in 0..1, uint8 frames in 0..255.
+
+        Default implementation slices the images of `get_components()`.
+        Subclasses that decode frames (e.g. `VideoFromFile`) override this to
+        only hold chunk_size frames in memory.
+        """
+        images = self.get_components().images[start:end:stride]
+        for i in range(0, images.shape[0], chunk_size):
+            chunk = images[i:i + chunk_size]
+            if size is not None:
+                chunk = torch.nn.functional.interpolate(chunk.movedim(-1, 1), size=(size[1], size[0]), mode="bilinear").movedim(1, -1)
+            if dtype == torch.uint8:
+                chunk = (chunk * 255).round().clamp(0, 255)
+            yield chunk.to(dtype)
+
     def get_stream_source(self) -> Union[str, io.BytesIO]:
         """
         Get a streamable source for the video. This allows processing without
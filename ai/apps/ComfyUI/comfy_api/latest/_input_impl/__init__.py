@@ -1,7 +1,8 @@
-from .video_types import VideoFromFile, VideoFromComponents
+from .video_types import VideoFromFile, VideoFromComponents, save_frames_to
 
 __all__ = [
     # Implementations
     "VideoFromFile",
     "VideoFromComponents",
+    "save_frames_to",
 ]
@@ -1,17 +1,48 @@
 from __future__ import annotations
 from av.container import InputContainer
 from av.subtitles.stream import SubtitleStream
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from fractions import Fraction
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Union
 from .._input import AudioInput, VideoInput
 import av
 import io
+import itertools
 import json
 import numpy as np
 import math
+import os
 import torch
 from .._util import VideoContainer, VideoCodec, VideoComponents
 
+# FFmpeg muxer of each container
+VIDEO_CONTAINER_MUXERS = {
+    "mp4": "mp4",
+    "mov": "mov",
+    "mkv": "matroska",
+    "webm": "webm",
+}
+
+# FFmpeg codec name of each codec, where it differs
+VIDEO_CODEC_NAMES = {
+    "h265": "hevc",
+}
+
+# Codec -> (FFmpeg encoder, pixel format, containers it can be written to)
+VIDEO_ENCODERS = {
+    VideoCodec.H264: ("h264", "yuv420p", (VideoContainer.MP4, VideoContainer.MOV, VideoContainer.MKV)),
+    VideoCodec.H265: ("libx265", "yuv420p", (VideoContainer.MP4, VideoContainer.MOV, VideoContainer.MKV)),
+    VideoCodec.VP9: ("libvpx-vp9", "yuv420p", (VideoContainer.WEBM, VideoContainer.MKV, VideoContainer.MP4)),
+    VideoCodec.FFV1: ("ffv1", "bgr0", (VideoContainer.MKV,)),
+    VideoCodec.PRORES: ("prores_ks", "yuv422p10le", (VideoContainer.MOV, VideoContainer.MKV)),
+    VideoCodec.MJPEG: ("mjpeg", "yuvj420p", (VideoContainer.MKV, VideoContainer.MOV)),
+}
+
+# Frames converted per task when encoding, and tasks in flight per worker
+ENCODE_BATCH_SIZE = 8
+ENCODE_QUEUE_DEPTH = 2
+
 
 def container_to_output_format(container_format: str | None) -> str | None:
     """
@@ -47,11 +78,155 @@ def get_open_write_kwargs(
             to_format = container_format.lower()
         elif isinstance(to_format, str):
             to_format = to_format.lower()
+        to_format = VIDEO_CONTAINER_MUXERS.get(to_format, to_format)
         open_kwargs["format"] = container_to_output_format(to_format)
 
     return open_kwargs
 
 
+def resolve_video_format(format: VideoContainer | str, codec: VideoCodec | str) -> tuple[VideoContainer, VideoCodec]:
+    """The container and codec a video is encoded with, for AUTO and checked to go together."""
+    format = VideoContainer(format)
+    codec = VideoCodec(codec)
+    if codec == VideoCodec.AUTO:
+        codec = next((c for c, encoder in VIDEO_ENCODERS.items() if format in encoder[2]), VideoCodec.H264)
+    if format == VideoContainer.AUTO:
+        format = VideoContainer.get_default(codec)
+    if format not in VIDEO_ENCODERS[codec][2]:
+        raise ValueError(f"{codec.value} video can't be saved as {format.value}, use one of: "
+                         + ", ".join(c.value for c in VIDEO_ENCODERS[codec][2]))
+    return format, codec
+
+
+def iter_frame_batches(frames: Union[torch.Tensor, Iterable[torch.Tensor]], batch_size: int) -> Iterator[torch.Tensor]:
+    """
+    Splits (N, H, W, 3) tensors into batches of at most batch_size frames, and
+    groups single (H, W, 3) frames into batches.
+    """
+    if isinstance(frames, torch.Tensor):
+        frames = [frames]
+    single = []
+    for item in frames:
+        if item.ndim == 3:
+            single.append(item)
+            if len(single) == batch_size:
+                yield torch.stack(single)
+                single = []
+            continue
+        if single:
+            yield torch.stack(single)
+            single = []
+        for i in range(0, item.shape[0], batch_size):
+            yield item[i:i + batch_size]
+    if single:
+        yield torch.stack(single)
+
+
+def convert_frames(batch: torch.Tensor, pix_fmt: str) -> list[av.VideoFrame]:
+    """Converts a batch of 0..1 float or uint8 RGB frames to video frames in pix_fmt."""
+    if batch.is_floating_point():
+        batch = (batch * 255).clamp(0, 255).byte()
+    images = batch.cpu().numpy()  # shape: (B, H, W, 3)
+    return [av.VideoFrame.from_ndarray(img, format='rgb24').reformat(format=pix_fmt) for img in images]
+
+
+def save_frames_to(
+    path: str | io.BytesIO,
+    frames: Union[torch.Tensor, Iterable[torch.Tensor]],
+    frame_rate: Fraction,
+    audio: Optional[AudioInput] = None,
+    format: VideoContainer = VideoContainer.AUTO,
+    codec: VideoCodec = VideoCodec.AUTO,
+    metadata: Optional[dict] = None,
+    workers: Optional[int] = None,
+):
+    """
+    Encodes a video from frames: an (N, H, W, 3) tensor, or an iterable of
+    (B, H, W, 3) or (H, W, 3) tensors (0..1 floats or uint8) that is consumed
+    while encoding, so frames can stream from e.g. VideoFromFile.iter_frames
+    without the whole clip being in memory.
+
+    Batches of frames are converted to the codec's pixel format on a pool of
+    workers threads while the encoder (running its own threads) encodes the
+    previous ones.
+    """
+    format, codec = resolve_video_format(format, codec)
+    encoder, pix_fmt, _ = VIDEO_ENCODERS[codec]
+    if workers is None:
+        workers = max(1, min(4, os.cpu_count() or 1))
+    open_kwargs = {"format": VIDEO_CONTAINER_MUXERS[format.value]}
+    if format in (VideoContainer.MP4, VideoContainer.MOV):
+        open_kwargs["options"] = {'movflags': 'use_metadata_tags'}
+
+    batches = iter_frame_batches(frames, ENCODE_BATCH_SIZE)
+    first = next(batches, None)
+    if first is None:
+        raise ValueError("No frames to save")
+
+    with av.open(path, mode='w', **open_kwargs) as output, ThreadPoolExecutor(max_workers=workers) as pool:
+        # Add metadata before writing any streams
+        if metadata is not None:
+            for key, value in metadata.items():
+                output.metadata[key] = json.dumps(value)
+
+        frame_rate = Fraction(round(frame_rate * 1000), 1000)
+        # Create a video stream
+        video_stream = output.add_stream(encoder, rate=frame_rate)
+        video_stream.width = first.shape[2]
+        video_stream.height = first.shape[1]
+        video_stream.pix_fmt = pix_fmt
+        # Let the encoder use all cores (FFmpeg defaults to one thread for most encoders)
+        video_stream.codec_context.thread_count = 0
+
+        # Create an audio stream
+        audio_sample_rate = 1
+        audio_stream: Optional[av.AudioStream] = None
+        if audio:
+            audio_sample_rate = int(audio['sample_rate'])
+            if format == VideoContainer.WEBM:
+                audio_stream = output.add_stream('libopus', rate=48000)
+            else:
+                audio_stream = output.add_stream('aac', rate=audio_sample_rate)
+
+        # Encode video, converting the next batches while the current one is encoded
+        frame_count = 0
+        pending = deque()
+
+        def encode(converted):
+            for frame in converted:
+                output.mux(video_stream.encode(frame))
+
+        for batch in itertools.chain([first], batches):
+            pending.append(pool.submit(convert_frames, batch, pix_fmt))
+            frame_count += batch.shape[0]
+            while len(pending) > workers * ENCODE_QUEUE_DEPTH:
+                encode(pending.popleft().result())
+        while pending:
+            encode(pending.popleft().result())
+
+        # Flush video
+        output.mux(video_stream.encode(None))
+
+        if audio_stream and audio:
+            waveform = audio['waveform']
+            waveform = waveform[:, :, :math.ceil((audio_sample_rate / frame_rate) * frame_count)]
+            frame = av.AudioFrame.from_ndarray(waveform.movedim(2, 1).reshape(1, -1).float().numpy(), format='flt', layout='mono' if waveform.shape[1] == 1 else 'stereo')
+            frame.sample_rate = audio_sample_rate
+            frame.pts = 0
+            output.mux(audio_stream.encode(frame))
+
+            # Flush encoder
+            output.mux(audio_stream.encode(None))
+
+
+def write_frame(out: torch.Tensor, img: np.ndarray):
+    """Writes an rgb24 frame into out, scaled to 0..1 if out is floating point."""
+    if out.is_floating_point():
+        torch.div(torch.from_numpy(img), 255.0, out=out)
+    else:
+        out.copy_(torch.from_numpy(img))
+
+
 class VideoFromFile(VideoInput):
     """
     Class representing video input from a file.
@@ -198,46 +373,152 @@ class VideoFromFile(VideoInput):
         with av.open(self.__file, mode='r') as container:
             return container.format.name
 
-    def get_components_internal(self, container: InputContainer) -> VideoComponents:
-        # Get video frames
-        frames = []
-        for frame in container.decode(video=0):
-            img = frame.to_ndarray(format='rgb24')  # shape: (H, W, 3)
-            img = torch.from_numpy(img) / 255.0  # shape: (H, W, 3)
-            frames.append(img)
+    def _decode_frames(self, container: InputContainer, start: int = 0, end: Optional[int] = None,
+                       stride: int = 1, size: Optional[tuple[int, int]] = None,
+                       audio_frames: Optional[list] = None) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        Yields (index, rgb24 frame) for the frames start, start + stride, ... before end,
+        decoded in one pass. Only the selected frames are converted (and resized to
+        size = (width, height)). With start > 0 the container is seeked to the keyframe
+        before start and indices come from the frame timestamps at the average frame
+        rate. The first audio stream's frames are appended to audio_frames if given.
+        """
+        video_stream = self._get_first_video_stream(container)
+        video_stream.thread_type = "AUTO"
+        streams = [video_stream]
+        audio_stream = None
+        if audio_frames is not None:
+            audio_stream = next((s for s in container.streams if s.type == 'audio'), None)
+            if audio_stream is not None:
+                streams.append(audio_stream)
+
+        rate = video_stream.average_rate
+        time_base = video_stream.time_base
+        first_pts = video_stream.start_time or 0
+        seeked = start > 0 and audio_stream is None and rate and time_base is not None
+        if seeked:
+            container.seek(first_pts + int(Fraction(start) / Fraction(rate) / time_base), stream=video_stream)
+
+        index = -1
+        for packet in container.demux(*streams):
+            if packet.stream is audio_stream:
+                for frame in packet.decode():
+                    audio_frames.append(frame.to_ndarray())  # shape: (channels, samples)
+                continue
+            for frame in packet.decode():
+                if seeked and frame.pts is not None:
+                    index = round((frame.pts - first_pts) * time_base * rate)
+                else:
+                    index += 1
+                if end is not None and index >= end:
+                    if audio_stream is None:
+                        return
+                    continue
+                if index < start or (index - start) % stride != 0:
+                    continue
+                if size is not None:
+                    frame = frame.reformat(width=size[0], height=size[1], format='rgb24')
+                yield index, frame.to_ndarray(format='rgb24')  # shape: (H, W, 3)
+
+    def _selected_frame_count(self, container: InputContainer, start: int, end: Optional[int], stride: int) -> int:
+        """Number of frames _decode_frames is expected to yield, from the stream metadata."""
+        video_stream = self._get_first_video_stream(container)
+        total = video_stream.frames
+        if not total and container.duration is not None and video_stream.average_rate:
+            total = int(round(container.duration / av.time_base * float(video_stream.average_rate)))
+        if not total:
+            return 0
+        return len(range(start, total if end is None else min(end, total), stride))
+
+    def _read_frames(self, container: InputContainer, start: int = 0, end: Optional[int] = None,
+                     stride: int = 1, size: Optional[tuple[int, int]] = None, dtype: torch.dtype = torch.uint8,
+                     audio_frames: Optional[list] = None) -> torch.Tensor:
+        # Decode straight into one tensor sized from the metadata, instead of
+        # stacking a list of per-frame tensors
+        capacity = max(self._selected_frame_count(container, start, end, stride), 1)
+        images = None
+        count = 0
+        for _, img in self._decode_frames(container, start, end, stride, size, audio_frames):
+            if images is None:
+                images = torch.empty((capacity,) + img.shape, dtype=dtype)
+            elif count == images.shape[0]:
+                images.resize_((count + max(count // 4, 16),) + img.shape)
+            write_frame(images[count], img)
+            count += 1
+
+        if images is None:
+            return torch.zeros(0, 3, 0, 0, dtype=dtype)
+        if count < images.shape[0]:
+            images.resize_((count,) + images.shape[1:])
+            images.untyped_storage().resize_(images.numel() * images.element_size())
+        return images
+
+    def get_frames(self, start: int = 0, end: Optional[int] = None, stride: int = 1,
+                   size: Optional[tuple[int, int]] = None, dtype: torch.dtype = torch.uint8) -> torch.Tensor:
+        """
+        Decodes the frames start, start + stride, ... before end into a single
+        (N, H, W, 3) tensor, resized to size = (width, height) if given.
 
-        images = torch.stack(frames) if len(frames) > 0 else torch.zeros(0, 3, 0, 0)
+        Returns:
+            uint8 frames by default (a quarter of the memory of float frames), or
+            frames of a floating point dtype scaled to 0..1 like get_components.
+        """
+        if isinstance(self.__file, io.BytesIO):
+            self.__file.seek(0)
+        with av.open(self.__file, mode='r') as container:
+            return self._read_frames(container, start, end, stride, size, dtype)
+
+    def iter_frames(self, chunk_size: int = 16, start: int = 0, end: Optional[int] = None, stride: int = 1,
+                    size: Optional[tuple[int, int]] = None, dtype: torch.dtype = torch.float32) -> Iterator[torch.Tensor]:
+        """
+        Decodes the selected frames (see get_frames) as they are consumed, in
+        (chunk_size, H, W, 3) tensors (the last one may be shorter), so a clip of
+        any length can be processed in chunk_size frames of memory.
+        """
+        if isinstance(self.__file, io.BytesIO):
+            self.__file.seek(0)
+        with av.open(self.__file, mode='r') as container:
+            chunk = None
+            count = 0
+            for _, img in self._decode_frames(container, start, end, stride, size):
+                if chunk is None:
+                    chunk = torch.empty((chunk_size,) + img.shape, dtype=dtype)
+                write_frame(chunk[count], img)
+                count += 1
+                if count == chunk_size:
+                    yield chunk
+                    chunk = None
+                    count = 0
+            if count > 0:
+                yield chunk[:count]
+
+    def get_components_internal(self, container: InputContainer) -> VideoComponents:
+        # Get video frames and the audio in a single pass over the container
+        audio_frames = []
+        images = self._read_frames(container, dtype=torch.float32, audio_frames=audio_frames)
 
         # Get frame rate
         video_stream = next(s for s in container.streams if s.type == 'video')
         frame_rate = Fraction(video_stream.average_rate) if video_stream and video_stream.average_rate else Fraction(1)
 
         # Get audio if available
-        audio = None
-        try:
-            container.seek(0)  # Reset the container to the beginning
-            for stream in container.streams:
-                if stream.type != 'audio':
-                    continue
-                assert isinstance(stream, av.AudioStream)
-                audio_frames = []
-                for packet in container.demux(stream):
-                    for frame in packet.decode():
-                        assert isinstance(frame, av.AudioFrame)
-                        audio_frames.append(frame.to_ndarray())  # shape: (channels, samples)
-                if len(audio_frames) > 0:
-                    audio_data = np.concatenate(audio_frames, axis=1)  # shape: (channels, total_samples)
-                    audio_tensor = torch.from_numpy(audio_data).unsqueeze(0)  # shape: (1, channels, total_samples)
-                    audio = AudioInput({
-                        "waveform": audio_tensor,
-                        "sample_rate": int(stream.sample_rate) if stream.sample_rate else 1,
-                    })
-        except StopIteration:
-            pass  # No audio stream
+        audio_stream = next((s for s in container.streams if s.type == 'audio'), None)
+        audio = self._audio_input(audio_stream, audio_frames)
 
         metadata = container.metadata
         return VideoComponents(images=images, audio=audio, frame_rate=frame_rate, metadata=metadata)
 
+    @staticmethod
+    def _audio_input(audio_stream, audio_frames: list) -> Optional[AudioInput]:
+        if audio_stream is None or len(audio_frames) == 0:
+            return None
+        audio_data = np.concatenate(audio_frames, axis=1)  # shape: (channels, total_samples)
+        audio_tensor = torch.from_numpy(audio_data).unsqueeze(0)  # shape: (1, channels, total_samples)
+        return AudioInput({
+            "waveform": audio_tensor,
+            "sample_rate": int(audio_stream.sample_rate) if audio_stream.sample_rate else 1,
+        })
+
     def get_components(self) -> VideoComponents:
         if isinstance(self.__file, io.BytesIO):
             self.__file.seek(0)  # Reset the BytesIO object to the beginning
@@ -258,16 +539,26 @@ class VideoFromFile(VideoInput):
             container_format = container.format.name
             video_encoding = container.streams.video[0].codec.name if len(container.streams.video) > 0 else None
             reuse_streams = True
-            if format != VideoContainer.AUTO and format not in container_format.split(","):
+            if format != VideoContainer.AUTO and VIDEO_CONTAINER_MUXERS[VideoContainer(format).value] not in container_format.split(","):
                 reuse_streams = False
-            if codec != VideoCodec.AUTO and codec != video_encoding and video_encoding is not None:
+            if codec != VideoCodec.AUTO and VIDEO_CODEC_NAMES.get(codec, codec) != video_encoding and video_encoding is not None:
                 reuse_streams = False
 
             if not reuse_streams:
-                components = self.get_components_internal(container)
-                video = VideoFromComponents(components)
-                return video.save_to(
+                # Re-encode, streaming the frames from the decoder into the encoder
+                video_stream = self._get_first_video_stream(container)
+                frame_rate = Fraction(video_stream.average_rate) if video_stream.average_rate else Fraction(1)
+                audio_stream = next((s for s in container.streams if s.type == 'audio'), None)
+                audio_frames = []
+                if audio_stream is not None:
+                    for packet in container.demux(audio_stream):
+                        for frame in packet.decode():
+                            audio_frames.append(frame.to_ndarray())  # shape: (channels, samples)
+                return save_frames_to(
                     path,
+                    self.iter_frames(dtype=torch.uint8),
+                    frame_rate,
+                    audio=self._audio_input(audio_stream, audio_frames),
                     format=format,
                     codec=codec,
                     metadata=metadata
@@ -327,57 +618,17 @@ class VideoFromComponents(VideoInput):
 
     def save_to(
         self,
-        path: str,
+        path: str | io.BytesIO,
         format: VideoContainer = VideoContainer.AUTO,
         codec: VideoCodec = VideoCodec.AUTO,
         metadata: Optional[dict] = None
     ):
-        if format != VideoContainer.AUTO and format != VideoContainer.MP4:
-            raise ValueError("Only MP4 format is supported for now")
-        if codec != VideoCodec.AUTO and codec != VideoCodec.H264:
-            raise ValueError("Only H264 codec is supported for now")
-        extra_kwargs = {}
-        if isinstance(format, VideoContainer) and format != VideoContainer.AUTO:
-            extra_kwargs["format"] = format.value
-        with av.open(path, mode='w', options={'movflags': 'use_metadata_tags'}, **extra_kwargs) as output:
-            # Add metadata before writing any streams
-            if metadata is not None:
-                for key, value in metadata.items():
-                    output.metadata[key] = json.dumps(value)
-
-            frame_rate = Fraction(round(self.__components.frame_rate * 1000), 1000)
-            # Create a video stream
-            video_stream = output.add_stream('h264', rate=frame_rate)
-            video_stream.width = self.__components.images.shape[2]
-            video_stream.height = self.__components.images.shape[1]
-            video_stream.pix_fmt = 'yuv420p'
-
-            # Create an audio stream
-            audio_sample_rate = 1
-            audio_stream: Optional[av.AudioStream] = None
-            if self.__components.audio:
-                audio_sample_rate = int(self.__components.audio['sample_rate'])
-                audio_stream = output.add_stream('aac', rate=audio_sample_rate)
-
-            # Encode video
-            for i, frame in enumerate(self.__components.images):
-                img = (frame * 255).clamp(0, 255).byte().cpu().numpy() # shape: (H, W, 3)
-                frame = av.VideoFrame.from_ndarray(img, format='rgb24')
-                frame = frame.reformat(format='yuv420p')  # Convert to YUV420P as required by h264
-                packet = video_stream.encode(frame)
-                output.mux(packet)
-
-            # Flush video
-            packet = video_stream.encode(None)
-            output.mux(packet)
-
-            if audio_stream and self.__components.audio:
-                waveform = self.__components.audio['waveform']
-                waveform = waveform[:, :, :math.ceil((audio_sample_rate / frame_rate) * self.__components.images.shape[0])]
-                frame = av.AudioFrame.from_ndarray(waveform.movedim(2, 1).reshape(1, -1).float().numpy(), format='flt', layout='mono' if waveform.shape[1] == 1 else 'stereo')
-                frame.sample_rate = audio_sample_rate
-                frame.pts = 0
-                output.mux(audio_stream.encode(frame))
-
-                # Flush encoder
-                output.mux(audio_stream.encode(None))
+        save_frames_to(
+            path,
+            self.__components.images,
+            self.__components.frame_rate,
+            audio=self.__components.audio,
+            format=format,
+            codec=codec,
+            metadata=metadata,
+        )
@@ -148,8 +148,9 @@ class ImageSaveHelper:
         for batch_number, image_tensor in enumerate(images):
             img = ImageSaveHelper._convert_tensor_to_pil(image_tensor)
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=compress_level)
+            file, counter, f = folder_paths.create_save_file(full_output_folder, filename_with_batch_num, counter, "png")
+            with f:
+                img.save(f, format="PNG", pnginfo=metadata, compress_level=compress_level)
             results.append(SavedResult(file, subfolder, folder_type))
             counter += 1
         return results
@@ -177,16 +178,17 @@ class ImageSaveHelper:
         )
         pil_images = [ImageSaveHelper._convert_tensor_to_pil(img) for img in images]
         metadata = ImageSaveHelper._create_animated_png_metadata(cls)
-        file = f"{filename}_{counter:05}_.png"
-        save_path = os.path.join(full_output_folder, file)
-        pil_images[0].save(
-            save_path,
-            pnginfo=metadata,
-            compress_level=compress_level,
-            save_all=True,
-            duration=int(1000.0 / fps),
-            append_images=pil_images[1:],
-        )
+        file, counter, f = folder_paths.create_save_file(full_output_folder, filename, counter, "png")
+        with f:
+            pil_images[0].save(
+                f,
+                format="PNG",
+                pnginfo=metadata,
+                compress_level=compress_level,
+                save_all=True,
+                duration=int(1000.0 / fps),
+                append_images=pil_images[1:],
+            )
         return SavedResult(file, subfolder, folder_type)
 
     @staticmethod
@@ -221,17 +223,19 @@ class ImageSaveHelper:
         )
         pil_images = [ImageSaveHelper._convert_tensor_to_pil(img) for img in images]
         pil_exif = ImageSaveHelper._create_webp_metadata(pil_images[0], cls)
-        file = f"{filename}_{counter:05}_.webp"
-        pil_images[0].save(
-            os.path.join(full_output_folder, file),
-            save_all=True,
-            duration=int(1000.0 / fps),
-            append_images=pil_images[1:],
-            exif=pil_exif,
-            lossless=lossless,
-            quality=quality,
-            method=method,
-        )
+        file, counter, f = folder_paths.create_save_file(full_output_folder, filename, counter, "webp")
+        with f:
+            pil_images[0].save(
+                f,
+                format="WEBP",
+                save_all=True,
+                duration=int(1000.0 / fps),
+                append_images=pil_images[1:],
+                exif=pil_exif,
+                lossless=lossless,
+                quality=quality,
+                method=method,
+            )
         return SavedResult(file, subfolder, folder_type)
 
     @staticmethod
@@ -8,6 +8,12 @@ from .._input import ImageInput, AudioInput
 class VideoCodec(str, Enum):
     AUTO = "auto"
     H264 = "h264"
+    H265 = "h265"
+    VP9 = "vp9"
+    # Fast intermediate codecs: lossless RGB, intra-frame 4:2:2 and motion JPEG
+    FFV1 = "ffv1"
+    PRORES = "prores"
+    MJPEG = "mjpeg"
 
     @classmethod
     def as_input(cls) -> list[str]:
@@ -19,6 +25,9 @@ class VideoCodec(str, Enum):
 class VideoContainer(str, Enum):
     AUTO = "auto"
     MP4 = "mp4"
+    MOV = "mov"
+    MKV = "mkv"
+    WEBM = "webm"
 
     @classmethod
     def as_input(cls) -> list[str]:
@@ -28,15 +37,30 @@ class VideoContainer(str, Enum):
         return [member.value for member in cls]
 
     @classmethod
-    def get_extension(cls, value) -> str:
+    def get_default(cls, codec=None) -> VideoContainer:
         """
-        Returns the file extension for the container.
+        Returns the container AUTO stands for when writing the codec.
+        """
+        if isinstance(codec, str):
+            codec = VideoCodec(codec)
+        if codec == VideoCodec.VP9:
+            return VideoContainer.WEBM
+        if codec == VideoCodec.PRORES:
+            return VideoContainer.MOV
+        if codec in (VideoCodec.FFV1, VideoCodec.MJPEG):
+            return VideoContainer.MKV
+        return VideoContainer.MP4
+
+    @classmethod
+    def get_extension(cls, value, codec=None) -> str:
+        """
+        Returns the file extension for the container (for AUTO, the one used for the codec).
         """
         if isinstance(value, str):
             value = cls(value)
-        if value == VideoContainer.MP4 or value == VideoContainer.AUTO:
-            return "mp4"
-        return ""
+        if value == VideoContainer.AUTO:
+            value = cls.get_default(codec)
+        return value.value
 
 @dataclass
 class VideoComponents:
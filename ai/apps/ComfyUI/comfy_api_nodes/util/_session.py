@@ -0,0 +1,60 @@
+import asyncio
+import contextlib
+
+import aiohttp
+
+# Connection pool shared by every API node request made on an event loop.
+MAX_CONNECTIONS = 64
+MAX_CONNECTIONS_PER_HOST = 16
+KEEPALIVE_TIMEOUT = 30.0
+DNS_CACHE_TTL = 300
+
+_sessions: dict[asyncio.AbstractEventLoop, tuple[aiohttp.ClientSession, asyncio.Task]] = {}
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the pooled session of the running event loop, creating it on first use.
+
+    Reusing it keeps connections (and their TLS sessions) alive between the
+    requests of a node, most notably the status polls of poll_op. Sessions
+    are bound to their loop: prompts run in their own asyncio.run() loop, so
+    each loop gets a session that is closed when that loop shuts down.
+    Cookies are never stored so requests stay independent of each other.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _sessions.get(loop)
+    if entry is not None and not entry[0].closed:
+        return entry[0]
+
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONNECTIONS,
+        limit_per_host=MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+    # asyncio.run() cancels the tasks still pending when its main coroutine
+    # returns, which closes the session before the loop goes away.
+    _sessions[loop] = (session, loop.create_task(_close_on_shutdown(loop, session)))
+    return session
+
+
+async def _close_on_shutdown(loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession):
+    try:
+        await loop.create_future()
+    finally:
+        entry = _sessions.get(loop)
+        if entry is not None and entry[0] is session:
+            del _sessions[loop]
+        with contextlib.suppress(Exception):
+            await session.close()
+
+
+async def close_session() -> None:
+    """Closes the pooled session of the running event loop, if there is one."""
+    entry = _sessions.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        session, closer = entry
+        closer.cancel()
+        await session.close()
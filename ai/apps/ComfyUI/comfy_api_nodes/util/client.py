@@ -27,6 +27,7 @@ from ._helpers import (
     is_processing_interrupted,
     sleep_with_interrupt,
 )
+from ._session import get_session
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
 
 M = TypeVar("M", bound=BaseModel)
@@ -593,7 +594,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
         attempt += 1
         stop_event = asyncio.Event()
         monitor_task: asyncio.Task | None = None
-        sess: aiohttp.ClientSession | None = None
 
         operation_id = _generate_operation_id(method, cfg.endpoint.path, attempt)
         logging.debug("[DEBUG] HTTP %s %s (attempt %d)", method, url, attempt)
@@ -612,8 +612,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             if cfg.monitor_progress:
                 monitor_task = asyncio.create_task(_monitor(stop_event, start_time))
 
-            timeout = aiohttp.ClientTimeout(total=cfg.timeout)
-            sess = aiohttp.ClientSession(timeout=timeout)
+            payload_kw["timeout"] = aiohttp.ClientTimeout(total=cfg.timeout)
 
             if cfg.content_type == "multipart/form-data" and method != "GET":
                 # aiohttp will set Content-Type boundary; remove any fixed Content-Type
@@ -665,7 +664,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             except Exception as _log_e:
                 logging.debug("[DEBUG] request logging failed: %s", _log_e)
 
-            req_coro = sess.request(method, url, params=params, **payload_kw)
+            req_coro = get_session().request(method, url, params=params, **payload_kw)
             req_task = asyncio.create_task(req_coro)
 
             # Race: request vs. monitor (interruption)
@@ -737,10 +736,10 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                     raise Exception(msg)
 
                 if expect_binary:
-                    buff = bytearray()
+                    chunks = []
                     last_tick = time.monotonic()
                     async for chunk in resp.content.iter_chunked(64 * 1024):
-                        buff.extend(chunk)
+                        chunks.append(chunk)
                         now = time.monotonic()
                         if now - last_tick >= 1.0:
                             last_tick = now
@@ -750,7 +749,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                                 _display_time_progress(
                                     cfg.node_cls, cfg.wait_label, int(now - start_time), cfg.estimated_total
                                 )
-                    bytes_payload = bytes(buff)
+                    bytes_payload = b"".join(chunks)
                     operation_succeeded = True
                     final_elapsed_seconds = int(time.monotonic() - start_time)
                     try:
@@ -869,9 +868,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
             if operation_succeeded and cfg.monitor_progress and cfg.final_label_on_success:
                 _display_time_progress(
                     cfg.node_cls,
@@ -1,5 +1,6 @@
 import asyncio
 import contextlib
+import os
 import uuid
 from io import BytesIO
 from pathlib import Path
@@ -10,6 +11,7 @@ import aiohttp
 import torch
 from aiohttp.client_exceptions import ClientError, ContentTypeError
 
+import folder_paths
 from comfy_api.latest import IO as COMFY_IO
 from comfy_api.latest import InputImpl
 
@@ -20,6 +22,7 @@ from ._helpers import (
     is_processing_interrupted,
     sleep_with_interrupt,
 )
+from ._session import get_session
 from .client import _diagnose_connectivity
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
 from .conversions import bytesio_to_image_tensor
@@ -56,6 +59,8 @@ async def download_url_to_bytesio(
     attempt = 0
     delay = retry_delay
     headers: dict[str, str] = {}
+    # A retry after a partial download starts over at the original position
+    start_pos = dest.tell() if isinstance(dest, BytesIO) else None
 
     parsed_url = urlparse(url)
     if not parsed_url.scheme and not parsed_url.netloc:  # is URL relative?
@@ -71,7 +76,6 @@ async def download_url_to_bytesio(
 
         is_path_sink = isinstance(dest, (str, Path))
         fhandle = None
-        session: aiohttp.ClientSession | None = None
         stop_evt: asyncio.Event | None = None
         monitor_task: asyncio.Task | None = None
         req_task: asyncio.Task | None = None
@@ -80,7 +84,6 @@ async def download_url_to_bytesio(
             with contextlib.suppress(Exception):
                 request_logger.log_request_response(operation_id=op_id, request_method="GET", request_url=url)
 
-            session = aiohttp.ClientSession(timeout=timeout_cfg)
             stop_evt = asyncio.Event()
 
             async def _monitor():
@@ -94,7 +97,7 @@ async def download_url_to_bytesio(
 
             monitor_task = asyncio.create_task(_monitor())
 
-            req_task = asyncio.create_task(session.get(url, headers=headers))
+            req_task = asyncio.create_task(get_session().get(url, headers=headers, timeout=timeout_cfg))
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
 
             if monitor_task in done and req_task in pending:
@@ -140,6 +143,9 @@ async def download_url_to_bytesio(
                     sink = fhandle
                 else:
                     sink = dest  # BytesIO or file-like
+                    if start_pos is not None:
+                        dest.seek(start_pos)
+                        dest.truncate()
 
                 written = 0
                 while True:
@@ -207,9 +213,6 @@ async def download_url_to_bytesio(
                 req_task.cancel()
                 with contextlib.suppress(Exception):
                     await req_task
-            if session:
-                with contextlib.suppress(Exception):
-                    await session.close()
             if fhandle:
                 with contextlib.suppress(Exception):
                     fhandle.flush()
@@ -235,10 +238,20 @@ async def download_url_to_video_output(
     max_retries: int = 5,
     cls: type[COMFY_IO.ComfyNode] = None,
 ) -> InputImpl.VideoFromFile:
-    """Downloads a video from a URL and returns a `VIDEO` output."""
-    result = BytesIO()
-    await download_url_to_bytesio(video_url, result, timeout=timeout, max_retries=max_retries, cls=cls)
-    return InputImpl.VideoFromFile(result)
+    """
+    Downloads a video from a URL and returns a `VIDEO` output.
+
+    The video is streamed to a file in ComfyUI's temp directory instead of
+    being held in memory.
+    """
+    path = os.path.join(_get_download_directory(), f"{uuid.uuid4().hex}.video")
+    try:
+        await download_url_to_bytesio(video_url, path, timeout=timeout, max_retries=max_retries, cls=cls)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        raise
+    return InputImpl.VideoFromFile(path)
 
 
 async def download_url_as_bytesio(
@@ -253,6 +266,12 @@ async def download_url_as_bytesio(
     return result
 
 
+def _get_download_directory() -> str:
+    download_dir = os.path.join(folder_paths.get_temp_directory(), "api_downloads")
+    os.makedirs(download_dir, exist_ok=True)
+    return download_dir
+
+
 def _generate_operation_id(method: str, url: str, attempt: int) -> str:
     try:
         parsed = urlparse(url)
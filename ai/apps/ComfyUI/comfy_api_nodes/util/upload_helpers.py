@@ -1,6 +1,7 @@
 import asyncio
 import contextlib
 import logging
+import os
 import time
 import uuid
 from io import BytesIO
@@ -14,6 +15,7 @@ from comfy_api.latest import IO, Input, Types
 
 from . import request_logger
 from ._helpers import is_processing_interrupted, sleep_with_interrupt
+from ._session import get_session
 from .client import (
     ApiEndpoint,
     _diagnose_connectivity,
@@ -183,9 +185,10 @@ async def upload_file(
         with contextlib.suppress(Exception):
             file.seek(0)
         data = file.read()
+        data_size = len(data)
     elif isinstance(file, str):
-        with open(file, "rb") as f:
-            data = f.read()
+        data = None  # streamed from disk, reopened for every attempt
+        data_size = os.path.getsize(file)
     else:
         raise ValueError("file must be a BytesIO or a filesystem path string")
 
@@ -195,6 +198,8 @@ async def upload_file(
         headers["Content-Type"] = content_type
     else:
         skip_auto_headers.add("Content-Type")  # Don't let aiohttp add Content-Type, it can break the signed request
+    if isinstance(file, str):
+        skip_auto_headers.add("Content-Disposition")  # aiohttp adds one for file objects, same reason
 
     attempt = 0
     delay = retry_delay
@@ -218,7 +223,7 @@ async def upload_file(
                 return
 
         monitor_task = asyncio.create_task(_monitor())
-        sess: aiohttp.ClientSession | None = None
+        fhandle = None
         try:
             try:
                 request_logger.log_request_response(
@@ -227,13 +232,14 @@ async def upload_file(
                     request_url=upload_url,
                     request_headers=headers or None,
                     request_params=None,
-                    request_data=f"[File data {len(data)} bytes]",
+                    request_data=f"[File data {data_size} bytes]",
                 )
             except Exception as e:
                 logging.debug("[DEBUG] upload request logging failed: %s", e)
 
-            sess = aiohttp.ClientSession(timeout=timeout)
-            req = sess.put(upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers)
+            if data is None:
+                fhandle = open(file, "rb")
+            req = get_session().put(upload_url, data=fhandle or data, headers=headers, skip_auto_headers=skip_auto_headers, timeout=timeout)
             req_task = asyncio.create_task(req)
 
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
@@ -298,7 +304,7 @@ async def upload_file(
                         request_method="PUT",
                         request_url=upload_url,
                         request_headers=headers or None,
-                        request_data=f"[File data {len(data)} bytes]",
+                        request_data=f"[File data {data_size} bytes]",
                         error_message=f"{type(e).__name__}: {str(e)} (will retry)",
                     )
                 await sleep_with_interrupt(
@@ -324,9 +330,8 @@ async def upload_file(
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
+            if fhandle:
+                fhandle.close()
 
 
 def _generate_operation_id(method: str, url: str, attempt: int, op_uuid: str) -> str:
@@ -1,9 +1,13 @@
 import bisect
 import gc
 import itertools
+import logging
+import os
 import psutil
 import time
 import torch
+import safetensors.torch
+from collections import OrderedDict
 from typing import Sequence, Mapping, Dict
 from comfy_execution.graph import DynamicPrompt
 from abc import ABC, abstractmethod
@@ -11,6 +15,7 @@ from abc import ABC, abstractmethod
 import nodes
 
 from comfy_execution.graph_utils import is_link
+from comfy_execution.tensor_hashing import hash_content
 
 NODE_CLASS_CONTAINS_UNIQUE_ID: Dict[str, bool] = {}
 
@@ -60,9 +65,32 @@ def to_hashable(obj):
     elif isinstance(obj, Sequence):
         return frozenset(zip(itertools.count(), [to_hashable(i) for i in obj]))
     else:
-        # TODO - Support other objects like tensors?
+        # Tensors and numpy arrays are keyed on their contents.
+        content_hash = hash_content(obj)
+        if content_hash is not None:
+            return content_hash
         return Unhashable()
 
+#Upper bound on interned signatures. Interning is purely an optimization, so the
+#table is simply dropped once it grows past this.
+
+SIGNATURE_INTERN_MAX_SIZE = 100000
+
+_signature_intern = {}
+
+def intern_signature(signature):
+    # Signatures nest their ancestors' signatures, so comparing two equal but
+    # distinct signatures would walk the whole ancestry (repeatedly for shared
+    # ancestors). Interning makes equal signatures the same object, letting
+    # comparisons short-circuit on identity at every level.
+    interned = _signature_intern.get(signature, None)
+    if interned is not None:
+        return interned
+    if len(_signature_intern) >= SIGNATURE_INTERN_MAX_SIZE:
+        _signature_intern.clear()
+    _signature_intern[signature] = signature
+    return signature
+
 class CacheKeySetID(CacheKeySet):
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
@@ -83,6 +111,7 @@ class CacheKeySetInputSignature(CacheKeySet):
         super().__init__(dynprompt, node_ids, is_changed_cache)
         self.dynprompt = dynprompt
         self.is_changed_cache = is_changed_cache
+        self.node_signatures = {}
 
     def include_node_id_in_input(self) -> bool:
         return False
@@ -98,53 +127,54 @@ class CacheKeySetInputSignature(CacheKeySet):
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
     async def get_node_signature(self, dynprompt, node_id):
-        signature = []
-        ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
-        signature.append(await self.get_immediate_node_signature(dynprompt, node_id, order_mapping))
-        for ancestor_id in ancestors:
-            signature.append(await self.get_immediate_node_signature(dynprompt, ancestor_id, order_mapping))
-        return to_hashable(signature)
-
-    async def get_immediate_node_signature(self, dynprompt, node_id, ancestor_order_mapping):
+        # Signatures are built bottom-up: each node's signature embeds the
+        # already computed signatures of the nodes it links to (Merkle style),
+        # so every node in the graph is visited once no matter how many
+        # descendants share it.
+        memo = self.node_signatures
+        stack = [(node_id, False)]
+        in_progress = set()
+        while stack:
+            current_id, parents_done = stack.pop()
+            if current_id in memo:
+                continue
+            if parents_done:
+                in_progress.discard(current_id)
+                memo[current_id] = await self.get_immediate_node_signature(dynprompt, current_id, memo)
+                continue
+            if current_id in in_progress:
+                # Cycle -- these can never be cached.
+                memo[current_id] = to_hashable([float("NaN")])
+                continue
+            in_progress.add(current_id)
+            stack.append((current_id, True))
+            if not dynprompt.has_node(current_id):
+                continue
+            inputs = dynprompt.get_node(current_id)["inputs"]
+            for key in sorted(inputs.keys(), reverse=True):
+                if is_link(inputs[key]) and inputs[key][0] not in memo:
+                    stack.append((inputs[key][0], False))
+        return memo[node_id]
+
+    async def get_immediate_node_signature(self, dynprompt, node_id, ancestor_signatures):
         if not dynprompt.has_node(node_id):
             # This node doesn't exist -- we can't cache it.
-            return [float("NaN")]
+            return to_hashable([float("NaN")])
         node = dynprompt.get_node(node_id)
         class_type = node["class_type"]
         class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
-        signature = [class_type, await self.is_changed_cache.get(node_id)]
+        signature = [class_type, to_hashable(await self.is_changed_cache.get(node_id))]
         if self.include_node_id_in_input() or (hasattr(class_def, "NOT_IDEMPOTENT") and class_def.NOT_IDEMPOTENT) or include_unique_id_in_input(class_type):
             signature.append(node_id)
         inputs = node["inputs"]
         for key in sorted(inputs.keys()):
             if is_link(inputs[key]):
                 (ancestor_id, ancestor_socket) = inputs[key]
-                ancestor_index = ancestor_order_mapping[ancestor_id]
-                signature.append((key,("ANCESTOR", ancestor_index, ancestor_socket)))
+                signature.append((key, ("ANCESTOR", ancestor_signatures[ancestor_id], ancestor_socket)))
             else:
-                signature.append((key, inputs[key]))
-        return signature
-
-    # This function returns a list of all ancestors of the given node. The order of the list is
-    # deterministic based on which specific inputs the ancestor is connected by.
-    def get_ordered_ancestry(self, dynprompt, node_id):
-        ancestors = []
-        order_mapping = {}
-        self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
-        return ancestors, order_mapping
-
-    def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
-        if not dynprompt.has_node(node_id):
-            return
-        inputs = dynprompt.get_node(node_id)["inputs"]
-        input_keys = sorted(inputs.keys())
-        for key in input_keys:
-            if is_link(inputs[key]):
-                ancestor_id = inputs[key][0]
-                if ancestor_id not in order_mapping:
-                    ancestors.append(ancestor_id)
-                    order_mapping[ancestor_id] = len(ancestors) - 1
-                    self.get_ordered_ancestry_internal(dynprompt, ancestor_id, ancestors, order_mapping)
+                signature.append((key, to_hashable(inputs[key])))
+        # frozensets cache their hash, so hashing a signature never re-walks the ancestry
+        return intern_signature(frozenset(zip(itertools.count(), signature)))
 
 class BasicCache:
     def __init__(self, key_class):
@@ -419,5 +449,157 @@ class RAMPressureCache(LRUCache):
 
         while _ram_gb() < ram_headroom * RAM_CACHE_HYSTERESIS and clean_list:
             _, _, key = clean_list.pop()
-            del self.cache[key]
+            self._evict(key)
             gc.collect()
+
+    def _evict(self, key):
+        del self.cache[key]
+
+#Only CPU tensors at least this big are worth the round trip to disk. Smaller
+#ones stay in the in-memory skeleton of the spilled entry.
+
+DISK_CACHE_MIN_TENSOR_BYTES = 64 * 1024
+
+class _SpilledTensor:
+    def __init__(self, name):
+        self.name = name
+
+class DiskSpillStore:
+    """
+    Bounded on-disk LRU store for cache entries evicted from RAM.
+
+    Large CPU tensors are written to a safetensors file per entry. The rest of
+    the entry (containers, small values, GPU tensors, arbitrary objects) is kept
+    in memory as a skeleton with placeholders that are swapped back for the
+    loaded tensors on reload.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.counter = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def _split(self, value, tensors, seen_storages):
+        if isinstance(value, torch.Tensor):
+            if type(value) is not torch.Tensor or value.device.type != "cpu" or value.is_sparse:
+                return value
+            if value.numel() * value.element_size() < DISK_CACHE_MIN_TENSOR_BYTES:
+                return value
+            tensor = value.detach().contiguous()
+            storage_ptr = tensor.untyped_storage().data_ptr()
+            if storage_ptr in seen_storages:
+                # safetensors refuses tensors that share memory
+                tensor = tensor.clone()
+            seen_storages.add(storage_ptr)
+            name = str(len(tensors))
+            tensors[name] = tensor
+            return _SpilledTensor(name)
+        elif isinstance(value, tuple) and hasattr(value, "_fields"):
+            return type(value)._make(self._split(v, tensors, seen_storages) for v in value)
+        elif isinstance(value, (list, tuple)):
+            return type(value)(self._split(v, tensors, seen_storages) for v in value)
+        elif isinstance(value, dict):
+            return {k: self._split(v, tensors, seen_storages) for k, v in value.items()}
+        return value
+
+    def _join(self, value, tensors):
+        if isinstance(value, _SpilledTensor):
+            return tensors[value.name]
+        elif isinstance(value, tuple) and hasattr(value, "_fields"):
+            return type(value)._make(self._join(v, tensors) for v in value)
+        elif isinstance(value, (list, tuple)):
+            return type(value)(self._join(v, tensors) for v in value)
+        elif isinstance(value, dict):
+            return {k: self._join(v, tensors) for k, v in value.items()}
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True
+        tensors = {}
+        skeleton = self._split(value, tensors, set())
+        if len(tensors) == 0:
+            return False
+        nbytes = sum(t.numel() * t.element_size() for t in tensors.values())
+        if nbytes > self.max_bytes:
+            return False
+        self.counter += 1
+        path = os.path.join(self.directory, "entry_{:08}.safetensors".format(self.counter))
+        try:
+            safetensors.torch.save_file(tensors, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logging.warning("Failed to spill cache entry to disk: {}".format(e))
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+            return False
+        self.entries[key] = (path, skeleton, nbytes)
+        self.total_bytes += nbytes
+        while self.total_bytes > self.max_bytes:
+            self.discard(next(iter(self.entries)))
+        return True
+
+    def get(self, key):
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        path, skeleton, _ = entry
+        try:
+            tensors = safetensors.torch.load_file(path)
+        except Exception as e:
+            logging.warning("Failed to reload spilled cache entry: {}".format(e))
+            self.discard(key)
+            return None
+        self.entries.move_to_end(key)
+        return self._join(skeleton, tensors)
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        path, _, nbytes = entry
+        self.total_bytes -= nbytes
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        for key in list(self.entries):
+            self.discard(key)
+
+class RAMDiskCache(RAMPressureCache):
+    """
+    RAM pressure cache with a second tier: entries evicted under RAM pressure
+    are spilled to a DiskSpillStore and transparently reloaded on get().
+    """
+    def __init__(self, key_class, spill_directory, max_disk_bytes):
+        super().__init__(key_class)
+        self.disk = DiskSpillStore(spill_directory, max_disk_bytes)
+
+    def get(self, node_id):
+        value = super().get(node_id)
+        if value is not None:
+            return value
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        if cache_key is None or cache_key not in self.disk:
+            return None
+        value = self.disk.get(cache_key)
+        if value is not None:
+            self.cache[cache_key] = value
+        return value
+
+    def set(self, node_id, value):
+        # A fresh result supersedes whatever was spilled under the same key
+        self.disk.discard(self.cache_key_set.get_data_key(node_id))
+        super().set(node_id, value)
+
+    def _evict(self, key):
+        self.disk.put(key, self.cache[key])
+        super()._evict(key)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import BinaryIO, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from comfy_execution.utils import get_executing_context
+
+# PIL releases the GIL inside zlib while encoding, so a thread pool encodes
+# the images of a batch in parallel.
+DEFAULT_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def build_png_metadata(prompt=None, extra_pnginfo=None) -> PngInfo:
+    """Serializes the prompt metadata once so it can be shared by every image in a batch."""
+    metadata = PngInfo()
+    if prompt is not None:
+        metadata.add_text("prompt", json.dumps(prompt))
+    if extra_pnginfo is not None:
+        for x in extra_pnginfo:
+            metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+    return metadata
+
+
+def images_to_uint8(images: torch.Tensor) -> np.ndarray:
+    """Converts a [B, H, W, C] float image batch to uint8 in a single pass on the images' device."""
+    return torch.clamp(images * 255., 0, 255).to(torch.uint8).cpu().numpy()
+
+
+def _encode_png(file, pixels: np.ndarray, pnginfo: Optional[PngInfo], compress_level: int):
+    try:
+        Image.fromarray(pixels).save(file, format="PNG", pnginfo=pnginfo, compress_level=compress_level)
+    finally:
+        file.close()
+
+
+class ImageSaver:
+    """
+    Encodes images in a thread pool.
+
+    Output files are created exclusively before the encode is queued, so a
+    file name is taken as soon as save_png() returns and an existing file is
+    never truncated (pass a file from folder_paths.create_save_file to pick
+    the next free counter). Saves that are still running can be
+    waited on per file (wait_for_file) or all at once (wait_for_saves), which
+    the executor does before it publishes the history entry of a prompt.
+    Errors of detached saves, whose caller doesn't wait on the future, are
+    reported by wait_for_saves along with the node that queued them.
+    """
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending: dict[str, Future] = {}
+        # detached future -> id of the node that queued it
+        self.detached: dict[Future, Optional[str]] = {}
+        self.lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image_saver")
+        return self.executor
+
+    def save_png(self, path: str, pixels: np.ndarray, pnginfo: Optional[PngInfo] = None, compress_level: int = 4, detached: bool = False,
+                 file: Optional[BinaryIO] = None) -> Future:
+        if file is None:
+            file = open(path, "xb")
+        key = os.path.abspath(path)
+        with self.lock:
+            future = self._get_executor().submit(_encode_png, file, pixels, pnginfo, compress_level)
+            self.pending[key] = future
+            if detached:
+                context = get_executing_context()
+                self.detached[future] = context.node_id if context is not None else None
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key: str, future: Future):
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    def wait_for_saves(self) -> list[tuple[Optional[str], BaseException]]:
+        """Waits for every queued save and returns (node id, error) for the detached ones that failed."""
+        with self.lock:
+            futures = list(self.pending.values())
+        wait(futures)
+        errors = []
+        with self.lock:
+            for key, future in list(self.pending.items()):
+                if future.done():
+                    del self.pending[key]
+            for future in [f for f in self.detached if f.done()]:
+                node_id = self.detached.pop(future)
+                if future.exception() is not None:
+                    errors.append((node_id, future.exception()))
+        for _, e in errors:
+            logging.error(f"Failed to save image: {e}")
+        return errors
+
+    async def wait_for_file(self, path: str):
+        """Waits until a save queued for path has finished, if there is one."""
+        with self.lock:
+            future = self.pending.get(os.path.abspath(path))
+        if future is not None:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass
+
+
+image_saver = ImageSaver()
@@ -0,0 +1,390 @@
+"""
+Lazy node registration and cached node infos.
+
+- NodeClassMappings is the NODE_CLASS_MAPPINGS dict. Besides loaded node
+  classes it can hold lazy names: nodes whose module is only imported when
+  the class is first looked up (a prompt using it, or its info when that
+  isn't in the manifest).
+- NodeManifest persists, per built-in node module, its source hash, node
+  names, display names and the infos of its static nodes. With --lazy-nodes a
+  module whose hash matches is registered from the manifest without being
+  imported. The whole manifest is dropped when ComfyUI, the comfy packages or
+  the custom nodes change (see manifest_key).
+- NodeInfoCache keeps the /object_info entries of static built-in nodes so
+  they are only built once. Like the manifest it is only used with
+  --lazy-nodes.
+
+A node is static when building its info made no folder lookup (see
+folder_paths.track_folder_lookups): its inputs don't list models or files, so
+its info only changes with its source.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from collections.abc import Callable, Coroutine, KeysView
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import folder_paths
+from comfy_api.internal import _ComfyNodeInternal
+
+BUILTIN_MODULE_PREFIXES = ("comfy_extras.", "comfy_api_nodes.")
+MANIFEST_VERSION = 1
+
+
+def build_node_info(node_class: str, obj_class: type, display_names: dict[str, str]) -> dict:
+    if issubclass(obj_class, _ComfyNodeInternal):
+        return obj_class.GET_NODE_INFO_V1()
+    info = {}
+    info['input'] = obj_class.INPUT_TYPES()
+    info['input_order'] = {key: list(value.keys()) for (key, value) in obj_class.INPUT_TYPES().items()}
+    info['output'] = obj_class.RETURN_TYPES
+    info['output_is_list'] = obj_class.OUTPUT_IS_LIST if hasattr(obj_class, 'OUTPUT_IS_LIST') else [False] * len(obj_class.RETURN_TYPES)
+    info['output_name'] = obj_class.RETURN_NAMES if hasattr(obj_class, 'RETURN_NAMES') else info['output']
+    info['name'] = node_class
+    info['display_name'] = display_names[node_class] if node_class in display_names.keys() else node_class
+    info['description'] = obj_class.DESCRIPTION if hasattr(obj_class,'DESCRIPTION') else ''
+    info['python_module'] = getattr(obj_class, "RELATIVE_PYTHON_MODULE", "nodes")
+    info['category'] = 'sd'
+    if hasattr(obj_class, 'OUTPUT_NODE') and obj_class.OUTPUT_NODE == True:
+        info['output_node'] = True
+    else:
+        info['output_node'] = False
+
+    if hasattr(obj_class, 'CATEGORY'):
+        info['category'] = obj_class.CATEGORY
+
+    if hasattr(obj_class, 'OUTPUT_TOOLTIPS'):
+        info['output_tooltips'] = obj_class.OUTPUT_TOOLTIPS
+
+    if getattr(obj_class, "DEPRECATED", False):
+        info['deprecated'] = True
+    if getattr(obj_class, "EXPERIMENTAL", False):
+        info['experimental'] = True
+
+    if hasattr(obj_class, 'API_NODE'):
+        info['api_node'] = obj_class.API_NODE
+    return info
+
+
+def build_static_node_info(node_class: str, obj_class: type, display_names: dict[str, str]) -> tuple[dict, bool]:
+    """build_node_info, plus whether the info is static (made no folder_paths call)."""
+    with folder_paths.track_folder_lookups() as lookups:
+        info = build_node_info(node_class, obj_class, display_names)
+    return info, lookups[0] == 0
+
+
+def is_builtin(obj_class: type) -> bool:
+    module = getattr(obj_class, "RELATIVE_PYTHON_MODULE", "nodes")
+    return module == "nodes" or module.startswith(BUILTIN_MODULE_PREFIXES)
+
+
+def run_coroutine_sync(coro: Coroutine) -> Any:
+    """Runs coro to completion from sync code, also when this thread already runs an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+class LazyModule:
+    def __init__(self, module_path: str, module_parent: str, names: list[str], display_names: dict[str, str],
+                 infos: dict[str, dict]):
+        self.module_path = module_path
+        self.module_parent = module_parent
+        self.names = names
+        self.display_names = display_names
+        # Manifest infos of the static nodes, served without importing the module
+        self.infos = infos
+
+
+class NodeClassMappings(dict):
+    """
+    NODE_CLASS_MAPPINGS with lazily imported modules.
+
+    Lookups (m[name], m.get(name), name in m), iteration, keys() and len()
+    include lazy names; m[name] imports the module of a lazy name first.
+    items(), values() and copy() import every lazy module.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy: dict[str, LazyModule] = {}
+        self.lock = threading.RLock()
+        # Set by nodes.py: async loader(module_path, module_parent) -> bool
+        self.loader: Callable[[str, str], Coroutine] | None = None
+
+    def add_lazy(self, module: LazyModule) -> None:
+        for name in module.names:
+            if not dict.__contains__(self, name):
+                self.lazy[name] = module
+
+    def lazy_info(self, name: str) -> dict | None:
+        module = self.lazy.get(name)
+        return None if module is None else module.infos.get(name)
+
+    def load(self, name: str) -> bool:
+        """Imports the module of a lazy name. Returns whether name is now loaded."""
+        with self.lock:
+            module = self.lazy.get(name)
+            if module is not None:
+                logging.debug("Lazy loading node module {} for {}".format(module.module_path, name))
+                try:
+                    success = run_coroutine_sync(self.loader(module.module_path, module.module_parent))
+                except Exception as e:
+                    logging.warning(f"Cannot import {module.module_path} module for nodes: {e}")
+                    success = False
+                if not success:
+                    logging.warning(f"Lazy node module {module.module_path} failed to import, its nodes are unavailable.")
+                for lazy_name in module.names:
+                    if self.lazy.get(lazy_name) is module:
+                        del self.lazy[lazy_name]
+            return dict.__contains__(self, name)
+
+    def load_all(self) -> None:
+        while self.lazy:
+            self.load(next(iter(self.lazy)))
+
+    def __missing__(self, key):
+        if key in self.lazy and self.load(key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return dict.__contains__(self, key) or key in self.lazy
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value) -> None:
+        self.lazy.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key) -> None:
+        if self.lazy.pop(key, None) is not None and not dict.__contains__(self, key):
+            return
+        dict.__delitem__(self, key)
+
+    def __iter__(self):
+        yield from list(dict.keys(self))
+        yield from [name for name in list(self.lazy) if not dict.__contains__(self, name)]
+
+    def __len__(self) -> int:
+        return dict.__len__(self) + sum(1 for name in list(self.lazy) if not dict.__contains__(self, name))
+
+    def keys(self):
+        return KeysView(self)
+
+    def items(self):
+        self.load_all()
+        return dict.items(self)
+
+    def values(self):
+        self.load_all()
+        return dict.values(self)
+
+    def copy(self) -> dict:
+        self.load_all()
+        return dict(dict.items(self))
+
+
+class NodeInfoCache:
+    """/object_info entries of static built-in nodes, by node name and class."""
+    def __init__(self):
+        self.entries: dict[str, tuple[type, dict]] = {}
+
+    def get(self, node_class: str, obj_class: type, display_names: dict[str, str]) -> dict:
+        cached = self.entries.get(node_class)
+        if cached is not None and cached[0] is obj_class:
+            return cached[1]
+        info, static = build_static_node_info(node_class, obj_class, display_names)
+        if static and is_builtin(obj_class):
+            self.entries[node_class] = (obj_class, info)
+        return info
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def manifest_key(base_path: str, custom_node_paths: list[str]) -> str:
+    """
+    Fingerprint of everything besides its own source that a built-in node info
+    can depend on: the ComfyUI version, the comfy packages and the custom nodes
+    (which can for example add samplers). Only file stats are read.
+    """
+    h = hashlib.sha256()
+    try:
+        import comfyui_version
+        h.update(comfyui_version.__version__.encode())
+    except ImportError:
+        pass
+    h.update(sys.version.encode())
+
+    def add_stat(path: str) -> None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        h.update(f"{path}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+
+    for name in ("nodes.py", "folder_paths.py"):
+        add_stat(os.path.join(base_path, name))
+    for package in ("comfy", "comfy_api", "comfy_execution"):
+        for dirpath, subdirs, filenames in os.walk(os.path.join(base_path, package)):
+            subdirs[:] = sorted(d for d in subdirs if d != "__pycache__")
+            for name in sorted(filenames):
+                if name.endswith(".py"):
+                    add_stat(os.path.join(dirpath, name))
+    for custom_node_path in custom_node_paths:
+        try:
+            entries = sorted(os.listdir(custom_node_path))
+        except OSError:
+            continue
+        for entry in entries:
+            module_path = os.path.join(custom_node_path, entry)
+            add_stat(module_path)
+            add_stat(os.path.join(module_path, "__init__.py"))
+    return h.hexdigest()
+
+
+class NodeManifest:
+    """
+    Usage:
+        manifest = NodeManifest(path, key)
+        lazy = manifest.lazy_module(module_path)  # None when missing or stale
+        ...
+        manifest.add_loaded(module_path, module_parent, names)  # for imported modules
+        ...
+        manifest.record_loaded(NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS)  # once all nodes are loaded
+        manifest.save()
+    """
+    def __init__(self, path: str, key: str):
+        self.path = path
+        self.key = key
+        self.modules: dict[str, dict] = {}
+        # module path -> (module parent, node names) of modules imported this run
+        self.loaded: dict[str, tuple[str, list[str]]] = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION and data.get("key") == key:
+                self.modules = data["modules"]
+            else:
+                self.dirty = True
+        except FileNotFoundError:
+            self.dirty = True
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logging.warning(f"Ignoring unreadable node manifest {path}: {e}")
+            self.dirty = True
+
+    def entry(self, module_path: str) -> dict | None:
+        entry = self.modules.get(module_path)
+        try:
+            if entry is not None and entry["hash"] == file_hash(module_path):
+                return entry
+        except OSError:
+            pass
+        return None
+
+    def add_loaded(self, module_path: str, module_parent: str, names: list[str]) -> None:
+        self.loaded[module_path] = (module_parent, names)
+
+    def record_loaded(self, mappings: dict, display_names: dict[str, str]) -> None:
+        """
+        Records the modules imported this run. Called after the custom nodes are
+        loaded too, since they can change the infos of built-in nodes.
+        """
+        for module_path, (module_parent, names) in self.loaded.items():
+            nodes = {}
+            for name in names:
+                info = None
+                try:
+                    info, static = build_static_node_info(name, dict.__getitem__(mappings, name), display_names)
+                    if not static:
+                        info = None
+                    else:
+                        json.dumps(info)
+                except Exception:
+                    info = None
+                nodes[name] = {"display_name": display_names.get(name), "info": info}
+            try:
+                self.modules[module_path] = {"hash": file_hash(module_path), "module_parent": module_parent, "nodes": nodes}
+            except OSError:
+                continue
+            self.dirty = True
+        self.loaded.clear()
+
+    def lazy_module(self, module_path: str) -> LazyModule | None:
+        entry = self.entry(module_path)
+        if entry is None:
+            return None
+        nodes = entry["nodes"]
+        return LazyModule(module_path, entry["module_parent"], list(nodes),
+                          {name: node["display_name"] for name, node in nodes.items() if node.get("display_name") is not None},
+                          {name: node["info"] for name, node in nodes.items() if node.get("info") is not None})
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "key": self.key, "modules": self.modules}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+BENCHMARK_SCRIPT = """
+import time, json, asyncio
+import comfy.options
+comfy.options.enable_args_parsing()
+import utils.install_util
+import folder_paths
+from comfy.cli_args import args
+folder_paths.set_user_directory(args.user_directory)
+start = time.perf_counter()
+import nodes
+imported = time.perf_counter()
+asyncio.run(nodes.init_extra_nodes(init_custom_nodes=False))
+ready = time.perf_counter()
+infos = {name: nodes.get_node_info(name) for name in nodes.NODE_CLASS_MAPPINGS}
+object_info = time.perf_counter()
+print(json.dumps({"nodes_import": imported - start, "init_extra_nodes": ready - imported,
+                  "first_object_info": object_info - ready, "lazy_after_object_info": len(nodes.NODE_CLASS_MAPPINGS.lazy),
+                  "node_count": len(infos)}))
+"""
+
+
+def benchmark() -> None:
+    """Cold starts in fresh processes: eager, --lazy-nodes building the manifest, --lazy-nodes with it."""
+    import tempfile
+    import subprocess
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as user_dir:
+        for label, extra in (("eager", []), ("lazy, no manifest", ["--lazy-nodes"]), ("lazy, manifest", ["--lazy-nodes"])):
+            cmd = [sys.executable, "-c", BENCHMARK_SCRIPT, "--cpu", "--user-directory", user_dir] + extra
+            out = subprocess.run(cmd, cwd=base_path, capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{label:>18}: init_extra_nodes {result['init_extra_nodes'] * 1000:7.1f} ms, "  # noqa: T201
+                  f"first /object_info {result['first_object_info'] * 1000:6.1f} ms, "
+                  f"{result['node_count']} nodes, {result['lazy_after_object_info']} still not imported")
+
+
+if __name__ == "__main__":
+    benchmark()
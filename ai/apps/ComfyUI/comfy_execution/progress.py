@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import TypedDict, Dict, Optional, Tuple
+from io import BytesIO
+from typing import TypedDict, Dict, Optional, Tuple, Union
 from typing_extensions import override
-from PIL import Image
+from PIL import Image, ImageOps
 from enum import Enum
 from abc import ABC
 from tqdm import tqdm
@@ -12,7 +13,26 @@ if TYPE_CHECKING:
 from protocol import BinaryEventTypes
 from comfy_api import feature_flags
 
-PreviewImageTuple = Tuple[str, Image.Image, Optional[int]]
+# (format, image, max size), optionally followed by the image already encoded
+# and resized to max size (see latent_preview.PreviewPipeline)
+PreviewImageTuple = Union[Tuple[str, Image.Image, Optional[int]], Tuple[str, Image.Image, Optional[int], bytes]]
+
+
+def encode_preview_image(preview: PreviewImageTuple) -> bytes:
+    """Encodes a preview image in its format, scaled to fit its max size."""
+    if len(preview) > 3 and preview[3] is not None:
+        return preview[3]
+    image_type, image, max_size = preview[:3]
+    if max_size is not None:
+        if hasattr(Image, 'Resampling'):
+            resampling = Image.Resampling.BILINEAR
+        else:
+            resampling = Image.Resampling.LANCZOS
+
+        image = ImageOps.contain(image, (max_size, max_size), resampling)
+    bytesIO = BytesIO()
+    image.save(bytesIO, format=image_type, quality=95, compress_level=1)
+    return bytesIO.getvalue()
 
 class NodeState(Enum):
     Pending = "pending"
@@ -348,3 +368,40 @@ def get_progress_state() -> ProgressRegistry:
             prompt_id="", dynprompt=DynamicPrompt({})
         )
     return global_progress_registry
+
+
+def hijack_progress(server_instance):
+    """Reports comfy.utils progress bars to the progress registry and to server_instance."""
+    import comfy.utils
+    import comfy.model_management
+    from comfy_execution.utils import get_executing_context
+
+    def hook(value, total, preview_image, prompt_id=None, node_id=None):
+        executing_context = get_executing_context()
+        if prompt_id is None and executing_context is not None:
+            prompt_id = executing_context.prompt_id
+        if node_id is None and executing_context is not None:
+            node_id = executing_context.node_id
+        comfy.model_management.throw_exception_if_processing_interrupted()
+        if prompt_id is None:
+            prompt_id = server_instance.last_prompt_id
+        if node_id is None:
+            node_id = server_instance.last_node_id
+        progress = {"value": value, "max": total, "prompt_id": prompt_id, "node": node_id}
+        get_progress_state().update_progress(node_id, value, total, preview_image)
+
+        server_instance.send_sync("progress", progress, server_instance.client_id)
+        if preview_image is not None:
+            # Only send old method if client doesn't support preview metadata
+            if not feature_flags.supports_feature(
+                server_instance.sockets_metadata,
+                server_instance.client_id,
+                "supports_preview_metadata",
+            ):
+                server_instance.send_sync(
+                    BinaryEventTypes.UNENCODED_PREVIEW_IMAGE,
+                    preview_image,
+                    server_instance.client_id,
+                )
+
+    comfy.utils.set_progress_bar_global_hook(hook)
@@ -0,0 +1,179 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+#Tensors are hashed in full by default. Setting this to a byte count opts in to
+#hashing larger tensors from a strided sample plus the head and tail of the
+#buffer. Sampling is faster on multi-GB inputs but two tensors that differ only
+#outside the sample get the same cache key, so it is off unless asked for.
+
+FULL_HASH_MAX_BYTES = None
+
+#Number of evenly strided elements sampled from tensors above FULL_HASH_MAX_BYTES.
+
+SAMPLED_HASH_ELEMENTS = 64 * 1024
+
+#Number of contiguous elements taken from each end of a sampled tensor.
+
+SAMPLED_HASH_EDGE_ELEMENTS = 4 * 1024
+
+MEMO_MAX_ENTRIES = 1024
+
+
+class _DigestMemo:
+    """
+    Bounded LRU of tensor digests.
+
+    Entries are keyed on the storage pointer, view geometry and the autograd
+    version counter (bumped on every in-place write). A weak reference to the
+    hashed tensor is kept alongside the digest so that a new allocation which
+    happens to reuse a freed pointer is never mistaken for the old tensor.
+    """
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                return None
+            ref, digest = entry
+            if ref() is None:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return digest
+
+    def set(self, key, obj, digest):
+        try:
+            ref = weakref.ref(obj)
+        except TypeError:
+            return
+        with self.lock:
+            self.entries[key] = (ref, digest)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_memo = _DigestMemo()
+
+
+def _tensor_memo_key(tensor):
+    return (
+        tensor.device.type,
+        tensor.device.index,
+        tensor.untyped_storage().data_ptr(),
+        tensor.storage_offset(),
+        tuple(tensor.shape),
+        tuple(tensor.stride()),
+        tensor.dtype,
+        tensor._version,
+    )
+
+
+def _sample_slices(numel, itemsize):
+    if FULL_HASH_MAX_BYTES is None or numel * itemsize <= FULL_HASH_MAX_BYTES:
+        return None
+    step = max(numel // SAMPLED_HASH_ELEMENTS, 1)
+    return (slice(None, SAMPLED_HASH_EDGE_ELEMENTS), slice(None, None, step), slice(-SAMPLED_HASH_EDGE_ELEMENTS, None))
+
+
+def _digest_tensor(tensor):
+    hasher = hashlib.blake2b(digest_size=16)
+    flat = tensor.detach().reshape(-1)
+    slices = _sample_slices(flat.numel(), flat.element_size())
+    if slices is None:
+        hasher.update(b"F")
+        parts = (flat,)
+    else:
+        hasher.update(b"S")
+        parts = [flat[s] for s in slices]
+    for part in parts:
+        hasher.update(part.contiguous().view(torch.uint8).cpu().numpy().data)
+    return hasher.hexdigest()
+
+
+def _digest_ndarray(array):
+    hasher = hashlib.blake2b(digest_size=16)
+    flat = array.reshape(-1)
+    slices = _sample_slices(flat.size, flat.itemsize)
+    if slices is None:
+        hasher.update(b"F")
+        parts = (flat,)
+    else:
+        hasher.update(b"S")
+        parts = [flat[s] for s in slices]
+    for part in parts:
+        hasher.update(np.ascontiguousarray(part).view(np.uint8).data)
+    return hasher.hexdigest()
+
+
+def hash_tensor(tensor):
+    """
+    Return a hashable content signature for a torch tensor.
+
+    The signature covers dtype, shape and the tensor contents. Results are
+    memoized per storage/version so repeated prompts reusing the same tensor
+    only pay for hashing once. Inference tensors have no version counter and
+    can be written in place without a trace, so they are always rehashed.
+    """
+    if tensor.is_sparse or tensor.device.type == "meta":
+        return None
+    if tensor.is_inference():
+        return ("TENSOR", str(tensor.dtype), tuple(tensor.shape), _digest_tensor(tensor))
+    key = _tensor_memo_key(tensor)
+    digest = _memo.get(key)
+    if digest is None:
+        digest = _digest_tensor(tensor)
+        _memo.set(key, tensor, digest)
+    return ("TENSOR", str(tensor.dtype), tuple(tensor.shape), digest)
+
+
+def hash_ndarray(array):
+    """
+    Return a hashable content signature for a numpy array.
+
+    numpy has no version counter, so only read-only arrays are memoized.
+    """
+    if array.dtype.hasobject:
+        return None
+    key = None
+    if not array.flags.writeable:
+        key = ("ndarray", array.__array_interface__["data"][0], array.shape, array.strides, array.dtype.str)
+        digest = _memo.get(key)
+        if digest is not None:
+            return ("NDARRAY", array.dtype.str, array.shape, digest)
+    digest = _digest_ndarray(array)
+    if key is not None:
+        _memo.set(key, array, digest)
+    return ("NDARRAY", array.dtype.str, array.shape, digest)
+
+
+def hash_content(obj):
+    """
+    Return a hashable content signature for tensors and numpy arrays, or None
+    when obj is of any other type or cannot be hashed.
+    """
+    try:
+        if isinstance(obj, torch.Tensor):
+            return hash_tensor(obj)
+        if isinstance(obj, np.ndarray):
+            return hash_ndarray(obj)
+    except (RuntimeError, TypeError, ValueError):
+        return None
+    return None
+
+
+def clear_memo():
+    _memo.clear()
@@ -0,0 +1,589 @@
+"""
+Multi-process prompt execution with model affinity (--prompt-workers N).
+
+Each worker is a separate process with its own PromptExecutor, output cache
+and loaded models. The server process keeps the PromptQueue and validation;
+a dispatcher thread hands queued prompts to idle workers:
+
+- Affinity: a prompt's loader signature is the set of its nodes without
+  linked inputs (checkpoint, LoRA, VAE loaders, empty latents...) with their
+  inputs. An idle worker gets the queued prompt sharing the most signatures
+  with the prompts it ran last, so prompts using the same models end up on
+  the worker that already has them loaded and cached. Nodes that name a
+  model file count MODEL_WEIGHT times.
+- Fairness: candidates are the first SCHEDULE_WINDOW prompts in queue
+  order. A prompt passed over MAX_SKIPS times runs next.
+
+Messages a worker's nodes send through PromptServer.instance are forwarded
+to the real server, results end up in the queue history like with the
+single in-process worker.
+
+Run `python -m comfy_execution.worker_pool --cpu` for a benchmark with
+mixed synthetic workflows.
+"""
+from __future__ import annotations
+
+import os
+import gc
+import sys
+import json
+import time
+import queue
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+
+SCHEDULE_WINDOW = 16
+MAX_SKIPS = 4
+RECENT_PROMPTS = 2
+MODEL_WEIGHT = 10
+MODEL_EXTENSIONS = ('.ckpt', '.pt', '.pt2', '.bin', '.pth', '.safetensors', '.pkl', '.sft', '.gguf')
+GC_COLLECT_INTERVAL = 10.0
+
+
+def loader_signatures(prompt: dict) -> dict[str, int]:
+    """Signature -> weight of the nodes of prompt whose inputs are all literals."""
+    signatures = {}
+    for node in prompt.values():
+        inputs = node.get("inputs", {})
+        if any(isinstance(v, list) and len(v) == 2 and isinstance(v[1], int) for v in inputs.values()):
+            continue
+        signature = json.dumps([node.get("class_type"), inputs], sort_keys=True, default=str)
+        model = any(isinstance(v, str) and v.lower().endswith(MODEL_EXTENSIONS) for v in inputs.values())
+        signatures[signature] = MODEL_WEIGHT if model else 1
+    return signatures
+
+
+class AffinityScheduler:
+    """Picks which queued prompt runs on which idle worker."""
+    def __init__(self, max_skips=MAX_SKIPS, recent_prompts=RECENT_PROMPTS, affinity=True):
+        self.max_skips = max_skips
+        self.recent_prompts = recent_prompts
+        self.affinity = affinity
+        self.recent: dict[int, deque] = {}
+        self.skips: dict[str, int] = {}
+        self.signatures: dict[str, dict[str, int]] = {}
+        self.last_started: dict[int, int] = {}
+        self.started_count = 0
+
+    def _signatures(self, item) -> dict[str, int]:
+        prompt_id = item[1]
+        signatures = self.signatures.get(prompt_id)
+        if signatures is None:
+            signatures = loader_signatures(item[2])
+            self.signatures[prompt_id] = signatures
+        return signatures
+
+    def score(self, worker_id: int, item) -> int:
+        if not self.affinity:
+            return 0
+        loaded = set()
+        for signatures in self.recent.get(worker_id, ()):
+            loaded.update(signatures)
+        return sum(weight for signature, weight in self._signatures(item).items() if signature in loaded)
+
+    def choose(self, workers: list[int], candidates: list) -> tuple[int, int]:
+        """Returns (index into candidates, worker id). candidates are in queue order."""
+        forced = next((i for i, item in enumerate(candidates) if self.skips.get(item[1], 0) >= self.max_skips), None)
+        if forced is not None:
+            index = forced
+            worker = max(workers, key=lambda w: self.score(w, candidates[index]))
+        else:
+            best = max(((self.score(w, item), -i, w) for i, item in enumerate(candidates) for w in workers),
+                       key=lambda x: (x[0], x[1]))
+            if best[0] > 0:
+                index, worker = -best[1], best[2]
+            else:
+                # Nothing queued matches a loaded model: run the oldest prompt on the
+                # least recently used worker, its cache is the least likely to be needed
+                index = 0
+                worker = min(workers, key=lambda w: self.last_started.get(w, -1))
+
+        for item in candidates[:index]:
+            self.skips[item[1]] = self.skips.get(item[1], 0) + 1
+        self.skips.pop(candidates[index][1], None)
+        return index, worker
+
+    def started(self, worker_id: int, item) -> None:
+        recent = self.recent.setdefault(worker_id, deque(maxlen=self.recent_prompts))
+        recent.append(self.signatures.pop(item[1], None) or loader_signatures(item[2]))
+        self.started_count += 1
+        self.last_started[worker_id] = self.started_count
+
+    def reset(self, worker_id: int | None = None) -> None:
+        """Forgets what a worker (or every worker) has loaded."""
+        if worker_id is None:
+            self.recent.clear()
+        else:
+            self.recent.pop(worker_id, None)
+
+
+class WorkerServer:
+    """
+    Stands in for PromptServer.instance inside a worker process. Everything
+    sent is forwarded to the server process.
+
+    Custom nodes commonly touch routes, app and loop at import time. They get
+    working objects, but routes registered here are never served: the server
+    process imports the same nodes and serves their routes itself.
+    """
+    def __init__(self, events, worker_id: int):
+        from aiohttp import web
+        self.events = events
+        self.worker_id = worker_id
+        self.client_id = None
+        self.last_node_id = None
+        self.last_prompt_id = None
+        # Feature flags of the prompt's client, sent along with each prompt
+        self.sockets_metadata = {}
+        self.routes = web.RouteTableDef()
+        self.app = web.Application()
+        self.supports = ["custom_nodes_from_web"]
+        self.client_session = None
+        self.number = 0
+        self.on_prompt_handlers = []
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="worker_server_loop", daemon=True).start()
+
+    def add_on_prompt_handler(self, handler):
+        self.on_prompt_handlers.append(handler)
+
+    async def send(self, event, data, sid=None):
+        self.send_sync(event, data, sid)
+
+    async def send_json(self, event, data, sid=None):
+        self.send_sync(event, data, sid)
+
+    def send_sync(self, event, data, sid=None):
+        self.events.put(("send", self.worker_id, (event, data, sid)))
+
+    def send_progress_text(self, text, node_id, sid=None):
+        self.events.put(("progress_text", self.worker_id, (text, node_id, sid)))
+
+    def queue_updated(self):
+        pass
+
+    def previews_pending(self, sid=None):
+        return 0
+
+    def preview_subscribed(self, sid=None):
+        # Clients connected when the prompt was dispatched
+        return sid is None or sid in self.sockets_metadata
+
+
+def worker_main(worker_id: int, jobs, events, interrupt, settings: dict) -> None:
+    """Entry point of a worker process."""
+    import comfy.cli_args
+    vars(comfy.cli_args.args).update(settings["args"])
+    import folder_paths
+    folder_paths.folder_names_and_paths.update(settings["folder_names_and_paths"])
+    folder_paths.set_output_directory(settings["output_directory"])
+    folder_paths.set_temp_directory(settings["temp_directory"])
+    folder_paths.set_input_directory(settings["input_directory"])
+    folder_paths.set_user_directory(settings["user_directory"])
+    if settings["torch_threads"]:
+        import torch
+        torch.set_num_threads(settings["torch_threads"])
+
+    # The spawned process inherits sys.path with the comfy directory that
+    # nodes.py puts first, where "utils" would resolve to comfy/utils.py.
+    saved_path = sys.path[:]
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import utils.install_util  # noqa: F401
+    sys.path[:] = saved_path
+    import server
+    import nodes
+    import execution
+    import comfy.model_management
+    from comfy_execution.progress import hijack_progress
+
+    stand_in = WorkerServer(events, worker_id)
+    server.PromptServer.instance = stand_in
+    asyncio.run(nodes.init_extra_nodes(init_custom_nodes=settings["init_custom_nodes"],
+                                       init_api_nodes=settings["init_api_nodes"]))
+    hijack_progress(stand_in)
+    executor = execution.PromptExecutor(stand_in, cache_type=execution.CacheType(settings["cache_type"]), cache_args=settings["cache_args"])
+
+    def watch_interrupt():
+        while True:
+            interrupt.wait()
+            interrupt.clear()
+            nodes.interrupt_processing()
+    threading.Thread(target=watch_interrupt, daemon=True).start()
+
+    events.put(("ready", worker_id, (os.getpid(), sorted(nodes.NODE_CLASS_MAPPINGS.keys()))))
+    need_gc = False
+    last_gc_collect = 0.0
+    while True:
+        try:
+            job = jobs.get(timeout=GC_COLLECT_INTERVAL if need_gc else None)
+        except queue.Empty:
+            job = ("idle",)
+        if job is None:
+            break
+
+        if job[0] == "execute":
+            _, item_id, prompt, prompt_id, extra_data, execute_outputs, sockets_metadata = job
+            stand_in.sockets_metadata = sockets_metadata
+            stand_in.last_prompt_id = prompt_id
+            start = time.perf_counter()
+            executor.execute(prompt, prompt_id, extra_data, execute_outputs)
+            events.put(("done", worker_id, (item_id, executor.history_result, executor.success,
+                                             executor.status_messages, time.perf_counter() - start)))
+            need_gc = True
+        elif job[0] == "flags":
+            flags = job[1]
+            free_memory = flags.get("free_memory", False)
+            if flags.get("unload_models", free_memory):
+                comfy.model_management.unload_all_models()
+                need_gc = True
+                last_gc_collect = 0.0
+            if free_memory:
+                executor.reset()
+                need_gc = True
+                last_gc_collect = 0.0
+
+        if need_gc and time.perf_counter() - last_gc_collect > GC_COLLECT_INTERVAL:
+            gc.collect()
+            comfy.model_management.soft_empty_cache()
+            last_gc_collect = time.perf_counter()
+            need_gc = False
+
+
+class WorkerHandle:
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process = None
+        self.jobs = None
+        self.interrupt = None
+        self.ready = False
+        # (item_id, queue item) while a prompt runs
+        self.running = None
+
+
+class PromptWorkerPool:
+    """
+    Usage:
+        pool = PromptWorkerPool(prompt_queue, server, workers=4, cache_type=..., cache_args=...)
+        pool.start()
+    """
+    def __init__(self, prompt_queue, server, workers: int, cache_type, cache_args: dict,
+                 init_custom_nodes=True, init_api_nodes=True, affinity=True, torch_threads=None):
+        self.prompt_queue = prompt_queue
+        self.server = server
+        self.cache_type = cache_type
+        self.cache_args = cache_args
+        self.init_custom_nodes = init_custom_nodes
+        self.init_api_nodes = init_api_nodes
+        if torch_threads is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        self.torch_threads = torch_threads
+        from comfy.cli_args import args
+        if args.async_image_save:
+            logging.warning("--async-image-save is ignored with --prompt-workers: images are saved before each node returns.")
+        self.scheduler = AffinityScheduler(affinity=affinity)
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.workers = [WorkerHandle(i) for i in range(workers)]
+        self.lock = threading.Condition()
+        self.running = False
+        self.stats = {"prompts": 0, "execution_time": 0.0}
+        # Node types of the server process the last ready worker doesn't have
+        self.missing_node_types = []
+
+    def settings(self) -> dict:
+        import folder_paths
+        from comfy.cli_args import args
+        worker_args = vars(args).copy()
+        # /view in the server process can't wait on saves still encoding in a
+        # worker, so workers finish their images before a node returns
+        worker_args["async_image_save"] = False
+        return {
+            "args": worker_args,
+            "folder_names_and_paths": {k: (list(v[0]), v[1]) for k, v in folder_paths.folder_names_and_paths.items()},
+            "output_directory": folder_paths.get_output_directory(),
+            "temp_directory": folder_paths.get_temp_directory(),
+            "input_directory": folder_paths.get_input_directory(),
+            "user_directory": folder_paths.get_user_directory(),
+            "init_custom_nodes": self.init_custom_nodes,
+            "init_api_nodes": self.init_api_nodes,
+            # The value, unpickling the enum would import execution before args are applied
+            "cache_type": self.cache_type.value,
+            "cache_args": self.cache_args,
+            "torch_threads": self.torch_threads,
+        }
+
+    def start(self) -> None:
+        self.running = True
+        self.prompt_queue.worker_pool = self
+        settings = self.settings()
+        for worker in self.workers:
+            self._spawn(worker, settings)
+        threading.Thread(target=self._event_loop, name="prompt_worker_events", daemon=True).start()
+        threading.Thread(target=self._dispatch_loop, name="prompt_worker_dispatch", daemon=True).start()
+
+    def _spawn(self, worker: WorkerHandle, settings: dict) -> None:
+        worker.jobs = self.context.Queue()
+        worker.interrupt = self.context.Event()
+        worker.ready = False
+        worker.process = self.context.Process(target=worker_main, name=f"prompt_worker_{worker.worker_id}",
+                                              args=(worker.worker_id, worker.jobs, self.events, worker.interrupt, settings),
+                                              daemon=True)
+        worker.process.start()
+
+    def wait_ready(self, timeout=None) -> bool:
+        with self.lock:
+            return self.lock.wait_for(lambda: all(w.ready for w in self.workers), timeout=timeout)
+
+    def stop(self) -> None:
+        self.running = False
+        for worker in self.workers:
+            worker.jobs.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self.prompt_queue.worker_pool = None
+
+    def interrupt(self, prompt_id=None) -> None:
+        with self.lock:
+            for worker in self.workers:
+                if worker.running is not None and (prompt_id is None or worker.running[1][1] == prompt_id):
+                    worker.interrupt.set()
+
+    def _idle_workers(self) -> list[int]:
+        return [w.worker_id for w in self.workers if w.ready and w.running is None]
+
+    def _dispatch_loop(self) -> None:
+        while self.running:
+            with self.lock:
+                self.lock.wait_for(lambda: not self.running or len(self._idle_workers()) > 0, timeout=1.0)
+                idle = self._idle_workers()
+            self._check_workers()
+            self._broadcast_flags()
+            if not idle:
+                continue
+
+            picked = []
+            def choose(candidates):
+                index, worker_id = self.scheduler.choose(idle, candidates)
+                picked.append(worker_id)
+                return index
+            queue_item = self.prompt_queue.get_with(choose, timeout=1.0, window=SCHEDULE_WINDOW)
+            if queue_item is None:
+                continue
+            item, item_id = queue_item
+            worker = self.workers[picked[-1]]
+            self.scheduler.started(worker.worker_id, item)
+
+            extra_data = item[3].copy()
+            for k in item[5]:
+                extra_data[k] = item[5][k]
+            client_id = extra_data.get("client_id")
+            sockets_metadata = {}
+            if client_id is not None and client_id in getattr(self.server, "sockets_metadata", {}):
+                sockets_metadata[client_id] = self.server.sockets_metadata[client_id]
+            with self.lock:
+                worker.running = (item_id, item)
+            self.server.last_prompt_id = item[1]
+            worker.jobs.put(("execute", item_id, item[2], item[1], extra_data, item[4], sockets_metadata))
+
+    def _broadcast_flags(self) -> None:
+        flags = self.prompt_queue.get_flags()
+        if flags:
+            if flags.get("unload_models", flags.get("free_memory", False)):
+                self.scheduler.reset()
+            for worker in self.workers:
+                worker.jobs.put(("flags", flags))
+
+    def _check_workers(self) -> None:
+        """Restarts workers that died, failing the prompt they were running."""
+        for worker in self.workers:
+            if worker.process is None or worker.process.is_alive():
+                continue
+            logging.error(f"Prompt worker {worker.worker_id} exited with code {worker.process.exitcode}, restarting it.")
+            with self.lock:
+                running, worker.running = worker.running, None
+            if running is not None:
+                self._finish(running[0], running[1], {"outputs": {}, "meta": {}}, False,
+                             [("execution_error", {"prompt_id": running[1][1], "exception_message": "Prompt worker process died"})])
+            self.scheduler.reset(worker.worker_id)
+            self._spawn(worker, self.settings())
+
+    def _check_node_types(self, worker_id: int, node_types: list[str]) -> None:
+        """Reports nodes that validate in the server process but failed to load in a worker."""
+        import nodes
+        missing = sorted(set(nodes.NODE_CLASS_MAPPINGS.keys()) - set(node_types))
+        self.missing_node_types = missing
+        if missing:
+            logging.error(f"Prompt worker {worker_id} failed to load these nodes, prompts using them will fail: {', '.join(missing)}")
+
+    def _finish(self, item_id, item, history_result, success, status_messages) -> None:
+        import execution
+        self.prompt_queue.task_done(item_id, history_result,
+                                    status=execution.PromptQueue.ExecutionStatus(
+                                        status_str='success' if success else 'error',
+                                        completed=success,
+                                        messages=status_messages),
+                                    process_item=lambda prompt: prompt[:5] + prompt[6:])
+        client_id = item[3].get("client_id")
+        if client_id is not None:
+            self.server.send_sync("executing", {"node": None, "prompt_id": item[1]}, client_id)
+
+    def _event_loop(self) -> None:
+        while True:
+            try:
+                kind, worker_id, payload = self.events.get(timeout=1.0)
+            except queue.Empty:
+                if not self.running:
+                    return
+                continue
+            worker = self.workers[worker_id]
+            if kind == "send":
+                self.server.send_sync(*payload)
+            elif kind == "progress_text":
+                self.server.send_progress_text(*payload)
+            elif kind == "ready":
+                pid, node_types = payload
+                logging.info(f"Prompt worker {worker_id} ready (pid {pid}).")
+                self._check_node_types(worker_id, node_types)
+                with self.lock:
+                    worker.ready = True
+                    self.lock.notify_all()
+            elif kind == "done":
+                item_id, history_result, success, status_messages, execution_time = payload
+                with self.lock:
+                    running, worker.running = worker.running, None
+                if running is not None:
+                    self._finish(item_id, running[1], history_result, success, status_messages)
+                self.stats["prompts"] += 1
+                self.stats["execution_time"] += execution_time
+                logging.info("Prompt executed on worker {} in {:.2f} seconds".format(worker_id, execution_time))
+                with self.lock:
+                    self.lock.notify_all()
+
+
+# --- BENCHMARK ---
+
+BENCHMARK_NODES = '''
+import time
+import torch
+
+class BenchModelLoader:
+    """Stands in for a checkpoint loader: "loading" takes load_seconds and the weights stay cached."""
+    RETURN_TYPES = ("BENCH_MODEL",)
+    FUNCTION = "load"
+    CATEGORY = "benchmark"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"model_name": ("STRING", {"default": "model_a.safetensors"}),
+                             "load_seconds": ("FLOAT", {"default": 1.0})}}
+
+    def load(self, model_name, load_seconds):
+        time.sleep(load_seconds)
+        generator = torch.Generator().manual_seed(sum(model_name.encode()))
+        return (torch.randn(256, 256, generator=generator),)
+
+class BenchSampler:
+    """CPU work proportional to steps."""
+    RETURN_TYPES = ("BENCH_LATENT",)
+    FUNCTION = "sample"
+    CATEGORY = "benchmark"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"model": ("BENCH_MODEL",), "seed": ("INT", {"default": 0}), "steps": ("INT", {"default": 20})}}
+
+    def sample(self, model, seed, steps):
+        x = torch.randn(256, 256, generator=torch.Generator().manual_seed(seed))
+        for _ in range(steps):
+            x = torch.tanh(x @ model)
+        return (x,)
+
+class BenchOutput:
+    RETURN_TYPES = ()
+    FUNCTION = "output"
+    OUTPUT_NODE = True
+    CATEGORY = "benchmark"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"latent": ("BENCH_LATENT",)}}
+
+    def output(self, latent):
+        return {"ui": {"mean": [float(latent.mean())]}}
+
+NODE_CLASS_MAPPINGS = {"BenchModelLoader": BenchModelLoader, "BenchSampler": BenchSampler, "BenchOutput": BenchOutput}
+'''
+
+
+def benchmark_prompt(model_name: str, seed: int, steps: int, load_seconds: float) -> dict:
+    return {
+        "1": {"class_type": "BenchModelLoader", "inputs": {"model_name": model_name, "load_seconds": load_seconds}},
+        "2": {"class_type": "BenchSampler", "inputs": {"model": ["1", 0], "seed": seed, "steps": steps}},
+        "3": {"class_type": "BenchOutput", "inputs": {"latent": ["2", 0]}},
+    }
+
+
+class BenchmarkServer:
+    def __init__(self):
+        self.number = 0
+        self.client_id = None
+        self.last_prompt_id = None
+        self.sockets_metadata = {}
+        self.messages = 0
+
+    def queue_updated(self):
+        pass
+
+    def send_sync(self, event, data, sid=None):
+        self.messages += 1
+
+    def send_progress_text(self, text, node_id, sid=None):
+        self.messages += 1
+
+
+def benchmark(workers=(1, 2), prompts=24, models=3, steps=40, load_seconds=1.0):
+    """Mixed workflows over a few models, queued in random model order, on pools of each size."""
+    import random
+    import tempfile
+    import folder_paths
+    import execution
+
+    rng = random.Random(0)
+    jobs = [(f"model_{rng.randrange(models)}.safetensors", i) for i in range(prompts)]
+    with tempfile.TemporaryDirectory() as custom_nodes:
+        with open(os.path.join(custom_nodes, "bench_nodes.py"), "w") as f:
+            f.write(BENCHMARK_NODES)
+        folder_paths.folder_names_and_paths["custom_nodes"] = ([custom_nodes], set())
+        for count in workers:
+            for affinity in ((False, True) if count > 1 else (False,)):
+                server = BenchmarkServer()
+                prompt_queue = execution.PromptQueue(server)
+                pool = PromptWorkerPool(prompt_queue, server, count, execution.CacheType.CLASSIC,
+                                        {"lru": 0, "ram": 0, "disk": 0}, init_api_nodes=False, affinity=affinity)
+                pool.start()
+                pool.wait_ready()
+                start = time.perf_counter()
+                for number, (model_name, seed) in enumerate(jobs):
+                    prompt = benchmark_prompt(model_name, seed, steps, load_seconds)
+                    prompt_queue.put((number, f"bench-{number}", prompt, {}, ["3"], {}))
+                while prompt_queue.get_tasks_remaining() > 0:
+                    time.sleep(0.05)
+                elapsed = time.perf_counter() - start
+                history = prompt_queue.get_history()
+                failed = sum(1 for entry in history.values() if not entry["status"]["completed"])
+                pool.stop()
+                label = f"{count} worker{'s' if count > 1 else ''}" + (", affinity" if affinity else (", fifo" if count > 1 else ""))
+                print(f"{label:>20}: {prompts} prompts in {elapsed:6.2f} s, "  # noqa: T201
+                      f"{pool.stats['execution_time'] / prompts:.2f} s/prompt executing, {failed} failed")
+
+
+if __name__ == "__main__":
+    import comfy.options
+    comfy.options.enable_args_parsing()
+    import comfy.cli_args  # noqa: F401
+    benchmark()
@@ -1,8 +1,11 @@
 import logging
 import os
 import json
+from io import BytesIO
 
 import numpy as np
+import safetensors
+import safetensors.torch
 import torch
 from PIL import Image
 from typing_extensions import override
@@ -944,6 +947,107 @@ class StripWhitespaceNode(TextProcessingNode):
 # ========== Group Processing Example Nodes ==========
 
 
+# ========== Helper Functions for Deduplication ==========
+
+
+HASH_METHODS = ["average", "difference", "perceptual"]
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix."""
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def image_hash(img, method="average"):
+    """Compute a 64-bit perceptual hash of a PIL image as an int.
+
+    average: 8x8 grayscale thumbnail compared to its mean (aHash).
+    difference: horizontal gradients of a 9x8 grayscale thumbnail (dHash).
+    perceptual: signs of the lowest 8x8 DCT coefficients of a 32x32 thumbnail
+        compared to their median (pHash).
+    """
+    if method == "average":
+        pixels = np.asarray(img.resize((8, 8), Image.Resampling.LANCZOS).convert("L"), dtype=np.float64)
+        bits = pixels > pixels.mean()
+    elif method == "difference":
+        pixels = np.asarray(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+        bits = pixels[:, 1:] > pixels[:, :-1]
+    elif method == "perceptual":
+        pixels = np.asarray(img.convert("L").resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+        low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+        bits = low > np.median(low.flatten()[1:])
+    else:
+        raise ValueError(f"Unknown hash method: {method}")
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def popcount64(values):
+    """Number of set bits of each element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class HammingIndex:
+    """Index of 64-bit hashes answering "which stored hash is within max_distance bits".
+
+    Uses multi-index hashing: the hashes are split into max_distance + 1
+    disjoint bit ranges, so by the pigeonhole principle any hash within
+    max_distance of a query matches it exactly on at least one range, and only
+    the hashes sharing a range value with the query are compared. When the
+    ranges get too narrow to be selective the stored hashes are scanned
+    instead, which is cheap since a large radius keeps few hashes apart.
+    """
+
+    MIN_CHUNK_BITS = 4
+
+    def __init__(self, max_distance, capacity):
+        self.max_distance = max_distance
+        self.hashes = np.zeros(max(capacity, 1), dtype=np.uint64)
+        self.ids = np.zeros(max(capacity, 1), dtype=np.int64)
+        self.size = 0
+        self.chunks = []
+        num_chunks = max_distance + 1
+        if 0 < num_chunks and 64 // num_chunks >= self.MIN_CHUNK_BITS:
+            bounds = [round(i * 64 / num_chunks) for i in range(num_chunks + 1)]
+            self.chunks = [(start, (1 << (stop - start)) - 1) for start, stop in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.chunks]
+
+    def add(self, value, item_id):
+        position = self.size
+        self.hashes[position] = value
+        self.ids[position] = item_id
+        self.size += 1
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            table.setdefault((value >> shift) & mask, []).append(position)
+
+    def search(self, value):
+        """Returns (id, distance) of the first stored hash within max_distance of value, or None."""
+        if self.max_distance < 0 or self.size == 0:
+            return None
+        if self.chunks:
+            positions = set()
+            for (shift, mask), table in zip(self.chunks, self.tables):
+                positions.update(table.get((value >> shift) & mask, ()))
+            if not positions:
+                return None
+            positions = np.fromiter(positions, dtype=np.int64, count=len(positions))
+        else:
+            positions = np.arange(self.size)
+        distances = popcount64(self.hashes[positions] ^ np.uint64(value))
+        matches = np.flatnonzero(distances <= self.max_distance)
+        if len(matches) == 0:
+            return None
+        best = matches[np.argmin(positions[matches])]
+        return int(self.ids[positions[best]]), int(distances[best])
+
+
 class ImageDeduplicationNode(ImageProcessingNode):
     """Remove duplicate or very similar images from the dataset using perceptual hashing."""
 
@@ -959,52 +1063,39 @@ class ImageDeduplicationNode(ImageProcessingNode):
             max=1.0,
             tooltip="Similarity threshold (0-1). Higher means more similar. Images above this threshold are considered duplicates.",
         ),
+        io.Combo.Input(
+            "hash_method",
+            options=HASH_METHODS,
+            default="average",
+            tooltip="Perceptual hash used to compare images. 'difference' and 'perceptual' are more robust to brightness and contrast changes than 'average'.",
+        ),
     ]
 
     @classmethod
-    def _group_process(cls, images, similarity_threshold):
+    def _group_process(cls, images, similarity_threshold, hash_method="average"):
         """Remove duplicate images using perceptual hashing."""
         if len(images) == 0:
             return []
 
-        # Compute simple perceptual hash for each image
-        def compute_hash(img_tensor):
-            """Compute a simple perceptual hash by resizing to 8x8 and comparing to average."""
-            img = tensor_to_pil(img_tensor)
-            # Resize to 8x8
-            img_small = img.resize((8, 8), Image.Resampling.LANCZOS).convert("L")
-            # Get pixels
-            pixels = list(img_small.getdata())
-            # Compute average
-            avg = sum(pixels) / len(pixels)
-            # Create hash (1 if above average, 0 otherwise)
-            hash_bits = "".join("1" if p > avg else "0" for p in pixels)
-            return hash_bits
-
-        def hamming_distance(hash1, hash2):
-            """Compute Hamming distance between two hash strings."""
-            return sum(c1 != c2 for c1, c2 in zip(hash1, hash2))
-
-        # Compute hashes for all images
-        hashes = [compute_hash(img) for img in images]
-
-        # Find duplicates
+        # Largest Hamming distance (out of 64 bits) still counted as a duplicate
+        max_distance = -1
+        for distance in range(65):
+            if 1.0 - (distance / 64.0) >= similarity_threshold:
+                max_distance = distance
+
+        index = HammingIndex(max_distance, len(images))
         keep_indices = []
-        for i in range(len(images)):
-            is_duplicate = False
-            for j in keep_indices:
-                # Compare hashes
-                distance = hamming_distance(hashes[i], hashes[j])
-                similarity = 1.0 - (distance / 64.0)  # 64 bits total
-                if similarity >= similarity_threshold:
-                    is_duplicate = True
-                    logging.info(
-                        f"Image {i} is similar to image {j} (similarity: {similarity:.3f}), skipping"
-                    )
-                    break
-
-            if not is_duplicate:
-                keep_indices.append(i)
+        for i, img in enumerate(images):
+            value = image_hash(tensor_to_pil(img), hash_method)
+            match = index.search(value)
+            if match is not None:
+                j, distance = match
+                logging.info(
+                    f"Image {i} is similar to image {j} (similarity: {1.0 - (distance / 64.0):.3f}), skipping"
+                )
+                continue
+            index.add(value, i)
+            keep_indices.append(i)
 
         # Return only unique images
         unique_images = [images[i] for i in keep_indices]
@@ -1211,6 +1302,121 @@ class MakeTrainingDataset(io.ComfyNode):
         return io.NodeOutput(latents_list, conditioning_list)
 
 
+# ========== Helper Functions for Training Dataset Shards ==========
+
+
+def _pack_sample(value, tensors, path="sample"):
+    """Replace the tensors of a sample with references into `tensors`, returning a JSON-able skeleton.
+
+    Values JSON can't hold are pickled into a uint8 tensor, as long as they
+    load back with torch.load(weights_only=True) like the old .pkl shards did.
+    """
+    if isinstance(value, torch.Tensor):
+        name = str(len(tensors))
+        tensors[name] = value.detach().to("cpu").contiguous().clone()
+        return {"__tensor__": name}
+    if isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        return {"__dict__": {k: _pack_sample(v, tensors, f"{path}[{k!r}]") for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"__tuple__" if isinstance(value, tuple) else "__list__": [_pack_sample(v, tensors, f"{path}[{i}]") for i, v in enumerate(value)]}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return _pack_pickled(value, tensors, path)
+
+
+def _pack_pickled(value, tensors, path):
+    buffer = BytesIO()
+    try:
+        torch.save(value, buffer)
+        torch.load(BytesIO(buffer.getvalue()), weights_only=True)
+    except Exception as e:
+        raise TypeError(f"Cannot save {path} ({type(value).__name__}) in a training dataset: {e}") from e
+    name = str(len(tensors))
+    tensors[name] = torch.frombuffer(bytearray(buffer.getvalue()), dtype=torch.uint8)
+    return {"__pickle__": name}
+
+
+def _unpack_sample(value, get_tensor):
+    if isinstance(value, dict):
+        if "__tensor__" in value:
+            return get_tensor(value["__tensor__"])
+        if "__pickle__" in value:
+            return torch.load(BytesIO(get_tensor(value["__pickle__"]).numpy().tobytes()), weights_only=True)
+        if "__dict__" in value:
+            return {k: _unpack_sample(v, get_tensor) for k, v in value["__dict__"].items()}
+        if "__tuple__" in value:
+            return tuple(_unpack_sample(v, get_tensor) for v in value["__tuple__"])
+        return [_unpack_sample(v, get_tensor) for v in value["__list__"]]
+    return value
+
+
+def save_training_shard(path, latents, conditioning):
+    """Save (latent, conditioning) samples as a safetensors shard.
+
+    Tensors are stored flat in the file, the structure of each sample is kept
+    as JSON in the safetensors metadata.
+    """
+    tensors = {}
+    samples = [_pack_sample([latent, cond], tensors, f"sample {i}") for i, (latent, cond) in enumerate(zip(latents, conditioning))]
+    safetensors.torch.save_file(tensors, path, metadata={"samples": json.dumps(samples)})
+
+
+def load_training_shard(path):
+    """Load the samples of a safetensors shard as (latents, conditioning).
+
+    The tensors are memory-mapped from the file, so they are paged in as
+    training touches them instead of all being read upfront.
+    """
+    with safetensors.safe_open(path, framework="pt", device="cpu") as f:
+        samples = json.loads(f.metadata()["samples"])
+        unpacked = [_unpack_sample(sample, f.get_tensor) for sample in samples]
+    return [sample[0] for sample in unpacked], [sample[1] for sample in unpacked]
+
+
+def read_dataset_index(dataset_dir):
+    """Return the metadata.json index of a dataset, or None if it has none (older datasets)."""
+    metadata_path = os.path.join(dataset_dir, "metadata.json")
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, "r") as f:
+        return json.load(f)
+
+
+def write_dataset_index(dataset_dir, shards, shard_size):
+    metadata = {
+        "format": "safetensors",
+        "num_samples": sum(shard["num_samples"] for shard in shards),
+        "num_shards": len(shards),
+        "shard_size": shard_size,
+        "shards": shards,
+    }
+    with open(os.path.join(dataset_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def convert_pkl_dataset(dataset_dir):
+    """Convert the shard_XXXX.pkl files of a dataset to safetensors shards and index them.
+
+    The .pkl files are left in place; once the index exists they are ignored.
+    """
+    shard_files = sorted(f for f in os.listdir(dataset_dir) if f.startswith("shard_") and f.endswith(".pkl"))
+    if not shard_files:
+        raise ValueError(f"No .pkl shard files found in {dataset_dir}")
+
+    shards = []
+    shard_size = 0
+    for shard_file in shard_files:
+        with open(os.path.join(dataset_dir, shard_file), "rb") as f:
+            shard_data = torch.load(f, weights_only=True)
+        filename = shard_file[:-len(".pkl")] + ".safetensors"
+        save_training_shard(os.path.join(dataset_dir, filename), shard_data["latents"], shard_data["conditioning"])
+        shards.append({"file": filename, "num_samples": len(shard_data["latents"])})
+        shard_size = max(shard_size, len(shard_data["latents"]))
+        logging.info(f"Converted {shard_file} to {filename} ({len(shard_data['latents'])} samples)")
+    return write_dataset_index(dataset_dir, shards, shard_size)
+
+
 class SaveTrainingDataset(io.ComfyNode):
     """Save encoded training dataset (latents + conditioning) to disk."""
 
@@ -1277,36 +1483,23 @@ class SaveTrainingDataset(io.ComfyNode):
         )
 
         # Save data in shards
+        shards = []
         for shard_idx in range(num_shards):
             start_idx = shard_idx * shard_size
             end_idx = min(start_idx + shard_size, num_samples)
 
-            # Get shard data (list of latent dicts and conditioning lists)
-            shard_data = {
-                "latents": latents[start_idx:end_idx],
-                "conditioning": conditioning[start_idx:end_idx],
-            }
-
             # Save shard
-            shard_filename = f"shard_{shard_idx:04d}.pkl"
+            shard_filename = f"shard_{shard_idx:04d}.safetensors"
             shard_path = os.path.join(output_dir, shard_filename)
-
-            with open(shard_path, "wb") as f:
-                torch.save(shard_data, f)
+            save_training_shard(shard_path, latents[start_idx:end_idx], conditioning[start_idx:end_idx])
+            shards.append({"file": shard_filename, "num_samples": end_idx - start_idx})
 
             logging.info(
                 f"Saved shard {shard_idx + 1}/{num_shards}: {shard_filename} ({end_idx - start_idx} samples)"
             )
 
-        # Save metadata
-        metadata = {
-            "num_samples": num_samples,
-            "num_shards": num_shards,
-            "shard_size": shard_size,
-        }
-        metadata_path = os.path.join(output_dir, "metadata.json")
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f, indent=2)
+        # Save metadata, which doubles as the shard index
+        write_dataset_index(output_dir, shards, shard_size)
 
         logging.info(f"Successfully saved {num_samples} samples to {output_dir}.")
         return io.NodeOutput()
@@ -1351,7 +1544,28 @@ class LoadTrainingDataset(io.ComfyNode):
         if not os.path.exists(dataset_dir):
             raise ValueError(f"Dataset directory not found: {dataset_dir}")
 
-        # Find all shard files
+        index = read_dataset_index(dataset_dir)
+        if index is not None and index.get("format") == "safetensors":
+            logging.info(f"Loading {len(index['shards'])} shards from {dataset_dir}...")
+
+            all_latents = []  # list[{"samples": tensor}]
+            all_conditioning = []  # list[list[cond]]
+            for shard in index["shards"]:
+                latents, conditioning = load_training_shard(os.path.join(dataset_dir, shard["file"]))
+                all_latents.extend(latents)
+                all_conditioning.extend(conditioning)
+                logging.info(f"Loaded {shard['file']}: {len(latents)} samples")
+        else:
+            all_latents, all_conditioning = cls.load_pkl_shards(dataset_dir)
+
+        logging.info(
+            f"Successfully loaded {len(all_latents)} samples from {dataset_dir}."
+        )
+        return io.NodeOutput(all_latents, all_conditioning)
+
+    @classmethod
+    def load_pkl_shards(cls, dataset_dir):
+        """Load a dataset saved as shard_XXXX.pkl files before shards were safetensors."""
         shard_files = sorted(
             [
                 f
@@ -1364,8 +1578,8 @@ class LoadTrainingDataset(io.ComfyNode):
             raise ValueError(f"No shard files found in {dataset_dir}")
 
         logging.info(f"Loading {len(shard_files)} shards from {dataset_dir}...")
+        logging.info("This dataset uses the old .pkl shard format, use Convert Training Dataset to memory-map it.")
 
-        # Load all shards
         all_latents = []  # list[{"samples": tensor}]
         all_conditioning = []  # list[list[cond]]
 
@@ -1380,10 +1594,40 @@ class LoadTrainingDataset(io.ComfyNode):
 
             logging.info(f"Loaded {shard_file}: {len(shard_data['latents'])} samples")
 
-        logging.info(
-            f"Successfully loaded {len(all_latents)} samples from {dataset_dir}."
+        return all_latents, all_conditioning
+
+
+class ConvertTrainingDataset(io.ComfyNode):
+    """Convert a training dataset saved as .pkl shards to indexed safetensors shards."""
+
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id="ConvertTrainingDataset",
+            display_name="Convert Training Dataset",
+            category="dataset",
+            is_experimental=True,
+            is_output_node=True,
+            inputs=[
+                io.String.Input(
+                    "folder_name",
+                    default="training_dataset",
+                    tooltip="Name of folder containing the .pkl dataset (inside output directory).",
+                ),
+            ],
+            outputs=[],
         )
-        return io.NodeOutput(all_latents, all_conditioning)
+
+    @classmethod
+    def execute(cls, folder_name):
+        dataset_dir = os.path.join(folder_paths.get_output_directory(), folder_name)
+
+        if not os.path.exists(dataset_dir):
+            raise ValueError(f"Dataset directory not found: {dataset_dir}")
+
+        metadata = convert_pkl_dataset(dataset_dir)
+        logging.info(f"Converted {metadata['num_samples']} samples in {dataset_dir} to safetensors shards.")
+        return io.NodeOutput()
 
 
 # ========== Extension Setup ==========
@@ -1425,6 +1669,7 @@ class DatasetExtension(ComfyExtension):
             MakeTrainingDataset,
             SaveTrainingDataset,
             LoadTrainingDataset,
+            ConvertTrainingDataset,
         ]
 
 
@@ -2,6 +2,7 @@ import copy
 import heapq
 import inspect
 import logging
+import os
 import sys
 import threading
 import time
@@ -13,6 +14,7 @@ import asyncio
 import torch
 
 import comfy.model_management
+import folder_paths
 import nodes
 from comfy_execution.caching import (
     BasicCache,
@@ -22,6 +24,7 @@ from comfy_execution.caching import (
     HierarchicalCache,
     LRUCache,
     RAMPressureCache,
+    RAMDiskCache,
 )
 from comfy_execution.graph import (
     DynamicPrompt,
@@ -33,6 +36,7 @@ from comfy_execution.graph_utils import GraphBuilder, is_link
 from comfy_execution.validation import validate_node_input
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
 from comfy_execution.utils import CurrentNodeContext
+from comfy_execution import image_saver
 from comfy_api.internal import _ComfyNodeInternal, _NodeOutputInternal, first_real_override, is_class, make_locked_method_func
 from comfy_api.latest import io, _io
 
@@ -99,6 +103,7 @@ class CacheType(Enum):
     LRU = 1
     NONE = 2
     RAM_PRESSURE = 3
+    RAM_DISK = 4
 
 
 class CacheSet:
@@ -110,6 +115,10 @@ class CacheSet:
             cache_ram = cache_args.get("ram", 16.0)
             self.init_ram_cache(cache_ram)
             logging.info("Using RAM pressure cache.")
+        elif cache_type == CacheType.RAM_DISK:
+            cache_disk = cache_args.get("disk", 16.0)
+            self.init_ram_disk_cache(cache_disk)
+            logging.info("Using RAM pressure cache with a {}GB disk spill tier.".format(cache_disk))
         elif cache_type == CacheType.LRU:
             cache_size = cache_args.get("lru", 0)
             self.init_lru_cache(cache_size)
@@ -132,6 +141,12 @@ class CacheSet:
         self.outputs = RAMPressureCache(CacheKeySetInputSignature)
         self.objects = HierarchicalCache(CacheKeySetID)
 
+    def init_ram_disk_cache(self, max_disk_gb):
+        # Per process, prompt workers (--prompt-workers) share the temp directory
+        spill_directory = os.path.join(folder_paths.get_temp_directory(), "cache_spill", str(os.getpid()))
+        self.outputs = RAMDiskCache(CacheKeySetInputSignature, spill_directory, int(max_disk_gb * (1024**3)))
+        self.objects = HierarchicalCache(CacheKeySetID)
+
     def init_null_cache(self):
         self.outputs = NullCache()
         self.objects = NullCache()
@@ -639,7 +654,7 @@ class PromptExecutor:
 
     def handle_execution_error(self, prompt_id, prompt, current_outputs, executed, error, ex):
         node_id = error["node_id"]
-        class_type = prompt[node_id]["class_type"]
+        class_type = prompt[node_id]["class_type"] if node_id in prompt else None
 
         # First, send back the status to the frontend depending
         # on the exception type
@@ -665,6 +680,25 @@ class PromptExecutor:
             }
             self.add_message("execution_error", mes, broadcast=False)
 
+    async def wait_for_image_saves(self, prompt_id, dynamic_prompt, current_outputs, executed, report):
+        failed = await asyncio.to_thread(image_saver.image_saver.wait_for_saves)
+        if len(failed) == 0:
+            return
+        self.success = False
+        if not report:
+            return
+        node_id, ex = failed[0]
+        if node_id is not None and dynamic_prompt.has_node(node_id):
+            node_id = dynamic_prompt.get_real_node_id(node_id)
+        error = {
+            "node_id": node_id,
+            "exception_message": "Failed to save image: {}".format(ex),
+            "exception_type": full_type_name(type(ex)),
+            "traceback": traceback.format_tb(ex.__traceback__),
+            "current_inputs": {},
+        }
+        self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
+
     def execute(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
         asyncio.run(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
 
@@ -703,6 +737,7 @@ class PromptExecutor:
             executed = set()
             execution_list = ExecutionList(dynamic_prompt, self.caches.outputs)
             current_outputs = self.caches.outputs.all_node_ids()
+            completed = False
             for node_id in list(execute_outputs):
                 execution_list.add_node(node_id)
 
@@ -725,6 +760,13 @@ class PromptExecutor:
                 self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
             else:
                 # Only execute when the while-loop ends without break
+                completed = True
+
+            # Images still being encoded are finished before the prompt is
+            # reported as done and the history entry that points at them gets
+            # published. A failed save fails a prompt that otherwise succeeded.
+            await self.wait_for_image_saves(prompt_id, dynamic_prompt, current_outputs, executed, report=completed)
+            if completed and self.success:
                 self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
 
             ui_outputs = {}
@@ -1104,8 +1146,36 @@ class PromptQueue:
         self.currently_running = {}
         self.history = {}
         self.flags = {}
+        self.store = None
+        # Set when prompts run on a comfy_execution.worker_pool.PromptWorkerPool
+        self.worker_pool = None
+
+    def enable_store(self, store):
+        """
+        Keep history and pending queue items in a persistent store (see
+        app.prompt_store.PromptStore) instead of memory. Queue items left over
+        from a previous run are requeued.
+        """
+        with self.mutex:
+            self.store = store
+            restored = store.get_queue_items()
+            for item in restored:
+                heapq.heappush(self.queue, item)
+            if len(restored) > 0:
+                logging.info("Restored {} pending prompts from the database.".format(len(restored)))
+                self.server.number = max(self.server.number, int(max(item[0] for item in restored)) + 1)
+                self.server.queue_updated()
+                self.not_empty.notify()
+
+    def _store_call(self, func, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            logging.error("Prompt store error: {}".format(e))
 
     def put(self, item):
+        if self.store is not None:
+            self._store_call(self.store.add_queue_item, item)
         with self.mutex:
             heapq.heappush(self.queue, item)
             self.server.queue_updated()
@@ -1124,6 +1194,37 @@ class PromptQueue:
             self.server.queue_updated()
             return (item, i)
 
+    def get_with(self, choose, timeout=None, window=None):
+        """
+        Like get(), but choose(candidates) decides which item runs: candidates
+        are the first `window` items (all if None) in queue order, choose
+        returns an index into them or None to wait for the queue to change.
+        """
+        with self.not_empty:
+            while True:
+                if len(self.queue) > 0:
+                    candidates = heapq.nsmallest(window or len(self.queue), self.queue)
+                    index = choose(candidates)
+                    if index is not None:
+                        break
+                if not self.not_empty.wait(timeout=timeout):
+                    return None
+            item = candidates[index]
+            self.queue.remove(item)
+            heapq.heapify(self.queue)
+            i = self.task_counter
+            self.currently_running[i] = copy.deepcopy(item)
+            self.task_counter += 1
+            self.server.queue_updated()
+            return (item, i)
+
+    def interrupt(self, prompt_id=None):
+        """Interrupts the running prompt with this id, or all running prompts."""
+        if self.worker_pool is not None:
+            self.worker_pool.interrupt(prompt_id)
+        else:
+            nodes.interrupt_processing()
+
     class ExecutionStatus(NamedTuple):
         status_str: Literal['success', 'error']
         completed: bool
@@ -1133,7 +1234,7 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
+            if self.store is None and len(self.history) > MAXIMUM_HISTORY_SIZE:
                 self.history.pop(next(iter(self.history)))
 
             status_dict: Optional[dict] = None
@@ -1143,12 +1244,16 @@ class PromptQueue:
             if process_item is not None:
                 prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
+            entry = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
+            entry.update(history_result)
+            if self.store is not None:
+                self._store_call(self.store.add_history, prompt[1], entry)
+            else:
+                self.history[prompt[1]] = entry
             self.server.queue_updated()
 
     # Note: slow
@@ -1173,12 +1278,16 @@ class PromptQueue:
     def wipe_queue(self):
         with self.mutex:
             self.queue = []
+            if self.store is not None:
+                self._store_call(self.store.clear_queue, [x[1] for x in self.currently_running.values()])
             self.server.queue_updated()
 
     def delete_queue_item(self, function):
         with self.mutex:
             for x in range(len(self.queue)):
                 if function(self.queue[x]):
+                    if self.store is not None:
+                        self._store_call(self.store.remove_queue_item, self.queue[x][1])
                     if len(self.queue) == 1:
                         self.wipe_queue()
                     else:
@@ -1189,6 +1298,12 @@ class PromptQueue:
         return False
 
     def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
+        if self.store is not None:
+            # Entries are decoded fresh from the store, so no copy or lock is needed
+            history = self._store_call(self.store.get_history, prompt_id, max_items, offset) or {}
+            if map_function is not None:
+                history = {k: map_function(v) for k, v in history.items()}
+            return history
         with self.mutex:
             if prompt_id is None:
                 out = {}
@@ -1216,10 +1331,14 @@ class PromptQueue:
                 return {}
 
     def wipe_history(self):
+        if self.store is not None:
+            self._store_call(self.store.wipe_history)
         with self.mutex:
             self.history = {}
 
     def delete_history_item(self, id_to_delete):
+        if self.store is not None:
+            self._store_call(self.store.delete_history, id_to_delete)
         with self.mutex:
             self.history.pop(id_to_delete, None)
 
@@ -4,8 +4,11 @@ import os
 import time
 import mimetypes
 import logging
-from typing import Literal, List
-from collections.abc import Collection
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import BinaryIO, Literal, List
+from collections.abc import Collection, Iterator
 
 from comfy.cli_args import args
 
@@ -59,6 +62,26 @@ user_directory = os.path.join(base_path, "user")
 
 filename_list_cache: dict[str, tuple[list[str], dict[str, float], float]] = {}
 
+# Number of folder lookups (the directory getters, get_folder_paths, get_filename_list) made
+# under track_folder_lookups in the current context; None when nothing is tracking them.
+# comfy_execution.node_registry uses it to tell whether a node info depends on the model folders.
+_folder_lookups: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("folder_lookups", default=None)
+
+def _note_folder_lookup() -> None:
+    lookups = _folder_lookups.get()
+    if lookups is not None:
+        lookups[0] += 1
+
+@contextmanager
+def track_folder_lookups() -> Iterator[list[int]]:
+    """Yields a one-item list counting the folder lookups made in this context until it exits."""
+    lookups = [0]
+    token = _folder_lookups.set(lookups)
+    try:
+        yield lookups
+    finally:
+        _folder_lookups.reset(token)
+
 class CacheHelper:
     """
     Helper class for managing file list cache data.
@@ -89,6 +112,143 @@ class CacheHelper:
 
 cache_helper = CacheHelper()
 
+# Set by enable_model_index (--model-index): filename lists are then served from an incrementally updated index
+model_index = None
+
+def enable_model_index(mode: str = "auto") -> None:
+    global model_index
+    from app.model_index import ModelFolderIndex
+    if model_index is not None:
+        model_index.close()
+    model_index = ModelFolderIndex(mode)
+    logging.info(f"Model folders are indexed using {model_index.mode}.")
+
+def disable_model_index() -> None:
+    global model_index
+    if model_index is not None:
+        model_index.close()
+        model_index = None
+
+class SaveCounterIndex:
+    """
+    In-memory index of the file names in one output folder, used to hand out
+    the next save counter for a filename prefix without listing and parsing the
+    whole folder on every save.
+
+    The index is validated against the directory mtime. Saves made through
+    note_saved_file() update it in place and take the folder's new mtime as
+    synced; any other change to the folder is picked up by diffing a fresh
+    listing against the known names, so only new files are parsed (a deletion
+    rebuilds the affected counters).
+    """
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.mtime_ns: int | None = None
+        self.files: set[str] = set()
+        # normcase(prefix) -> (prefix length, highest counter or None)
+        self.counters: dict[str, tuple[int, int | None]] = {}
+
+    @staticmethod
+    def _parse(name: str, prefix_key: str, prefix_len: int) -> int | None:
+        if len(name) <= prefix_len or name[prefix_len] != "_" or os.path.normcase(name[:prefix_len]) != prefix_key:
+            return None
+        try:
+            return int(name[prefix_len + 1:].split('_')[0])
+        except:
+            return 0
+
+    def _add(self, name: str) -> None:
+        self.files.add(name)
+        for prefix_key, (prefix_len, highest) in self.counters.items():
+            digits = self._parse(name, prefix_key, prefix_len)
+            if digits is not None and (highest is None or digits > highest):
+                self.counters[prefix_key] = (prefix_len, digits)
+
+    def _count(self, prefix_key: str, prefix_len: int) -> None:
+        highest = None
+        for name in self.files:
+            digits = self._parse(name, prefix_key, prefix_len)
+            if digits is not None and (highest is None or digits > highest):
+                highest = digits
+        self.counters[prefix_key] = (prefix_len, highest)
+
+    def sync(self) -> None:
+        mtime_ns = os.stat(self.folder).st_mtime_ns
+        if mtime_ns == self.mtime_ns:
+            return
+        current = set(os.listdir(self.folder))
+        removed = self.files - current
+        added = current - self.files
+        if removed:
+            self.files = current
+            for prefix_key, (prefix_len, _) in list(self.counters.items()):
+                self._count(prefix_key, prefix_len)
+        else:
+            for name in added:
+                self._add(name)
+        self.mtime_ns = mtime_ns
+
+    def next_counter(self, filename: str) -> int:
+        self.sync()
+        prefix_key = os.path.normcase(filename)
+        if prefix_key not in self.counters:
+            self._count(prefix_key, len(filename))
+        highest = self.counters[prefix_key][1]
+        return 1 if highest is None else highest + 1
+
+    def note_saved(self, name: str) -> None:
+        self._add(name)
+        # A file another writer created since the last sync is missed here,
+        # but saves are created exclusively (create_save_file), which moves on
+        # to the next counter instead of overwriting it.
+        if self.mtime_ns is not None:
+            self.mtime_ns = os.stat(self.folder).st_mtime_ns
+
+save_counter_indexes: dict[str, SaveCounterIndex] = {}
+save_counter_lock = threading.Lock()
+
+def _get_save_counter_index(full_output_folder: str) -> SaveCounterIndex:
+    key = os.path.normcase(os.path.abspath(full_output_folder))
+    index = save_counter_indexes.get(key)
+    if index is None:
+        index = SaveCounterIndex(full_output_folder)
+        save_counter_indexes[key] = index
+    return index
+
+def note_saved_file(full_output_folder: str, file: str) -> None:
+    """
+    Tell the save counter index about a file just written to a folder returned
+    by get_save_image_path, so the next save there doesn't need a listing.
+    """
+    with save_counter_lock:
+        try:
+            _get_save_counter_index(full_output_folder).note_saved(file)
+        except OSError:
+            save_counter_indexes.pop(os.path.normcase(os.path.abspath(full_output_folder)), None)
+
+def create_save_file(full_output_folder: str, filename: str, counter: int, extension: str) -> tuple[str, int, BinaryIO]:
+    """
+    Exclusively creates {filename}_{counter:05}_.{extension} in a folder
+    returned by get_save_image_path, moving on to the next counter while the
+    name is taken.
+    Other processes (prompt workers, a second ComfyUI on the same output
+    folder) can be handed the same counter, so an existing file is never
+    opened for truncation.
+
+    Returns (file name, counter, file opened for binary writing). The file is
+    noted in the save counter index, and so are the taken names skipped.
+    """
+    while True:
+        file = f"{filename}_{counter:05}_.{extension}"
+        try:
+            f = open(os.path.join(full_output_folder, file), "xb")
+        except FileExistsError:
+            note_saved_file(full_output_folder, file)
+            counter += 1
+            continue
+        note_saved_file(full_output_folder, file)
+        return file, counter, f
+
 extension_mimetypes_cache = {
     "webp" : "image",
     "fbx" : "model",
@@ -119,17 +279,21 @@ def set_input_directory(input_dir: str) -> None:
 
 def get_output_directory() -> str:
     global output_directory
+    _note_folder_lookup()
     return output_directory
 
 def get_temp_directory() -> str:
     global temp_directory
+    _note_folder_lookup()
     return temp_directory
 
 def get_input_directory() -> str:
     global input_directory
+    _note_folder_lookup()
     return input_directory
 
 def get_user_directory() -> str:
+    _note_folder_lookup()
     return user_directory
 
 def set_user_directory(user_dir: str) -> None:
@@ -297,6 +461,7 @@ def add_model_folder_path(folder_name: str, full_folder_path: str, is_default: b
         folder_names_and_paths[folder_name] = ([full_folder_path], set())
 
 def get_folder_paths(folder_name: str) -> list[str]:
+    _note_folder_lookup()
     folder_name = map_legacy(folder_name)
     return folder_names_and_paths[folder_name][0][:]
 
@@ -416,7 +581,11 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
     return out
 
 def get_filename_list(folder_name: str) -> list[str]:
+    _note_folder_lookup()
     folder_name = map_legacy(folder_name)
+    if model_index is not None:
+        paths, extensions = folder_names_and_paths[folder_name]
+        return list(model_index.filename_list(folder_name, paths, extensions))
     out = cached_filename_list_(folder_name)
     if out is None:
         out = get_filename_list_(folder_name)
@@ -426,15 +595,6 @@ def get_filename_list(folder_name: str) -> list[str]:
     return list(out[0])
 
 def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
-    def map_filename(filename: str) -> tuple[int, str]:
-        prefix_len = len(os.path.basename(filename_prefix))
-        prefix = filename[:prefix_len + 1]
-        try:
-            digits = int(filename[prefix_len + 1:].split('_')[0])
-        except:
-            digits = 0
-        return digits, prefix
-
     def compute_vars(input: str, image_width: int, image_height: int) -> str:
         input = input.replace("%width%", str(image_width))
         input = input.replace("%height%", str(image_height))
@@ -463,13 +623,13 @@ def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, im
         logging.error(err)
         raise Exception(err)
 
-    try:
-        counter = max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
-    except ValueError:
-        counter = 1
-    except FileNotFoundError:
-        os.makedirs(full_output_folder, exist_ok=True)
-        counter = 1
+    with save_counter_lock:
+        try:
+            counter = _get_save_counter_index(full_output_folder).next_counter(filename)
+        except FileNotFoundError:
+            save_counter_indexes.pop(os.path.normcase(os.path.abspath(full_output_folder)), None)
+            os.makedirs(full_output_folder, exist_ok=True)
+            counter = 1
     return full_output_folder, filename, counter, subfolder, filename_prefix
 
 def get_input_subfolders() -> list[str]:
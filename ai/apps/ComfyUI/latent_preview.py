@@ -1,16 +1,27 @@
 import torch
-from PIL import Image
+from PIL import Image, ImageOps
 from comfy.cli_args import args, LatentPreviewMethod
 from comfy.taesd.taesd import TAESD
 from comfy.sd import VAE
+from comfy_execution.progress import encode_preview_image
 import comfy.model_management
 import folder_paths
 import comfy.utils
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 MAX_PREVIEW_RESOLUTION = args.preview_size
 VIDEO_TAES = ["taehv", "lighttaew2_2", "lighttaew2_1", "lighttaehy1_5"]
 
+# Largest share of the sampling time spent decoding previews
+PREVIEW_TIME_BUDGET = 0.25
+# Previews shrink down to this fraction of the preview size while clients lag behind
+MIN_PREVIEW_SCALE = 0.25
+# Steps without backlog before the preview size doubles again
+PREVIEW_RECOVER_STEPS = 4
+
 def preview_to_image(latent_image, do_scale=True):
         if do_scale:
             latents_ubyte = (((latent_image + 1.0) / 2.0).clamp(0, 1)  # change scale from -1..1 to 0..1
@@ -27,6 +38,9 @@ def preview_to_image(latent_image, do_scale=True):
         return Image.fromarray(latents_ubyte.numpy())
 
 class LatentPreviewer:
+    # Whether PreviewPipeline may decode on its background thread
+    off_thread = True
+
     def decode_latent_to_preview(self, x0):
         pass
 
@@ -43,6 +57,10 @@ class TAESDPreviewerImpl(LatentPreviewer):
         return preview_to_image(x_sample)
 
 class TAEHVPreviewerImpl(TAESDPreviewerImpl):
+    # comfy.sd.VAE.decode loads the model through model_management, which the
+    # sampler thread uses at the same time and which isn't thread safe.
+    off_thread = False
+
     def decode_latent_to_preview(self, x0):
         x_sample = self.taesd.decode(x0[:1, :, :1])[0][0]
         return preview_to_image(x_sample, do_scale=False)
@@ -107,21 +125,159 @@ def get_previewer(device, latent_format):
                 previewer = Latent2RGBPreviewer(latent_format.latent_rgb_factors, latent_format.latent_rgb_factors_bias, latent_format.latent_rgb_factors_reshape)
     return previewer
 
+_preview_executor = None
+_preview_executor_lock = threading.Lock()
+
+def preview_executor():
+    global _preview_executor
+    with _preview_executor_lock:
+        if _preview_executor is None:
+            _preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="latent_preview")
+        return _preview_executor
+
+def preview_server():
+    """The server previews are sent to, None outside of a ComfyUI server."""
+    try:
+        from server import PromptServer
+    except ImportError:
+        return None
+    return getattr(PromptServer, "instance", None)
+
+class PreviewPipeline:
+    """
+    Makes sampler step previews without holding up sampling.
+
+    The latest x0 is decoded and encoded on a background thread and goes
+    out with the progress update of the step after it is done; steps that
+    arrive while a preview is being made are skipped. Decoding is spaced so
+    it takes at most PREVIEW_TIME_BUDGET of the time, so slow steps get a
+    preview each and fast ones fewer. While previews queue up on the
+    server for the client, no new ones are made and their size shrinks.
+    Nothing is decoded (and no previewer loaded) while no client receives
+    previews. The last step is always previewed. Previewers that aren't
+    off_thread are decoded on the sampler thread, with the same spacing.
+    """
+    def __init__(self, load_previewer, preview_format="JPEG", server=None, max_size=MAX_PREVIEW_RESOLUTION):
+        self.load_previewer = load_previewer
+        self.previewer = None
+        self.loaded = False
+        self.preview_format = preview_format
+        self.server = server
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.pending = None
+        self.ready = None
+        self.decode_time = None
+        self.next_decode = 0.0
+        self.scale = 1.0
+        self.clean_steps = 0
+        self.stats = {"steps": 0, "decoded": 0, "sent": 0}
+
+    def subscribed(self):
+        check = getattr(self.server, "preview_subscribed", None)
+        return check is None or check(self.server.client_id)
+
+    def backlog(self):
+        check = getattr(self.server, "previews_pending", None)
+        return 0 if check is None else check(self.server.client_id)
+
+    def step(self, x0, last=False):
+        """Call on each sampler step, returns the preview to send with its progress or None."""
+        self.stats["steps"] += 1
+        if not self.subscribed():
+            return None
+        if not self.loaded:
+            self.previewer = self.load_previewer()
+            self.loaded = True
+        if self.previewer is None:
+            return None
+
+        if last:
+            self.submit(x0)
+            self.idle.wait()
+            return self.take()
+
+        if self.backlog() > 0:
+            self.scale = max(MIN_PREVIEW_SCALE, self.scale / 2)
+            self.clean_steps = 0
+            return None
+        self.clean_steps += 1
+        if self.scale < 1.0 and self.clean_steps >= PREVIEW_RECOVER_STEPS:
+            self.scale = min(1.0, self.scale * 2)
+            self.clean_steps = 0
+
+        if self.idle.is_set() and time.perf_counter() >= self.next_decode:
+            self.submit(x0)
+        return self.take()
+
+    def take(self):
+        with self.lock:
+            preview, self.ready = self.ready, None
+        if preview is not None:
+            self.stats["sent"] += 1
+        return preview
+
+    def submit(self, x0):
+        with self.lock:
+            # A copy, the sampler may reuse the tensor for the next step
+            self.pending = (x0[:1].clone(), self.scale)
+            if not self.idle.is_set():
+                return
+            self.idle.clear()
+        if getattr(self.previewer, "off_thread", True):
+            preview_executor().submit(self.run)
+        else:
+            self.run()
+
+    def run(self):
+        while True:
+            with self.lock:
+                job, self.pending = self.pending, None
+                if job is None:
+                    self.idle.set()
+                    return
+            start = time.perf_counter()
+            try:
+                preview = self.decode(*job)
+            except Exception as e:
+                logging.warning("Failed to make latent preview: {}".format(e))
+                preview = None
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.decode_time = elapsed if self.decode_time is None else 0.7 * self.decode_time + 0.3 * elapsed
+                self.next_decode = time.perf_counter() + self.decode_time * (1.0 / PREVIEW_TIME_BUDGET - 1.0)
+                if preview is not None:
+                    self.ready = preview
+                    self.stats["decoded"] += 1
+
+    def decode(self, x0, scale):
+        max_size = self.max_size
+        if scale < 1.0:
+            max_size = max(1, int(max_size * scale))
+            if type(self.previewer) is TAESDPreviewerImpl and x0.ndim == 4 and min(x0.shape[-2:]) * scale >= 8:
+                # Decoding a smaller latent is much cheaper than shrinking the full preview
+                x0 = torch.nn.functional.interpolate(x0, scale_factor=scale, mode="bilinear")
+        preview = self.previewer.decode_latent_to_preview_image(self.preview_format, x0)
+        image_type, image = preview[0], preview[1]
+        if max_size is not None:
+            image = ImageOps.contain(image, (max_size, max_size), Image.Resampling.BILINEAR)
+        return (image_type, image, max_size, encode_preview_image((image_type, image, None)))
+
 def prepare_callback(model, steps, x0_output_dict=None):
     preview_format = "JPEG"
     if preview_format not in ["JPEG", "PNG"]:
         preview_format = "JPEG"
 
-    previewer = get_previewer(model.load_device, model.model.latent_format)
+    pipeline = PreviewPipeline(lambda: get_previewer(model.load_device, model.model.latent_format), preview_format, preview_server())
 
     pbar = comfy.utils.ProgressBar(steps)
     def callback(step, x0, x, total_steps):
         if x0_output_dict is not None:
             x0_output_dict["x0"] = x0
 
-        preview_bytes = None
-        if previewer:
-            preview_bytes = previewer.decode_latent_to_preview_image(preview_format, x0)
+        preview_bytes = pipeline.step(x0, last=step + 1 >= total_steps)
         pbar.update_absolute(step + 1, total_steps, preview_bytes)
     return callback
 
@@ -11,9 +11,7 @@ import itertools
 import utils.extra_config
 import logging
 import sys
-from comfy_execution.progress import get_progress_state
-from comfy_execution.utils import get_executing_context
-from comfy_api import feature_flags
+from comfy_execution.progress import hijack_progress
 
 
 if __name__ == "__main__":
@@ -178,7 +176,6 @@ import comfy.utils
 
 import execution
 import server
-from protocol import BinaryEventTypes
 import nodes
 import comfy.model_management
 import comfyui_version
@@ -197,17 +194,25 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
-def prompt_worker(q, server_instance):
-    current_time: float = 0.0
+def prompt_cache_settings():
     cache_type = execution.CacheType.CLASSIC
+    cache_args = { "lru" : args.cache_lru, "ram" : args.cache_ram, "disk" : args.cache_disk }
     if args.cache_lru > 0:
         cache_type = execution.CacheType.LRU
     elif args.cache_ram > 0:
         cache_type = execution.CacheType.RAM_PRESSURE
+    elif args.cache_disk > 0:
+        cache_type = execution.CacheType.RAM_DISK
+        cache_args["ram"] = 4.0
     elif args.cache_none:
         cache_type = execution.CacheType.NONE
+    return cache_type, cache_args
+
 
-    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+def prompt_worker(q, server_instance):
+    current_time: float = 0.0
+    cache_type, cache_args = prompt_cache_settings()
+    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args=cache_args)
     last_gc_collect = 0
     need_gc = False
     gc_collect_interval = 10.0
@@ -283,38 +288,6 @@ async def run(server_instance, address='', port=8188, verbose=True, call_on_star
         server_instance.start_multi_address(addresses, call_on_start, verbose), server_instance.publish_loop()
     )
 
-def hijack_progress(server_instance):
-    def hook(value, total, preview_image, prompt_id=None, node_id=None):
-        executing_context = get_executing_context()
-        if prompt_id is None and executing_context is not None:
-            prompt_id = executing_context.prompt_id
-        if node_id is None and executing_context is not None:
-            node_id = executing_context.node_id
-        comfy.model_management.throw_exception_if_processing_interrupted()
-        if prompt_id is None:
-            prompt_id = server_instance.last_prompt_id
-        if node_id is None:
-            node_id = server_instance.last_node_id
-        progress = {"value": value, "max": total, "prompt_id": prompt_id, "node": node_id}
-        get_progress_state().update_progress(node_id, value, total, preview_image)
-
-        server_instance.send_sync("progress", progress, server_instance.client_id)
-        if preview_image is not None:
-            # Only send old method if client doesn't support preview metadata
-            if not feature_flags.supports_feature(
-                server_instance.sockets_metadata,
-                server_instance.client_id,
-                "supports_preview_metadata",
-            ):
-                server_instance.send_sync(
-                    BinaryEventTypes.UNENCODED_PREVIEW_IMAGE,
-                    preview_image,
-                    server_instance.client_id,
-                )
-
-    comfy.utils.set_progress_bar_global_hook(hook)
-
-
 def cleanup_temp():
     temp_dir = folder_paths.get_temp_directory()
     if os.path.exists(temp_dir):
@@ -330,6 +303,18 @@ def setup_database():
         logging.error(f"Failed to initialize database. Please ensure you have installed the latest requirements. If the error persists, please report this as in future the database will be required: {e}")
 
 
+def setup_prompt_store(prompt_queue):
+    try:
+        from app.database.db import can_create_session
+        if not can_create_session():
+            logging.warning("--persistent-history requires the database, prompt history will only be kept in memory.")
+            return
+        from app.prompt_store import PromptStore
+        prompt_queue.enable_store(PromptStore(max_history_size=execution.MAXIMUM_HISTORY_SIZE))
+    except Exception as e:
+        logging.error(f"Failed to enable persistent prompt history: {e}")
+
+
 def start_comfyui(asyncio_loop=None):
     """
     Starts the ComfyUI server using the provided asyncio event loop or creates a new one.
@@ -340,6 +325,8 @@ def start_comfyui(asyncio_loop=None):
         logging.info(f"Setting temp directory to: {temp_dir}")
         folder_paths.set_temp_directory(temp_dir)
     cleanup_temp()
+    if args.model_index:
+        folder_paths.enable_model_index(args.model_index)
 
     if args.windows_standalone_build:
         try:
@@ -365,11 +352,20 @@ def start_comfyui(asyncio_loop=None):
 
     cuda_malloc_warning()
     setup_database()
+    if args.persistent_history:
+        setup_prompt_store(prompt_server.prompt_queue)
 
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+    if args.prompt_workers > 0:
+        from comfy_execution.worker_pool import PromptWorkerPool
+        cache_type, cache_args = prompt_cache_settings()
+        PromptWorkerPool(prompt_server.prompt_queue, prompt_server, args.prompt_workers, cache_type, cache_args,
+                         init_custom_nodes=(not args.disable_all_custom_nodes) or len(args.whitelist_custom_nodes) > 0,
+                         init_api_nodes=not args.disable_api_nodes).start()
+    else:
+        threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
 
     if args.quick_test_for_ci:
         exit(0)
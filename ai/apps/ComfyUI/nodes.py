@@ -14,7 +14,6 @@ import random
 import logging
 
 from PIL import Image, ImageOps, ImageSequence
-from PIL.PngImagePlugin import PngInfo
 
 import numpy as np
 import safetensors.torch
@@ -41,6 +40,8 @@ import importlib
 
 import folder_paths
 import latent_preview
+from comfy_execution import image_saver
+from comfy_execution.node_registry import NodeClassMappings, NodeInfoCache, NodeManifest, build_node_info, manifest_key
 import node_helpers
 
 if args.enable_manager:
@@ -1601,22 +1602,16 @@ class SaveImage:
     def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
         filename_prefix += self.prefix_append
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
-        results = list()
-        for (batch_number, image) in enumerate(images):
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
-            if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+        metadata = None
+        if not args.disable_metadata:
+            metadata = image_saver.build_png_metadata(prompt, extra_pnginfo)
 
+        results = list()
+        saves = list()
+        for (batch_number, pixels) in enumerate(image_saver.images_to_uint8(images)):
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
+            file, counter, f = folder_paths.create_save_file(full_output_folder, filename_with_batch_num, counter, "png")
+            saves.append(image_saver.image_saver.save_png(os.path.join(full_output_folder, file), pixels, metadata, self.compress_level, detached=args.async_image_save, file=f))
             results.append({
                 "filename": file,
                 "subfolder": subfolder,
@@ -1624,6 +1619,9 @@ class SaveImage:
             })
             counter += 1
 
+        if not args.async_image_save:
+            for save in saves:
+                save.result()
         return { "ui": { "images": results } }
 
 class PreviewImage(SaveImage):
@@ -1961,7 +1959,7 @@ class ImagePadForOutpaint:
         return (new_image, mask.unsqueeze(0))
 
 
-NODE_CLASS_MAPPINGS = {
+NODE_CLASS_MAPPINGS = NodeClassMappings({
     "KSampler": KSampler,
     "CheckpointLoaderSimple": CheckpointLoaderSimple,
     "CLIPTextEncode": CLIPTextEncode,
@@ -2029,7 +2027,7 @@ NODE_CLASS_MAPPINGS = {
     "ConditioningZeroOut": ConditioningZeroOut,
     "ConditioningSetTimestepRange": ConditioningSetTimestepRange,
     "LoraLoaderModelOnly": LoraLoaderModelOnly,
-}
+})
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     # Sampling
@@ -2221,6 +2219,45 @@ async def load_custom_node(module_path: str, ignore=set(), module_parent="custom
         logging.warning(f"Cannot import {module_path} module for custom nodes: {e}")
         return False
 
+NODE_CLASS_MAPPINGS.loader = lambda module_path, module_parent: load_custom_node(module_path, module_parent=module_parent)
+
+# Set by init_extra_nodes with --lazy-nodes
+node_manifest: NodeManifest | None = None
+# Only used with --lazy-nodes
+node_info_cache = NodeInfoCache()
+
+def get_node_info(node_class: str) -> dict:
+    """The /object_info entry of a node. Lazy nodes with a static info in the node manifest are not imported."""
+    info = NODE_CLASS_MAPPINGS.lazy_info(node_class)
+    if info is not None:
+        return info
+    obj_class = NODE_CLASS_MAPPINGS[node_class]
+    if not args.lazy_nodes:
+        return build_node_info(node_class, obj_class, NODE_DISPLAY_NAME_MAPPINGS)
+    return node_info_cache.get(node_class, obj_class, NODE_DISPLAY_NAME_MAPPINGS)
+
+async def load_builtin_node_module(module_path: str, module_parent: str) -> bool:
+    """
+    load_custom_node for the built-in node modules. With --lazy-nodes a module
+    that is unchanged since the node manifest was written is registered from
+    the manifest and only imported when one of its nodes is used.
+    """
+    if node_manifest is None:
+        return await load_custom_node(module_path, module_parent=module_parent)
+
+    lazy = node_manifest.lazy_module(module_path)
+    if lazy is not None:
+        NODE_CLASS_MAPPINGS.add_lazy(lazy)
+        NODE_DISPLAY_NAME_MAPPINGS.update(lazy.display_names)
+        return True
+
+    before = dict(dict.items(NODE_CLASS_MAPPINGS))
+    success = await load_custom_node(module_path, module_parent=module_parent)
+    if success:
+        names = [name for name, node_cls in dict.items(NODE_CLASS_MAPPINGS) if before.get(name) is not node_cls]
+        node_manifest.add_loaded(module_path, module_parent, names)
+    return success
+
 async def init_external_custom_nodes():
     """
     Initializes the external custom nodes.
@@ -2363,7 +2400,7 @@ async def init_builtin_extra_nodes():
 
     import_failed = []
     for node_file in extras_files:
-        if not await load_custom_node(os.path.join(extras_dir, node_file), module_parent="comfy_extras"):
+        if not await load_builtin_node_module(os.path.join(extras_dir, node_file), module_parent="comfy_extras"):
             import_failed.append(node_file)
 
     return import_failed
@@ -2401,7 +2438,7 @@ async def init_builtin_api_nodes():
 
     import_failed = []
     for node_file in api_nodes_files:
-        if not await load_custom_node(os.path.join(api_nodes_dir, node_file), module_parent="comfy_api_nodes"):
+        if not await load_builtin_node_module(os.path.join(api_nodes_dir, node_file), module_parent="comfy_api_nodes"):
             import_failed.append(node_file)
 
     return import_failed
@@ -2417,6 +2454,11 @@ async def init_public_apis():
 async def init_extra_nodes(init_custom_nodes=True, init_api_nodes=True):
     await init_public_apis()
 
+    global node_manifest
+    if args.lazy_nodes:
+        node_manifest = NodeManifest(os.path.join(folder_paths.get_system_user_directory("cache"), "node_manifest.json"),
+                                     manifest_key(os.path.dirname(os.path.realpath(__file__)), folder_paths.get_folder_paths("custom_nodes")))
+
     import_failed = await init_builtin_extra_nodes()
 
     import_failed_api = []
@@ -2428,6 +2470,14 @@ async def init_extra_nodes(init_custom_nodes=True, init_api_nodes=True):
     else:
         logging.info("Skipping loading of custom nodes")
 
+    if node_manifest is not None:
+        try:
+            node_manifest.record_loaded(NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS)
+            node_manifest.save()
+        except Exception as e:
+            logging.warning(f"Failed to save the node manifest: {e}")
+        logging.info(f"{len(NODE_CLASS_MAPPINGS.lazy)} nodes will be imported on first use.")
+
     if len(import_failed_api) > 0:
         logging.warning("WARNING: some comfy_api_nodes/ nodes did not import correctly. This may be because they are missing some dependencies.\n")
         for node in import_failed_api:
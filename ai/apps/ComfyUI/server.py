@@ -3,6 +3,7 @@ import sys
 import asyncio
 import traceback
 import time
+import threading
 
 import nodes
 import folder_paths
@@ -15,9 +16,8 @@ import struct
 import ssl
 import socket
 import ipaddress
-from PIL import Image, ImageOps
+from PIL import Image
 from PIL.PngImagePlugin import PngInfo
-from io import BytesIO
 
 import aiohttp
 from aiohttp import web
@@ -31,12 +31,14 @@ from comfy_api import feature_flags
 import node_helpers
 from comfyui_version import __version__
 from app.frontend_management import FrontendManager, parse_version
-from comfy_api.internal import _ComfyNodeInternal
 
 from app.user_manager import UserManager
 from app.model_manager import ModelFileManager
 from app.custom_node_manager import CustomNodeManager
 from app.subgraph_manager import SubgraphManager
+from app.preview_cache import PreviewCache, is_not_modified
+from comfy_execution.image_saver import image_saver
+from comfy_execution.progress import encode_preview_image
 from typing import Optional, Union
 from api_server.routes.internal.internal_routes import InternalRoutes
 from protocol import BinaryEventTypes
@@ -47,6 +49,8 @@ from middleware.cache_middleware import cache_control
 if args.enable_manager:
     import comfyui_manager
 
+PREVIEW_EVENTS = (BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA)
+
 async def send_socket_catch_exception(function, message):
     try:
         await function(message)
@@ -195,11 +199,15 @@ class PromptServer():
         self.model_file_manager = ModelFileManager()
         self.custom_node_manager = CustomNodeManager()
         self.subgraph_manager = SubgraphManager()
+        self.preview_cache = PreviewCache()
         self.internal_routes = InternalRoutes(self)
         self.supports = ["custom_nodes_from_web"]
         self.prompt_queue = execution.PromptQueue(self)
         self.loop = loop
         self.messages = asyncio.Queue()
+        # Previews queued but not sent yet, by client id
+        self.preview_backlog = {}
+        self.preview_backlog_lock = threading.Lock()
         self.client_session:Optional[aiohttp.ClientSession] = None
         self.number = 0
 
@@ -491,64 +499,24 @@ class PromptServer():
 
                 filename = os.path.basename(filename)
                 file = os.path.join(output_dir, filename)
+                await image_saver.wait_for_file(file)
 
                 if os.path.isfile(file):
-                    if 'preview' in request.rel_url.query:
-                        with Image.open(file) as img:
-                            preview_info = request.rel_url.query['preview'].split(';')
-                            image_format = preview_info[0]
-                            if image_format not in ['webp', 'jpeg'] or 'a' in request.rel_url.query.get('channel', ''):
-                                image_format = 'webp'
-
-                            quality = 90
-                            if preview_info[-1].isdigit():
-                                quality = int(preview_info[-1])
-
-                            buffer = BytesIO()
-                            if image_format in ['jpeg'] or request.rel_url.query.get('channel', '') == 'rgb':
-                                img = img.convert("RGB")
-                            img.save(buffer, format=image_format, quality=quality)
-                            buffer.seek(0)
-
-                            return web.Response(body=buffer.read(), content_type=f'image/{image_format}',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
-
-                    if 'channel' not in request.rel_url.query:
-                        channel = 'rgba'
-                    else:
-                        channel = request.rel_url.query["channel"]
-
-                    if channel == 'rgb':
-                        with Image.open(file) as img:
-                            if img.mode == "RGBA":
-                                r, g, b, a = img.split()
-                                new_img = Image.merge('RGB', (r, g, b))
-                            else:
-                                new_img = img.convert("RGB")
-
-                            buffer = BytesIO()
-                            new_img.save(buffer, format='PNG')
-                            buffer.seek(0)
-
-                            return web.Response(body=buffer.read(), content_type='image/png',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
-
-                    elif channel == 'a':
-                        with Image.open(file) as img:
-                            if img.mode == "RGBA":
-                                _, _, _, a = img.split()
-                            else:
-                                a = Image.new('L', img.size, 255)
-
-                            # alpha img
-                            alpha_img = Image.new('RGBA', img.size)
-                            alpha_img.putalpha(a)
-                            alpha_buffer = BytesIO()
-                            alpha_img.save(alpha_buffer, format='PNG')
-                            alpha_buffer.seek(0)
-
-                            return web.Response(body=alpha_buffer.read(), content_type='image/png',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
+                    channel = request.rel_url.query.get('channel', '')
+                    preview_query = request.rel_url.query.get('preview', None)
+                    if preview_query is not None or channel in ('rgb', 'a'):
+                        # The ETag only depends on the file and the query, so a
+                        # conditional request is answered without rendering.
+                        validator = self.preview_cache.validator(file, preview_query, channel)
+                        headers = {
+                            "Content-Disposition": f"filename=\"{filename}\"",
+                            "ETag": validator.etag,
+                            "Last-Modified": validator.last_modified,
+                        }
+                        if is_not_modified(request.headers, validator):
+                            return web.Response(status=304, headers=headers)
+                        preview = await self.preview_cache.get(file, preview_query, channel, validator)
+                        return web.Response(body=preview.body, content_type=preview.content_type, headers=headers)
                     else:
                         # Get content type from mimetype, defaulting to 'application/octet-stream'
                         content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
@@ -640,39 +608,7 @@ class PromptServer():
             return web.json_response(self.get_queue_info())
 
         def node_info(node_class):
-            obj_class = nodes.NODE_CLASS_MAPPINGS[node_class]
-            if issubclass(obj_class, _ComfyNodeInternal):
-                return obj_class.GET_NODE_INFO_V1()
-            info = {}
-            info['input'] = obj_class.INPUT_TYPES()
-            info['input_order'] = {key: list(value.keys()) for (key, value) in obj_class.INPUT_TYPES().items()}
-            info['output'] = obj_class.RETURN_TYPES
-            info['output_is_list'] = obj_class.OUTPUT_IS_LIST if hasattr(obj_class, 'OUTPUT_IS_LIST') else [False] * len(obj_class.RETURN_TYPES)
-            info['output_name'] = obj_class.RETURN_NAMES if hasattr(obj_class, 'RETURN_NAMES') else info['output']
-            info['name'] = node_class
-            info['display_name'] = nodes.NODE_DISPLAY_NAME_MAPPINGS[node_class] if node_class in nodes.NODE_DISPLAY_NAME_MAPPINGS.keys() else node_class
-            info['description'] = obj_class.DESCRIPTION if hasattr(obj_class,'DESCRIPTION') else ''
-            info['python_module'] = getattr(obj_class, "RELATIVE_PYTHON_MODULE", "nodes")
-            info['category'] = 'sd'
-            if hasattr(obj_class, 'OUTPUT_NODE') and obj_class.OUTPUT_NODE == True:
-                info['output_node'] = True
-            else:
-                info['output_node'] = False
-
-            if hasattr(obj_class, 'CATEGORY'):
-                info['category'] = obj_class.CATEGORY
-
-            if hasattr(obj_class, 'OUTPUT_TOOLTIPS'):
-                info['output_tooltips'] = obj_class.OUTPUT_TOOLTIPS
-
-            if getattr(obj_class, "DEPRECATED", False):
-                info['deprecated'] = True
-            if getattr(obj_class, "EXPERIMENTAL", False):
-                info['experimental'] = True
-
-            if hasattr(obj_class, 'API_NODE'):
-                info['api_node'] = obj_class.API_NODE
-            return info
+            return nodes.get_node_info(node_class)
 
         @routes.get("/object_info")
         async def get_object_info(request):
@@ -706,12 +642,14 @@ class PromptServer():
             else:
                 offset = -1
 
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset))
+            history = await asyncio.to_thread(self.prompt_queue.get_history, max_items=max_items, offset=offset)
+            return web.json_response(history)
 
         @routes.get("/history/{prompt_id}")
         async def get_history_prompt_id(request):
             prompt_id = request.match_info.get("prompt_id", None)
-            return web.json_response(self.prompt_queue.get_history(prompt_id=prompt_id))
+            history = await asyncio.to_thread(self.prompt_queue.get_history, prompt_id=prompt_id)
+            return web.json_response(history)
 
         @routes.get("/queue")
         async def get_queue(request):
@@ -811,13 +749,13 @@ class PromptServer():
                         break
 
                 if should_interrupt:
-                    nodes.interrupt_processing()
+                    self.prompt_queue.interrupt(prompt_id)
                 else:
                     logging.info(f"Prompt {prompt_id} is not currently running, skipping interrupt")
             else:
                 # No prompt_id provided, do a global interrupt
                 logging.info("Global interrupt (no prompt_id specified)")
-                nodes.interrupt_processing()
+                self.prompt_queue.interrupt()
 
             return web.Response(status=200)
 
@@ -941,40 +879,18 @@ class PromptServer():
 
     async def send_image(self, image_data, sid=None):
         image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
-
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
         type_num = 1
         if image_type == "JPEG":
             type_num = 1
         elif image_type == "PNG":
             type_num = 2
 
-        bytesIO = BytesIO()
-        header = struct.pack(">I", type_num)
-        bytesIO.write(header)
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        preview_bytes = bytesIO.getvalue()
+        preview_bytes = bytearray(struct.pack(">I", type_num))
+        preview_bytes.extend(encode_preview_image(image_data))
         await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE, preview_bytes, sid=sid)
 
     async def send_image_with_metadata(self, image_data, metadata=None, sid=None):
         image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
-
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
-
         mimetype = "image/png" if image_type == "PNG" else "image/jpeg"
 
         # Prepare metadata
@@ -988,9 +904,7 @@ class PromptServer():
         metadata_length = len(metadata_json)
 
         # Prepare image data
-        bytesIO = BytesIO()
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        image_bytes = bytesIO.getvalue()
+        image_bytes = encode_preview_image(image_data)
 
         # Combine metadata and image
         combined_data = bytearray()
@@ -1021,16 +935,38 @@ class PromptServer():
             await send_socket_catch_exception(self.sockets[sid].send_json, message)
 
     def send_sync(self, event, data, sid=None):
+        if event in PREVIEW_EVENTS:
+            with self.preview_backlog_lock:
+                self.preview_backlog[sid] = self.preview_backlog.get(sid, 0) + 1
         self.loop.call_soon_threadsafe(
             self.messages.put_nowait, (event, data, sid))
 
+    def previews_pending(self, sid=None):
+        """Number of previews for sid that are queued but not sent yet."""
+        return self.preview_backlog.get(sid, 0)
+
+    def preview_subscribed(self, sid=None):
+        """Whether previews sent to sid reach a websocket."""
+        if sid is None:
+            return len(self.sockets) > 0
+        return sid in self.sockets
+
     def queue_updated(self):
         self.send_sync("status", { "status": self.get_queue_info() })
 
     async def publish_loop(self):
         while True:
             msg = await self.messages.get()
-            await self.send(*msg)
+            try:
+                await self.send(*msg)
+            finally:
+                if msg[0] in PREVIEW_EVENTS:
+                    with self.preview_backlog_lock:
+                        pending = self.preview_backlog.get(msg[2], 0) - 1
+                        if pending > 0:
+                            self.preview_backlog[msg[2]] = pending
+                        else:
+                            self.preview_backlog.pop(msg[2], None)
 
     async def start(self, address, port, verbose=True, call_on_start=None):
         await self.start_multi_address([(address, port)], call_on_start=call_on_start)
@@ -0,0 +1,113 @@
+import pytest
+import torch
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from app.database.models import Base
+from app.prompt_store import PromptStore
+from execution import PromptQueue
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def store(session_factory):
+    return PromptStore(max_history_size=5, session_factory=session_factory)
+
+
+def make_item(number, prompt_id, sensitive=None):
+    return (number, prompt_id, {"1": {"class_type": "Stub", "inputs": {}}}, {"client_id": "c"}, ["1"], sensitive or {})
+
+
+def make_queue(store=None):
+    server = MagicMock()
+    server.number = 0
+    queue = PromptQueue(server)
+    if store is not None:
+        queue.enable_store(store)
+    return queue
+
+
+def run_item(queue, outputs=None):
+    item, item_id = queue.get(timeout=0)
+    status = PromptQueue.ExecutionStatus(status_str="success", completed=True, messages=[])
+    queue.task_done(item_id, {"outputs": outputs or {}, "meta": {}}, status=status, process_item=lambda prompt: prompt[:5] + prompt[6:])
+    return item
+
+
+class TestPromptStore:
+    def test_queue_items_never_store_sensitive_data(self, store):
+        store.add_queue_item(make_item(0, "a", {"api_key_comfy_org": "secret"}))
+        items = store.get_queue_items()
+        assert items == [(0, "a", {"1": {"class_type": "Stub", "inputs": {}}}, {"client_id": "c"}, ["1"], {})]
+
+    def test_history_pagination_matches_memory_semantics(self, store):
+        for i in range(4):
+            store.add_history(str(i), {"prompt": [i], "outputs": {}, "status": None})
+        assert list(store.get_history()) == ["0", "1", "2", "3"]
+        assert list(store.get_history(max_items=2)) == ["2", "3"]
+        assert list(store.get_history(max_items=2, offset=1)) == ["1", "2"]
+        assert list(store.get_history(offset=3)) == ["3"]
+        assert store.get_history(prompt_id="1") == {"1": {"prompt": [1], "outputs": {}, "status": None}}
+        assert store.get_history(prompt_id="missing") == {}
+
+    def test_history_is_trimmed_to_max_size(self, store):
+        for i in range(8):
+            store.add_history(str(i), {"outputs": {}})
+        assert store.count_history() == 5
+        assert list(store.get_history()) == ["3", "4", "5", "6", "7"]
+
+    def test_delete_and_wipe(self, store):
+        store.add_history("a", {"outputs": {}})
+        store.add_history("b", {"outputs": {}})
+        store.delete_history("a")
+        assert list(store.get_history()) == ["b"]
+        store.wipe_history()
+        assert store.get_history() == {}
+
+
+class TestPromptQueueWithStore:
+    def test_history_matches_in_memory_queue(self, store):
+        memory_queue = make_queue()
+        store_queue = make_queue(store)
+        for queue in (memory_queue, store_queue):
+            queue.put(make_item(0, "a", {"api_key_comfy_org": "secret"}))
+            run_item(queue, outputs={"1": {"images": [{"filename": "a.png"}]}})
+        expected = memory_queue.get_history()
+        expected["a"]["prompt"] = list(expected["a"]["prompt"])
+        assert store_queue.get_history() == expected
+        assert "secret" not in str(store_queue.get_history())
+
+    def test_pending_items_are_recovered(self, store):
+        queue = make_queue(store)
+        queue.put(make_item(0, "done"))
+        queue.put(make_item(1, "running"))
+        queue.put(make_item(2, "queued"))
+        run_item(queue)
+        queue.get(timeout=0)
+
+        restarted = make_queue(store)
+        recovered = sorted(item[1] for item in restarted.queue)
+        assert recovered == ["queued", "running"]
+        assert restarted.server.number == 3
+        assert list(restarted.get_history()) == ["done"]
+
+    def test_deleted_and_wiped_queue_items_are_not_recovered(self, store):
+        queue = make_queue(store)
+        for i in range(3):
+            queue.put(make_item(i, str(i)))
+        queue.delete_queue_item(lambda item: item[1] == "1")
+        assert sorted(item[1] for item in make_queue(store).queue) == ["0", "2"]
+        queue.wipe_queue()
+        assert make_queue(store).queue == []
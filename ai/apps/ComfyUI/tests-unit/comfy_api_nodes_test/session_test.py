@@ -0,0 +1,178 @@
+import asyncio
+import time
+from io import BytesIO
+
+import aiohttp
+import pytest
+import torch
+from aiohttp import web
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+# Like main.py, load the utils package before nodes.py puts comfy/ (and its
+# utils.py) on sys.path; the API node client imports the server.
+import utils.install_util  # noqa: F401, E402
+from comfy_api_nodes.util import _session
+from comfy_api_nodes.util._session import close_session, get_session
+from comfy_api_nodes.util.download_helpers import download_url_to_bytesio
+from comfy_api_nodes.util.upload_helpers import upload_file
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MiB
+
+
+class StandInServer:
+    """Local stand-in for the API/storage servers that records the client connections it sees."""
+    def __init__(self):
+        self.peers = []
+        self.uploads = []
+        self.failures_left = 0
+        app = web.Application()
+        app.router.add_get("/ping", self.ping)
+        app.router.add_get("/file", self.file)
+        app.router.add_put("/upload", self.upload)
+        self.runner = web.AppRunner(app)
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def connections(self):
+        return len(set(self.peers))
+
+    async def ping(self, request):
+        self.peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response({"status": "ok"})
+
+    async def file(self, request):
+        self.peers.append(request.transport.get_extra_info("peername"))
+        if self.failures_left > 0:
+            self.failures_left -= 1
+            response = web.StreamResponse(status=200, headers={"Content-Length": str(len(PAYLOAD))})
+            await response.prepare(request)
+            await response.write(PAYLOAD[:1000])
+            request.transport.close()
+            return response
+        return web.Response(body=PAYLOAD)
+
+    async def upload(self, request):
+        self.peers.append(request.transport.get_extra_info("peername"))
+        self.uploads.append((dict(request.headers), await request.read()))
+        return web.Response(status=200)
+
+
+def run_with_server(test):
+    async def main():
+        server = StandInServer()
+        await server.start()
+        try:
+            return await test(server)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_session_is_per_loop_and_closed_with_it():
+    async def sessions():
+        return get_session(), get_session()
+
+    first, again = asyncio.run(sessions())
+    assert first is again
+    assert first.closed
+
+    second, _ = asyncio.run(sessions())
+    assert second is not first
+    assert second.closed
+    assert _session._sessions == {}
+
+
+def test_close_session():
+    async def main():
+        session = get_session()
+        await close_session()
+        assert session.closed
+        assert get_session() is not session
+        await close_session()
+
+    asyncio.run(main())
+
+
+def test_downloads_reuse_connections(tmp_path):
+    async def main(server):
+        for _ in range(5):
+            result = BytesIO()
+            await download_url_to_bytesio(f"{server.url}/file", result)
+            assert result.getvalue() == PAYLOAD
+        await download_url_to_bytesio(f"{server.url}/file", tmp_path / "file.bin")
+        return server.connections()
+
+    assert run_with_server(main) == 1
+    assert (tmp_path / "file.bin").read_bytes() == PAYLOAD
+
+
+def test_retried_download_starts_over():
+    async def main(server):
+        server.failures_left = 1
+        result = BytesIO()
+        await download_url_to_bytesio(f"{server.url}/file", result, retry_delay=0.01)
+        return result.getvalue()
+
+    assert run_with_server(main) == PAYLOAD
+
+
+def test_upload_streams_file_from_disk(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(PAYLOAD)
+
+    async def main(server):
+        await upload_file(None, f"{server.url}/upload", str(path))
+        await upload_file(None, f"{server.url}/upload", BytesIO(PAYLOAD), content_type="video/mp4")
+        return server.uploads, server.connections()
+
+    uploads, connections = run_with_server(main)
+    assert connections == 1
+    (headers, body), (bytes_headers, bytes_body) = uploads
+    assert body == PAYLOAD and bytes_body == PAYLOAD
+    assert headers["Content-Length"] == str(len(PAYLOAD))
+    assert "Content-Type" not in headers
+    assert "Content-Disposition" not in headers
+    assert bytes_headers["Content-Type"] == "video/mp4"
+
+
+@pytest.mark.benchmark
+def test_request_latency_benchmark():
+    requests = 200
+
+    async def main(server):
+        url = f"{server.url}/ping"
+        start = time.perf_counter()
+        for _ in range(requests):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as resp:
+                    await resp.json()
+        fresh = (time.perf_counter() - start) / requests
+        fresh_connections = server.connections()
+
+        server.peers.clear()
+        start = time.perf_counter()
+        for _ in range(requests):
+            async with get_session().get(url) as resp:
+                await resp.json()
+        pooled = (time.perf_counter() - start) / requests
+        return fresh, fresh_connections, pooled, server.connections()
+
+    fresh, fresh_connections, pooled, pooled_connections = run_with_server(main)
+    assert fresh_connections == requests
+    assert pooled_connections == 1
+    print(f"\n{requests} requests: session per request {fresh * 1000:.2f} ms, pooled {pooled * 1000:.2f} ms")  # noqa: T201
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import av
+import numpy as np
+import pytest
+import torch
+
+from comfy_api.input_impl.video_types import VideoFromFile
+
+FRAMES = 30
+
+
+def create_test_video(path, width=16, height=16, frames=FRAMES, fps=30, gop_size=5, audio=False):
+    """A video whose frame i is gray level 8 * i (mod 256), with a keyframe every gop_size frames"""
+    with av.open(path, mode="w") as container:
+        stream = container.add_stream("h264", rate=fps)
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = "yuv420p"
+        stream.codec_context.gop_size = gop_size
+        audio_stream = container.add_stream("aac", rate=44100) if audio else None
+
+        for i in range(frames):
+            img = np.full((height, width, 3), 8 * i % 256, dtype=np.uint8)
+            frame = av.VideoFrame.from_ndarray(img, format="rgb24").reformat(format="yuv420p")
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+
+        if audio_stream is not None:
+            samples = 44100 * frames // fps
+            frame = av.AudioFrame.from_ndarray(np.zeros((1, samples * 2), dtype=np.float32), format="flt", layout="stereo")
+            frame.sample_rate = 44100
+            frame.pts = 0
+            container.mux(audio_stream.encode(frame))
+            container.mux(audio_stream.encode(None))
+    return path
+
+
+def decode_all(path):
+    """Every frame as uint8, decoded the way get_components used to"""
+    with av.open(path) as container:
+        return torch.stack([torch.from_numpy(f.to_ndarray(format="rgb24")) for f in container.decode(video=0)])
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    return create_test_video(str(tmp_path / "video.mp4"))
+
+
+def test_get_frames_matches_full_decode(video_file):
+    reference = decode_all(video_file)
+    video = VideoFromFile(video_file)
+    frames = video.get_frames()
+    assert frames.dtype == torch.uint8
+    assert torch.equal(frames, reference)
+    assert torch.equal(video.get_components().images, reference / 255.0)
+
+
+@pytest.mark.parametrize("start,end,stride", [(0, None, 2), (7, 20, 3), (12, None, 1), (29, 40, 1)])
+def test_frame_range(video_file, start, end, stride):
+    reference = decode_all(video_file)
+    frames = VideoFromFile(video_file).get_frames(start=start, end=end, stride=stride)
+    assert torch.equal(frames, reference[start:end:stride])
+    assert frames.untyped_storage().nbytes() == frames.numel()
+
+
+def test_empty_range(video_file):
+    assert VideoFromFile(video_file).get_frames(start=5, end=5).shape[0] == 0
+    assert list(VideoFromFile(video_file).iter_frames(start=40)) == []
+
+
+def test_resize(video_file):
+    frames = VideoFromFile(video_file).get_frames(size=(8, 4), dtype=torch.float32)
+    assert frames.shape == (FRAMES, 4, 8, 3)
+    assert frames.dtype == torch.float32
+    assert float(frames[10].mean()) == pytest.approx(80 / 255, abs=0.02)
+
+
+def test_iter_frames(video_file):
+    video = VideoFromFile(video_file)
+    chunks = list(video.iter_frames(chunk_size=8, start=2, stride=2))
+    assert [chunk.shape[0] for chunk in chunks] == [8, 6]
+    assert torch.equal(torch.cat(chunks), video.get_components().images[2::2])
+    chunks = list(video.iter_frames(chunk_size=8, end=9, dtype=torch.uint8))
+    assert torch.equal(torch.cat(chunks), decode_all(video_file)[:9])
+
+
+def test_components_audio(tmp_path):
+    path = create_test_video(str(tmp_path / "audio.mp4"), audio=True)
+    components = VideoFromFile(path).get_components()
+    assert components.images.shape == (FRAMES, 16, 16, 3)
+    assert components.audio["sample_rate"] == 44100
+    assert components.audio["waveform"].shape[:2] == (1, 2)
+    assert components.audio["waveform"].shape[2] >= 44100
+
+
+BENCHMARK_SCRIPT = '''
+import sys, torch, av
+from comfy_api.input_impl.video_types import VideoFromFile
+
+def rss(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field)) / 1024
+
+mode, path = sys.argv[1], sys.argv[2]
+with av.open(path) as container:
+    pass
+# Reset the peak RSS so the imports don't count
+with open("/proc/self/clear_refs", "w") as f:
+    f.write("5")
+base = rss("VmRSS")
+if mode == "stack":
+    # What get_components did before: float frames in a list, then stacked
+    frames = []
+    with av.open(path) as container:
+        for frame in container.decode(video=0):
+            frames.append(torch.from_numpy(frame.to_ndarray(format="rgb24")) / 255.0)
+    images = torch.stack(frames)
+elif mode == "components":
+    images = VideoFromFile(path).get_components().images
+elif mode == "uint8":
+    images = VideoFromFile(path).get_frames()
+elif mode == "chunks":
+    total = 0.0
+    for chunk in VideoFromFile(path).iter_frames(chunk_size=16):
+        total += float(chunk.mean())
+print(rss("VmHWM") - base)
+'''
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads the peak RSS from /proc")
+@pytest.mark.parametrize("frames", [240])
+def test_decode_memory_benchmark(frames):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = create_test_video(os.path.join(tmp, "bench.mp4"), width=320, height=240, frames=frames, gop_size=30)
+        float_mb = frames * 320 * 240 * 3 * 4 / 1024 / 1024
+        cwd = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        peaks = {}
+        for mode in ["stack", "components", "uint8", "chunks"]:
+            result = subprocess.run([sys.executable, "-c", BENCHMARK_SCRIPT, mode, path], cwd=cwd,
+                                    capture_output=True, text=True, check=True)
+            peaks[mode] = float(result.stdout.strip().splitlines()[-1])
+        print(f"\n{frames} frames 320x240 ({float_mb:.0f} MB as float32), peak RSS increase: "  # noqa: T201
+              + ", ".join(f"{mode} {peak:.0f} MB" for mode, peak in peaks.items()))
+        assert peaks["components"] < peaks["stack"]
+        assert peaks["uint8"] < peaks["components"] / 2
+        assert peaks["chunks"] < peaks["components"] / 2
@@ -0,0 +1,138 @@
+import io
+import time
+from fractions import Fraction
+
+import av
+import pytest
+import torch
+
+from comfy_api.input_impl.video_types import VideoFromFile, VideoFromComponents, save_frames_to
+from comfy_api.util.video_types import VideoComponents, VideoContainer, VideoCodec
+from comfy_api.input.basic_types import AudioInput
+
+FRAMES = 10
+
+
+@pytest.fixture
+def images():
+    """Frames with a gradient and a per-frame offset, as 0..1 floats"""
+    x = torch.linspace(0, 1, 32).view(1, 1, 32, 1)
+    t = torch.arange(FRAMES).view(FRAMES, 1, 1, 1) / FRAMES
+    return ((x + t) % 1.0).expand(FRAMES, 16, 32, 3).contiguous()
+
+
+def to_uint8(images):
+    return (images * 255).clamp(0, 255).byte()
+
+
+def read(path):
+    video = VideoFromFile(path)
+    with av.open(path if isinstance(path, str) else io.BytesIO(path.getvalue())) as container:
+        codec = container.streams.video[0].codec.name
+        container_format = container.format.name
+    if isinstance(path, io.BytesIO):
+        path.seek(0)
+    return video.get_frames(), codec, container_format
+
+
+@pytest.mark.parametrize("format,codec,expected_codec,expected_format", [
+    (VideoContainer.AUTO, VideoCodec.AUTO, "h264", "mp4"),
+    (VideoContainer.MP4, VideoCodec.H265, "hevc", "mp4"),
+    (VideoContainer.MKV, VideoCodec.AUTO, "h264", "matroska"),
+    (VideoContainer.AUTO, VideoCodec.VP9, "vp9", "webm"),
+    (VideoContainer.AUTO, VideoCodec.FFV1, "ffv1", "matroska"),
+    (VideoContainer.MOV, VideoCodec.PRORES, "prores", "mov"),
+    (VideoContainer.AUTO, VideoCodec.MJPEG, "mjpeg", "matroska"),
+])
+def test_codecs_and_containers(tmp_path, images, format, codec, expected_codec, expected_format):
+    path = str(tmp_path / f"video.{VideoContainer.get_extension(format, codec)}")
+    VideoFromComponents(VideoComponents(images=images, frame_rate=Fraction(24))).save_to(path, format=format, codec=codec)
+    frames, written_codec, container_format = read(path)
+    assert written_codec == expected_codec
+    assert expected_format in container_format.split(",")
+    assert frames.shape == (FRAMES, 16, 32, 3)
+    # Lossy codecs stay close to the input, FFV1 is exact
+    error = (frames.float() - to_uint8(images).float()).abs().mean()
+    assert error == 0 if codec == VideoCodec.FFV1 else error < 12
+
+
+def test_invalid_combination(tmp_path, images):
+    video = VideoFromComponents(VideoComponents(images=images, frame_rate=Fraction(24)))
+    with pytest.raises(ValueError, match="can't be saved as mp4"):
+        video.save_to(str(tmp_path / "video.mp4"), format=VideoContainer.MP4, codec=VideoCodec.FFV1)
+
+
+def test_extension():
+    assert VideoContainer.get_extension("auto") == "mp4"
+    assert VideoContainer.get_extension("auto", "vp9") == "webm"
+    assert VideoContainer.get_extension("mkv", "h264") == "mkv"
+
+
+def test_frame_iterators(tmp_path, images):
+    expected = to_uint8(images)
+    # Single frames, chunks and uint8 frames mixed
+    frames = iter([images[0], images[1], images[2:7], expected[7], expected[8:]])
+    path = str(tmp_path / "video.mkv")
+    save_frames_to(path, frames, Fraction(24), codec=VideoCodec.FFV1)
+    assert torch.equal(read(path)[0], expected)
+
+    # Decode -> process -> encode, one chunk at a time
+    processed = (255 - chunk for chunk in VideoFromFile(path).iter_frames(chunk_size=3, dtype=torch.uint8))
+    out = str(tmp_path / "inverted.mkv")
+    save_frames_to(out, processed, Fraction(24), codec=VideoCodec.FFV1)
+    assert torch.equal(read(out)[0], 255 - expected)
+
+
+def test_reencode_from_file(tmp_path, images):
+    path = str(tmp_path / "video.mp4")
+    VideoFromComponents(VideoComponents(images=images, frame_rate=Fraction(24))).save_to(path)
+    out = io.BytesIO()
+    VideoFromFile(path).save_to(out, format=VideoContainer.MKV, codec=VideoCodec.FFV1)
+    frames, codec, _ = read(out)
+    assert codec == "ffv1"
+    assert torch.equal(frames, VideoFromFile(path).get_frames())
+    assert VideoFromFile(out).get_frame_rate() == 24
+
+
+@pytest.mark.parametrize("format", [VideoContainer.MP4, VideoContainer.WEBM])
+def test_audio(tmp_path, images, format):
+    audio = AudioInput({"waveform": torch.rand(1, 2, 44100) * 0.1, "sample_rate": 44100})
+    components = VideoComponents(images=images, frame_rate=Fraction(10), audio=audio)
+    path = str(tmp_path / f"video.{format.value}")
+    VideoFromComponents(components).save_to(path, format=format)
+    result = VideoFromFile(path).get_components()
+    assert result.images.shape[0] == FRAMES
+    assert result.audio is not None
+    assert result.audio["waveform"].shape[1] == 2
+
+
+def save_serial(path, images, frame_rate):
+    """How VideoFromComponents.save_to used to encode"""
+    with av.open(path, mode="w", options={"movflags": "use_metadata_tags"}) as output:
+        video_stream = output.add_stream("h264", rate=frame_rate)
+        video_stream.width = images.shape[2]
+        video_stream.height = images.shape[1]
+        video_stream.pix_fmt = "yuv420p"
+        for frame in images:
+            img = (frame * 255).clamp(0, 255).byte().cpu().numpy()
+            frame = av.VideoFrame.from_ndarray(img, format="rgb24")
+            frame = frame.reformat(format="yuv420p")
+            output.mux(video_stream.encode(frame))
+        output.mux(video_stream.encode(None))
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("frames", [96])
+def test_encode_benchmark(tmp_path, frames):
+    images = torch.rand(frames, 360, 640, 3)
+    start = time.perf_counter()
+    save_serial(str(tmp_path / "serial.mp4"), images, Fraction(24))
+    serial = time.perf_counter() - start
+    timings = {}
+    for codec, format in [(VideoCodec.H264, VideoContainer.MP4), (VideoCodec.MJPEG, VideoContainer.MKV), (VideoCodec.FFV1, VideoContainer.MKV)]:
+        start = time.perf_counter()
+        save_frames_to(str(tmp_path / f"{codec.value}.{format.value}"), images, Fraction(24), format=format, codec=codec)
+        timings[codec.value] = time.perf_counter() - start
+    print(f"\n{frames} frames 640x360: previous h264 {serial:.2f} s, "  # noqa: T201
+          + ", ".join(f"{codec} {seconds:.2f} s" for codec, seconds in timings.items()))
+    assert all((tmp_path / name).stat().st_size > 0 for name in ["h264.mp4", "mjpeg.mkv", "ffv1.mkv"])
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from unittest.mock import patch, MagicMock
+
+# Mock nodes module to prevent CUDA initialization during import
+mock_nodes = MagicMock()
+mock_nodes.MAX_RESOLUTION = 16384
+
+# Mock server module for PromptServer
+mock_server = MagicMock()
+
+with patch.dict('sys.modules', {'nodes': mock_nodes, 'server': mock_server}):
+    from comfy_extras import nodes_dataset
+    from comfy_extras.nodes_dataset import (
+        HASH_METHODS,
+        ConvertTrainingDataset,
+        HammingIndex,
+        ImageDeduplicationNode,
+        LoadTrainingDataset,
+        SaveTrainingDataset,
+        image_hash,
+        tensor_to_pil,
+    )
+
+
+def quadratic_dedup(hashes, similarity_threshold):
+    """The original keep-first pairwise comparison on 64 character bit strings."""
+    bits = [format(h, "064b") for h in hashes]
+    keep = []
+    for i in range(len(bits)):
+        for j in keep:
+            distance = sum(c1 != c2 for c1, c2 in zip(bits[i], bits[j]))
+            if 1.0 - (distance / 64.0) >= similarity_threshold:
+                break
+        else:
+            keep.append(i)
+    return keep
+
+
+def indexed_dedup(hashes, similarity_threshold):
+    max_distance = max((d for d in range(65) if 1.0 - (d / 64.0) >= similarity_threshold), default=-1)
+    index = HammingIndex(max_distance, len(hashes))
+    keep = []
+    for i, value in enumerate(hashes):
+        if index.search(value) is None:
+            index.add(value, i)
+            keep.append(i)
+    return keep
+
+
+def make_hashes(count, duplicate_fraction=0.3, max_flips=4, seed=0):
+    """Random 64-bit hashes where a fraction are copies of earlier ones with a few bits flipped."""
+    rng = np.random.default_rng(seed)
+    hashes = []
+    for _ in range(count):
+        if hashes and rng.random() < duplicate_fraction:
+            value = hashes[rng.integers(len(hashes))]
+            for bit in rng.choice(64, size=rng.integers(max_flips + 1), replace=False):
+                value ^= 1 << int(bit)
+        else:
+            value = int(rng.integers(0, 2**63)) * 2 + int(rng.integers(0, 2))
+        hashes.append(value)
+    return hashes
+
+
+def make_image(seed, size=64):
+    generator = torch.Generator().manual_seed(seed)
+    base = torch.rand(1, 8, 8, 3, generator=generator)
+    return torch.nn.functional.interpolate(base.permute(0, 3, 1, 2), size=(size, size), mode="bilinear").permute(0, 2, 3, 1)
+
+
+class TestImageHash:
+    def test_average_hash_matches_string_hash(self):
+        img = tensor_to_pil(make_image(1))
+        pixels = list(img.resize((8, 8), Image.Resampling.LANCZOS).convert("L").tobytes())
+        avg = sum(pixels) / len(pixels)
+        expected = "".join("1" if p > avg else "0" for p in pixels)
+        assert format(image_hash(img, "average"), "064b") == expected
+
+    @pytest.mark.parametrize("method", HASH_METHODS)
+    def test_hashes_are_robust_to_small_changes(self, method):
+        image = make_image(2)
+        brighter = (image * 0.9 + 0.05).clamp(0, 1)
+        other = make_image(3)
+        distance = bin(image_hash(tensor_to_pil(image), method) ^ image_hash(tensor_to_pil(brighter), method)).count("1")
+        other_distance = bin(image_hash(tensor_to_pil(image), method) ^ image_hash(tensor_to_pil(other), method)).count("1")
+        assert distance <= 4
+        assert other_distance > 10
+
+
+class TestHammingIndex:
+    @pytest.mark.parametrize("similarity_threshold", [1.0, 0.95, 0.9, 0.8, 0.5, 0.0])
+    def test_matches_pairwise_comparison(self, similarity_threshold):
+        hashes = make_hashes(400, max_flips=20)
+        assert indexed_dedup(hashes, similarity_threshold) == quadratic_dedup(hashes, similarity_threshold)
+
+    def test_search_returns_first_match(self):
+        index = HammingIndex(2, 3)
+        index.add(0b1111, 7)
+        index.add(0b0111, 3)
+        assert index.search(0b0011) == (7, 2)
+        assert index.search(0b0111) == (7, 1)
+        assert index.search(0b1 << 40) is None
+
+
+class TestImageDeduplicationNode:
+    def test_removes_near_duplicates(self, caplog):
+        images = [make_image(1), make_image(2), (make_image(1) * 0.98).clamp(0, 1), make_image(1)]
+        with caplog.at_level(logging.INFO):
+            result = ImageDeduplicationNode._group_process(images, 0.95)
+        assert [r is i for r, i in zip(result, images)] == [True, True]
+        assert "Image 2 is similar to image 0" in caplog.text
+
+    @pytest.mark.parametrize("method", HASH_METHODS)
+    def test_hash_methods(self, method):
+        images = [make_image(1), make_image(2), make_image(1)]
+        assert len(ImageDeduplicationNode._group_process(images, 0.95, method)) == 2
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("count", [1000, 10000, 100000])
+def test_dedup_benchmark(count):
+    hashes = make_hashes(count)
+    start = time.perf_counter()
+    keep = indexed_dedup(hashes, 0.95)
+    indexed = time.perf_counter() - start
+
+    message = f"\n{count} hashes: indexed {indexed * 1000:.1f} ms"
+    if count <= 1000:
+        start = time.perf_counter()
+        assert quadratic_dedup(hashes, 0.95) == keep
+        message += f", pairwise strings {(time.perf_counter() - start) * 1000:.1f} ms"
+    print(message + f" (kept {len(keep)})")  # noqa: T201
+
+
+def make_samples(count):
+    base = torch.randn(count, 4, 8, 8)
+    latents = [{"samples": base[i:i + 1]} for i in range(count)]
+    conditioning = [[[torch.randn(1, 3, 16), {"pooled_output": torch.randn(1, 16), "area": (1, 2), "strength": 1.0, "name": None}]] for _ in range(count)]
+    return latents, conditioning
+
+
+def assert_samples_equal(actual, expected):
+    if isinstance(expected, torch.Tensor):
+        assert torch.equal(actual, expected)
+    elif isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for k in expected:
+            assert_samples_equal(actual[k], expected[k])
+    elif isinstance(expected, (list, tuple)):
+        assert type(actual) is type(expected) and len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_samples_equal(a, e)
+    else:
+        assert actual == expected
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    with patch.object(nodes_dataset.folder_paths, "get_output_directory", return_value=str(tmp_path)):
+        yield tmp_path
+
+
+class TestTrainingDatasetShards:
+    def test_round_trip(self, output_dir):
+        latents, conditioning = make_samples(5)
+        SaveTrainingDataset.execute(latents, conditioning, ["dataset"], [2])
+
+        files = sorted(os.listdir(output_dir / "dataset"))
+        assert files == ["metadata.json", "shard_0000.safetensors", "shard_0001.safetensors", "shard_0002.safetensors"]
+        metadata = json.loads((output_dir / "dataset" / "metadata.json").read_text())
+        assert metadata["num_samples"] == 5 and metadata["num_shards"] == 3 and metadata["shard_size"] == 2
+        assert [shard["num_samples"] for shard in metadata["shards"]] == [2, 2, 1]
+
+        loaded_latents, loaded_conditioning = LoadTrainingDataset.execute("dataset").args
+        assert_samples_equal(loaded_latents, latents)
+        assert_samples_equal(loaded_conditioning, conditioning)
+
+    def test_legacy_pkl_shards_load_and_convert(self, output_dir):
+        latents, conditioning = make_samples(3)
+        dataset_dir = output_dir / "legacy"
+        dataset_dir.mkdir()
+        torch.save({"latents": latents[:2], "conditioning": conditioning[:2]}, dataset_dir / "shard_0000.pkl")
+        torch.save({"latents": latents[2:], "conditioning": conditioning[2:]}, dataset_dir / "shard_0001.pkl")
+        (dataset_dir / "metadata.json").write_text(json.dumps({"num_samples": 3, "num_shards": 2, "shard_size": 2}))
+
+        loaded_latents, loaded_conditioning = LoadTrainingDataset.execute("legacy").args
+        assert_samples_equal(loaded_latents, latents)
+
+        ConvertTrainingDataset.execute("legacy")
+        assert (dataset_dir / "shard_0001.safetensors").exists()
+        with patch("torch.load", side_effect=AssertionError("pkl shard loaded")):
+            loaded_latents, loaded_conditioning = LoadTrainingDataset.execute("legacy").args
+        assert_samples_equal(loaded_latents, latents)
+        assert_samples_equal(loaded_conditioning, conditioning)
+
+    def test_values_json_cannot_hold(self, output_dir):
+        latents, conditioning = make_samples(2)
+        conditioning[0][0][1]["indices"] = {1: torch.ones(2), 2: (3, 4)}
+        conditioning[1][0][1]["dtype"] = torch.float16
+        SaveTrainingDataset.execute(latents, conditioning, ["dataset"], [2])
+        loaded_latents, loaded_conditioning = LoadTrainingDataset.execute("dataset").args
+        assert_samples_equal(loaded_conditioning, conditioning)
+
+        conditioning[1][0][1]["control"] = object()
+        with pytest.raises(TypeError, match=r"sample 1\[1\]\[0\]\[1\]\['control'\] \(object\)"):
+            SaveTrainingDataset.execute(latents, conditioning, ["broken"], [2])
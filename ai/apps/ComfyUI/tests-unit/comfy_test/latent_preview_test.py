@@ -0,0 +1,149 @@
+import io
+import threading
+import time
+
+import pytest
+import torch
+from PIL import Image
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import latent_preview
+from latent_preview import LatentPreviewer, PreviewPipeline, TAESDPreviewerImpl
+from comfy.taesd.taesd import TAESD
+
+
+class SlowPreviewer(LatentPreviewer):
+    """Decodes x0 to a gray image whose value is the step, taking decode_seconds."""
+    def __init__(self, decode_seconds):
+        self.decode_seconds = decode_seconds
+        self.decoded = []
+
+    def decode_latent_to_preview(self, x0):
+        time.sleep(self.decode_seconds)
+        step = int(x0.flatten()[0])
+        self.decoded.append(step)
+        return Image.new("RGB", (64, 64), (step, step, step))
+
+
+class Server:
+    def __init__(self, subscribed=True):
+        self.client_id = "client"
+        self.subscribed = subscribed
+        self.pending = 0
+
+    def preview_subscribed(self, sid=None):
+        return self.subscribed
+
+    def previews_pending(self, sid=None):
+        return self.pending
+
+
+def run(pipeline, steps, step_seconds=0.0):
+    previews = []
+    for step in range(steps):
+        time.sleep(step_seconds)
+        preview = pipeline.step(torch.full((2, 4, 8, 8), float(step)), last=step + 1 == steps)
+        previews.append(preview)
+    return previews
+
+
+def test_previews_are_coalesced_off_thread():
+    previewer = SlowPreviewer(0.02)
+    pipeline = PreviewPipeline(lambda: previewer, server=Server(), max_size=32)
+    previews = run(pipeline, 50)
+    # The steps don't wait for the decodes: most steps are coalesced away
+    assert 2 <= len(previewer.decoded) < 25
+    assert previewer.decoded[-1] == 49
+    image_type, image, max_size, encoded = previews[-1]
+    assert (image_type, max_size) == ("JPEG", 32)
+    assert image.size == (32, 32)
+    with Image.open(io.BytesIO(encoded)) as decoded:
+        assert decoded.size == (32, 32)
+        assert abs(decoded.getpixel((0, 0))[0] - 49) <= 2
+
+
+def test_slow_steps_get_every_preview():
+    previewer = SlowPreviewer(0.001)
+    pipeline = PreviewPipeline(lambda: previewer, server=Server(), max_size=64)
+    previews = run(pipeline, 10, step_seconds=0.05)
+    assert previewer.decoded == list(range(10))
+    # Each preview goes out with the step after it, the last one right away
+    assert previews[0] is None
+    assert all(p is not None for p in previews[1:])
+
+
+def test_pipeline_decodes_a_copy():
+    previewer = SlowPreviewer(0.05)
+    pipeline = PreviewPipeline(lambda: previewer, server=Server(), max_size=32)
+    x0 = torch.full((2, 4, 8, 8), 3.0)
+    pipeline.step(x0)
+    x0.fill_(100.0)
+    pipeline.idle.wait()
+    assert previewer.decoded == [3]
+
+
+def test_inline_previewers_decode_on_the_sampler_thread():
+    threads = []
+
+    class InlinePreviewer(SlowPreviewer):
+        off_thread = False
+
+        def decode_latent_to_preview(self, x0):
+            threads.append(threading.current_thread())
+            return super().decode_latent_to_preview(x0)
+
+    previewer = InlinePreviewer(0.0)
+    pipeline = PreviewPipeline(lambda: previewer, server=Server(), max_size=32)
+    previews = run(pipeline, 10, step_seconds=0.01)
+    assert set(threads) == {threading.current_thread()}
+    assert previews[0] is not None
+    assert previewer.decoded[-1] == 9
+    assert not latent_preview.TAEHVPreviewerImpl.off_thread
+
+
+def test_no_subscriber_skips_preview_work():
+    loads = []
+    pipeline = PreviewPipeline(lambda: loads.append(1), server=Server(subscribed=False))
+    assert run(pipeline, 10) == [None] * 10
+    assert loads == []
+
+
+def test_backlog_shrinks_previews():
+    server = Server()
+    previewer = SlowPreviewer(0.0)
+    pipeline = PreviewPipeline(lambda: previewer, server=server, max_size=64)
+    server.pending = 1
+    assert run(pipeline, 5)[:-1] == [None] * 4
+    assert pipeline.scale == latent_preview.MIN_PREVIEW_SCALE
+    assert run(pipeline, 1)[0][2] == 16
+    server.pending = 0
+    run(pipeline, latent_preview.PREVIEW_RECOVER_STEPS * 2 + 1)
+    assert pipeline.scale == 1.0
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("steps", [10])
+def test_preview_benchmark(steps):
+    """Sampling with a TAESD previewer: decoding on every step vs the pipeline."""
+    previewer = TAESDPreviewerImpl(TAESD(latent_channels=4))
+    weight = torch.randn(512, 512)
+
+    def sample(preview):
+        start = time.perf_counter()
+        x0 = torch.randn(1, 4, 24, 24)
+        for step in range(steps):
+            for _ in range(20):
+                torch.tanh(weight @ weight)
+            preview(step, x0)
+        return time.perf_counter() - start
+
+    baseline = sample(lambda step, x0: None)
+    sync = sample(lambda step, x0: previewer.decode_latent_to_preview_image("JPEG", x0))
+    pipeline = PreviewPipeline(lambda: previewer, server=Server())
+    pipelined = sample(lambda step, x0: pipeline.step(x0, last=step + 1 == steps))
+    print(f"\n{steps} steps: no previews {baseline:.2f} s, every step {sync:.2f} s, "  # noqa: T201
+          f"pipeline {pipelined:.2f} s ({pipeline.stats['decoded']} previews)")
+    assert pipeline.stats["decoded"] >= 1
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import pytest
+import torch  # noqa: F401 -- must be loaded before sys.modules is patched below
+from unittest.mock import patch, MagicMock
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_execution import caching
+    from comfy_execution.graph import DynamicPrompt
+    from comfy_execution.caching import CacheKeySetInputSignature
+
+
+class StubNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {}}
+
+
+class StubNotIdempotent(StubNode):
+    NOT_IDEMPOTENT = True
+
+
+class StubIsChangedCache:
+    def __init__(self, values=None):
+        self.values = values or {}
+
+    async def get(self, node_id):
+        return self.values.get(node_id, False)
+
+
+@pytest.fixture(autouse=True)
+def node_mappings(monkeypatch):
+    monkeypatch.setattr(caching.nodes, "NODE_CLASS_MAPPINGS", {
+        "Stub": StubNode,
+        "StubNotIdempotent": StubNotIdempotent,
+    }, raising=False)
+    monkeypatch.setattr(caching, "NODE_CLASS_CONTAINS_UNIQUE_ID", {})
+
+
+def node(class_type="Stub", **inputs):
+    return {"class_type": class_type, "inputs": inputs}
+
+
+def get_keys(prompt, is_changed=None):
+    dynprompt = DynamicPrompt(prompt)
+    key_set = CacheKeySetInputSignature(dynprompt, prompt.keys(), StubIsChangedCache(is_changed))
+    asyncio.run(key_set.add_keys(prompt.keys()))
+    return key_set
+
+
+def chain_prompt(depth, value=0):
+    prompt = {"0": node(value=value)}
+    for i in range(1, depth):
+        prompt[str(i)] = node(x=[str(i - 1), 0])
+    return prompt
+
+
+def wide_prompt(width, value=0):
+    prompt = {"root": node(value=value)}
+    for i in range(width):
+        prompt[f"b{i}"] = node(x=["root", 0], index=i)
+    prompt["sink"] = node(**{f"in{i}": [f"b{i}", 0] for i in range(width)})
+    return prompt
+
+
+def diamond_prompt(layers):
+    prompt = {"0": node(value=0)}
+    prev = "0"
+    for i in range(layers):
+        prompt[f"{i}l"] = node(x=[prev, 0], side="left")
+        prompt[f"{i}r"] = node(x=[prev, 0], side="right")
+        prompt[f"{i}j"] = node(a=[f"{i}l", 0], b=[f"{i}r", 0])
+        prev = f"{i}j"
+    return prompt
+
+
+class TestSignatures:
+    def test_identical_graphs_share_keys(self):
+        a = get_keys(chain_prompt(5))
+        b = get_keys(chain_prompt(5))
+        for node_id in a.all_node_ids():
+            assert a.get_data_key(node_id) == b.get_data_key(node_id)
+
+    def test_node_ids_do_not_affect_keys(self):
+        a = get_keys({"1": node(value=1), "2": node(x=["1", 0])})
+        b = get_keys({"7": node(value=1), "9": node(x=["7", 0])})
+        assert a.get_data_key("2") == b.get_data_key("9")
+
+    def test_ancestor_change_propagates(self):
+        a = get_keys(chain_prompt(5, value=0))
+        b = get_keys(chain_prompt(5, value=1))
+        for node_id in a.all_node_ids():
+            assert a.get_data_key(node_id) != b.get_data_key(node_id)
+
+    def test_output_socket_is_part_of_key(self):
+        a = get_keys({"1": node(), "2": node(x=["1", 0])})
+        b = get_keys({"1": node(), "2": node(x=["1", 1])})
+        assert a.get_data_key("2") != b.get_data_key("2")
+
+    def test_is_changed_value_is_part_of_key(self):
+        prompt = chain_prompt(3)
+        a = get_keys(prompt, {"0": "a"})
+        b = get_keys(prompt, {"0": "b"})
+        assert a.get_data_key("2") != b.get_data_key("2")
+        assert a.get_data_key("2") == get_keys(prompt, {"0": "a"}).get_data_key("2")
+
+    def test_not_idempotent_includes_node_id(self):
+        a = get_keys({"1": node("StubNotIdempotent"), "2": node(x=["1", 0])})
+        b = get_keys({"3": node("StubNotIdempotent"), "2": node(x=["3", 0])})
+        assert a.get_data_key("2") != b.get_data_key("2")
+
+    def test_missing_ancestor_is_never_cached(self):
+        a = get_keys({"2": node(x=["1", 0])})
+        b = get_keys({"2": node(x=["1", 0])})
+        assert a.get_data_key("2") != b.get_data_key("2")
+
+    def test_cycle_terminates(self):
+        keys = get_keys({"1": node(x=["2", 0]), "2": node(x=["1", 0])})
+        assert keys.get_data_key("1") is not None
+        assert keys.get_data_key("2") is not None
+
+    def test_equal_signatures_are_interned(self):
+        a = get_keys(diamond_prompt(10))
+        b = get_keys(diamond_prompt(10))
+        assert a.get_data_key("9j") is b.get_data_key("9j")
+
+
+GRAPHS = [
+    ("deep", chain_prompt(400)),
+    ("wide", wide_prompt(400)),
+    ("diamond", diamond_prompt(130)),
+]
+
+
+@pytest.mark.parametrize("name,prompt", GRAPHS)
+def test_signature_work_is_linear(name, prompt, monkeypatch):
+    """Each node's immediate signature is computed exactly once per key set, regardless of graph shape."""
+    calls = []
+    original = CacheKeySetInputSignature.get_immediate_node_signature
+
+    async def counting(self, dynprompt, node_id, ancestor_signatures):
+        calls.append(node_id)
+        return await original(self, dynprompt, node_id, ancestor_signatures)
+
+    monkeypatch.setattr(CacheKeySetInputSignature, "get_immediate_node_signature", counting)
+    get_keys(prompt)
+    assert sorted(calls) == sorted(prompt.keys())
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("name,prompt", GRAPHS)
+def test_signature_benchmark(name, prompt):
+    start = time.perf_counter()
+    get_keys(prompt)
+    elapsed = time.perf_counter() - start
+    print(f"\n{name}: {len(prompt)} nodes, cache keys built in {elapsed * 1000:.2f} ms")  # noqa: T201
@@ -0,0 +1,95 @@
+import asyncio
+import os
+from collections import namedtuple
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import pytest
+import torch
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_execution import caching
+    from comfy_execution.caching import CacheKeySetID, DiskSpillStore, RAMDiskCache
+    from comfy_execution.graph import DynamicPrompt
+
+Entry = namedtuple("Entry", ["ui", "outputs"])
+
+
+def big_tensor(fill=1.0):
+    return torch.full((128, 256), fill)
+
+
+def total_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+
+class TestDiskSpillStore:
+    def test_round_trip_preserves_structure(self, tmp_path):
+        store = DiskSpillStore(str(tmp_path), 1024**3)
+        image = big_tensor(2.0)
+        value = Entry(ui={"images": ["a.png"]}, outputs=[[image, image[:64]], [{"pooled": big_tensor(3.0), "strength": 0.5}], [torch.ones(2), "text"]])
+        assert store.put("key", value)
+        loaded = store.get("key")
+        assert isinstance(loaded, Entry)
+        assert loaded.ui == value.ui
+        assert torch.equal(loaded.outputs[0][0], image)
+        assert torch.equal(loaded.outputs[0][1], image[:64])
+        assert torch.equal(loaded.outputs[1][0]["pooled"], big_tensor(3.0))
+        assert loaded.outputs[1][0]["strength"] == 0.5
+        assert loaded.outputs[2][0] is value.outputs[2][0]
+        assert loaded.outputs[2][1] == "text"
+
+    def test_entries_without_large_tensors_are_not_spilled(self, tmp_path):
+        store = DiskSpillStore(str(tmp_path), 1024**3)
+        assert not store.put("key", Entry(ui=None, outputs=[[torch.ones(4), 1]]))
+        assert "key" not in store
+        assert os.listdir(tmp_path) == []
+
+    def test_budget_evicts_least_recently_used(self, tmp_path):
+        entry_bytes = big_tensor().numel() * 4
+        store = DiskSpillStore(str(tmp_path), entry_bytes * 2)
+        store.put("a", [big_tensor(1.0)])
+        store.put("b", [big_tensor(2.0)])
+        store.get("a")
+        store.put("c", [big_tensor(3.0)])
+        assert "a" in store and "c" in store
+        assert "b" not in store
+        assert store.total_bytes == entry_bytes * 2
+        assert len(os.listdir(tmp_path)) == 2
+
+    def test_discard_removes_file(self, tmp_path):
+        store = DiskSpillStore(str(tmp_path), 1024**3)
+        store.put("a", [big_tensor()])
+        store.discard("a")
+        assert store.get("a") is None
+        assert store.total_bytes == 0
+        assert total_size(tmp_path) == 0
+
+
+class TestRAMDiskCache:
+    @pytest.fixture
+    def cache(self, tmp_path):
+        prompt = {"1": {"class_type": "Stub", "inputs": {}}, "2": {"class_type": "Stub", "inputs": {}}}
+        cache = RAMDiskCache(CacheKeySetID, str(tmp_path), 1024**3)
+        asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), None))
+        return cache
+
+    def test_evicted_entries_reload_from_disk(self, cache, monkeypatch):
+        value = Entry(ui=None, outputs=[[big_tensor(5.0)]])
+        cache.set("1", value)
+        monkeypatch.setattr(caching.psutil, "virtual_memory", lambda: SimpleNamespace(available=0))
+        cache.poll(ram_headroom=4.0)
+        assert len(cache.cache) == 0
+        loaded = cache.get("1")
+        assert torch.equal(loaded.outputs[0][0], value.outputs[0][0])
+        assert len(cache.cache) == 1
+        assert cache.get("2") is None
+
+    def test_set_supersedes_spilled_entry(self, cache, monkeypatch):
+        cache.set("1", Entry(ui=None, outputs=[[big_tensor(5.0)]]))
+        monkeypatch.setattr(caching.psutil, "virtual_memory", lambda: SimpleNamespace(available=0))
+        cache.poll(ram_headroom=4.0)
+        cache.set("1", Entry(ui=None, outputs=[[big_tensor(6.0)]]))
+        assert len(cache.disk.entries) == 0
+        assert torch.equal(cache.get("1").outputs[0][0], big_tensor(6.0))
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+import folder_paths
+from comfy_execution import image_saver
+from comfy_execution.image_saver import ImageSaver, build_png_metadata, images_to_uint8
+from comfy_execution.utils import CurrentNodeContext
+
+
+@pytest.fixture
+def saver():
+    saver = ImageSaver(max_workers=4)
+    yield saver
+    if saver.executor is not None:
+        saver.executor.shutdown()
+
+
+def reference_pixels(image):
+    i = 255. * image.cpu().numpy()
+    return np.clip(i, 0, 255).astype(np.uint8)
+
+
+def test_conversion_matches_per_image_numpy():
+    images = torch.rand(3, 17, 23, 3) * 1.2 - 0.1
+    converted = images_to_uint8(images)
+    for image, pixels in zip(images, converted):
+        np.testing.assert_array_equal(pixels, reference_pixels(image))
+
+
+def test_batch_shares_metadata(saver, tmp_path):
+    metadata = build_png_metadata({"1": {"class_type": "Stub"}}, {"workflow": {"nodes": []}})
+    paths = [str(tmp_path / f"image_{i}.png") for i in range(4)]
+    batch = images_to_uint8(torch.rand(4, 8, 8, 3))
+    for path, pixels in zip(paths, batch):
+        saver.save_png(path, pixels, metadata)
+    assert saver.wait_for_saves() == []
+    assert saver.pending == {}
+    for path, pixels in zip(paths, batch):
+        with Image.open(path) as img:
+            np.testing.assert_array_equal(np.array(img), pixels)
+            assert img.info["prompt"] == '{"1": {"class_type": "Stub"}}'
+            assert img.info["workflow"] == '{"nodes": []}'
+
+
+def test_file_exists_as_soon_as_save_is_queued(saver, tmp_path):
+    path = str(tmp_path / "image.png")
+    saver.save_png(path, np.zeros((8, 8, 3), dtype=np.uint8))
+    assert os.path.exists(path)
+    saver.wait_for_saves()
+
+
+def test_detached_errors_are_reported_by_barrier(saver, tmp_path):
+    bad = saver.save_png(str(tmp_path / "bad.png"), np.zeros((8, 8, 5), dtype=np.uint8), detached=True)
+    with pytest.raises(Exception):
+        bad.result()
+    assert [node_id for node_id, _ in saver.wait_for_saves()] == [None]
+    assert saver.wait_for_saves() == []
+
+    with CurrentNodeContext("prompt", "9"):
+        saver.save_png(str(tmp_path / "bad2.png"), np.zeros((8, 8, 5), dtype=np.uint8), detached=True)
+    assert [node_id for node_id, _ in saver.wait_for_saves()] == ["9"]
+
+    waited = saver.save_png(str(tmp_path / "waited.png"), np.zeros((8, 8, 5), dtype=np.uint8))
+    with pytest.raises(Exception):
+        waited.result()
+    assert saver.wait_for_saves() == []
+
+
+def test_wait_for_file(saver, tmp_path):
+    path = str(tmp_path / "image.png")
+    saver.save_png(path, images_to_uint8(torch.rand(1, 256, 256, 3))[0])
+
+    async def view():
+        await saver.wait_for_file(path)
+        await saver.wait_for_file(str(tmp_path / "unknown.png"))
+        with Image.open(path) as img:
+            return img.size
+
+    assert asyncio.run(view()) == (256, 256)
+
+
+class MessageServer:
+    def __init__(self):
+        self.client_id = None
+        self.last_node_id = None
+        self.messages = []
+
+    def send_sync(self, event, data, sid=None):
+        self.messages.append((event, data))
+
+
+def test_failed_detached_save_fails_prompt(tmp_path, monkeypatch):
+    def fail(file, *args):
+        file.close()
+        raise OSError("disk full")
+
+    monkeypatch.setattr(args, "async_image_save", True)
+    monkeypatch.setattr(image_saver, "_encode_png", fail)
+    monkeypatch.setattr(folder_paths, "output_directory", str(tmp_path))
+    prompt = {
+        "1": {"class_type": "EmptyImage", "inputs": {"width": 8, "height": 8, "batch_size": 1, "color": 0}},
+        "2": {"class_type": "SaveImage", "inputs": {"images": ["1", 0], "filename_prefix": "ComfyUI"}},
+    }
+    server = MessageServer()
+    executor = execution.PromptExecutor(server, cache_args={"lru": 0, "ram": 0, "disk": 0})
+    executor.execute(prompt, "prompt", {"client_id": "client"}, ["2"])
+    assert not executor.success
+    events = [event for event, _ in executor.status_messages]
+    assert "execution_success" not in events
+    error = dict(executor.status_messages)["execution_error"]
+    assert error["node_id"] == "2"
+    assert error["node_type"] == "SaveImage"
+    assert "disk full" in error["exception_message"]
+
+
+@pytest.mark.benchmark
+def test_batch_encode_benchmark(saver, tmp_path):
+    batch = images_to_uint8(torch.rand(8, 512, 512, 3))
+    metadata = build_png_metadata({"prompt": "x" * 10000})
+
+    start = time.perf_counter()
+    for i, pixels in enumerate(batch):
+        Image.fromarray(pixels).save(str(tmp_path / f"serial_{i}.png"), pnginfo=metadata, compress_level=4)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, pixels in enumerate(batch):
+        saver.save_png(str(tmp_path / f"pooled_{i}.png"), pixels, metadata, 4)
+    assert saver.wait_for_saves() == []
+    pooled = time.perf_counter() - start
+
+    print(f"\n8x512x512 PNG batch: serial {serial * 1000:.1f} ms, pooled {pooled * 1000:.1f} ms ({saver.max_workers} workers)")  # noqa: T201
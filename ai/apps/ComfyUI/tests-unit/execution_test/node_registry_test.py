@@ -0,0 +1,229 @@
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths
+from comfy_execution.node_registry import (
+    NodeClassMappings,
+    NodeInfoCache,
+    NodeManifest,
+    build_node_info,
+    build_static_node_info,
+    manifest_key,
+)
+
+MODULE_SOURCE = '''
+import folder_paths
+
+class StaticNode:
+    RETURN_TYPES = ("INT",)
+    FUNCTION = "run"
+    CATEGORY = "test"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT", {"default": VALUE})}}
+
+class ModelNode:
+    RETURN_TYPES = ("MODEL",)
+    FUNCTION = "run"
+    CATEGORY = "test"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"name": (folder_paths.get_filename_list("checkpoints"),)}}
+
+NODE_CLASS_MAPPINGS = {"StaticNode": StaticNode, "ModelNode": ModelNode}
+NODE_DISPLAY_NAME_MAPPINGS = {"StaticNode": "Static Node"}
+'''
+
+
+class Registry:
+    """A NodeClassMappings with a loader that imports test modules like nodes.load_custom_node."""
+    def __init__(self):
+        self.mappings = NodeClassMappings()
+        self.display_names = {}
+        self.imports = []
+        self.mappings.loader = self.load
+
+    async def load(self, module_path, module_parent):
+        self.imports.append(module_path)
+        name = os.path.splitext(os.path.basename(module_path))[0]
+        spec = importlib.util.spec_from_file_location(f"{module_parent}.{name}", module_path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            return False
+        for node_name, node_cls in module.NODE_CLASS_MAPPINGS.items():
+            self.mappings[node_name] = node_cls
+            node_cls.RELATIVE_PYTHON_MODULE = f"{module_parent}.{name}"
+        self.display_names.update(module.NODE_DISPLAY_NAME_MAPPINGS)
+        return True
+
+
+@pytest.fixture
+def module_path(tmp_path):
+    path = tmp_path / "nodes_test.py"
+    path.write_text(MODULE_SOURCE.replace("VALUE", "1"))
+    return str(path)
+
+
+def build_manifest(path, module_path, key="key"):
+    """Imports the module eagerly and writes a manifest for it, like a first --lazy-nodes start."""
+    registry = Registry()
+    assert asyncio.run(registry.load(module_path, "comfy_extras"))
+    manifest = NodeManifest(path, key)
+    manifest.add_loaded(module_path, "comfy_extras", ["StaticNode", "ModelNode"])
+    manifest.record_loaded(registry.mappings, registry.display_names)
+    manifest.save()
+    return registry
+
+
+def test_static_detection(module_path):
+    registry = Registry()
+    asyncio.run(registry.load(module_path, "comfy_extras"))
+    _, static = build_static_node_info("StaticNode", registry.mappings["StaticNode"], registry.display_names)
+    assert static
+    _, static = build_static_node_info("ModelNode", registry.mappings["ModelNode"], registry.display_names)
+    assert not static
+
+
+def test_folder_lookups_are_only_counted_while_tracked():
+    folder_paths.get_output_directory()
+    with folder_paths.track_folder_lookups() as lookups:
+        folder_paths.get_input_directory()
+        with folder_paths.track_folder_lookups() as inner:
+            folder_paths.get_folder_paths("checkpoints")
+        # Lookups made by another thread are not this context's
+        thread = threading.Thread(target=folder_paths.get_temp_directory)
+        thread.start()
+        thread.join()
+    folder_paths.get_user_directory()
+    assert lookups == [1]
+    assert inner == [1]
+    assert folder_paths._folder_lookups.get() is None
+
+
+def test_node_infos_are_only_cached_with_lazy_nodes(module_path, monkeypatch):
+    import nodes
+    registry = Registry()
+    asyncio.run(registry.load(module_path, "comfy_extras"))
+    static_cls = registry.mappings["StaticNode"]
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "StaticNode", static_cls)
+    monkeypatch.setattr(nodes, "node_info_cache", NodeInfoCache())
+
+    monkeypatch.setattr(args, "lazy_nodes", False)
+    assert nodes.get_node_info("StaticNode") is not nodes.get_node_info("StaticNode")
+    assert nodes.node_info_cache.entries == {}
+
+    monkeypatch.setattr(args, "lazy_nodes", True)
+    assert nodes.get_node_info("StaticNode") is nodes.get_node_info("StaticNode")
+
+
+def test_lazy_names_are_registered_without_import(tmp_path, module_path):
+    path = str(tmp_path / "manifest.json")
+    eager = build_manifest(path, module_path)
+
+    registry = Registry()
+    lazy = NodeManifest(path, "key").lazy_module(module_path)
+    assert lazy is not None and lazy.display_names == {"StaticNode": "Static Node"}
+    registry.mappings["CoreNode"] = object
+    registry.mappings.add_lazy(lazy)
+
+    assert "StaticNode" in registry.mappings
+    assert "Missing" not in registry.mappings
+    assert len(registry.mappings) == 3
+    assert list(registry.mappings) == ["CoreNode", "StaticNode", "ModelNode"]
+    assert set(registry.mappings.keys()) - {"CoreNode"} == {"StaticNode", "ModelNode"}
+    # The static node's info comes from the manifest (as JSON), the model list has to be built live
+    eager_info = build_node_info("StaticNode", eager.mappings["StaticNode"], eager.display_names)
+    assert registry.mappings.lazy_info("StaticNode") == json.loads(json.dumps(eager_info))
+    assert registry.mappings.lazy_info("ModelNode") is None
+    assert registry.imports == []
+
+    node_cls = registry.mappings["ModelNode"]
+    assert node_cls.RETURN_TYPES == ("MODEL",)
+    assert registry.mappings.get("StaticNode") is not None
+    assert registry.imports == [module_path]
+    assert registry.mappings.lazy == {}
+    assert registry.mappings.get("Missing") is None
+    with pytest.raises(KeyError):
+        registry.mappings["Missing"]
+
+
+def test_items_import_everything(tmp_path, module_path):
+    path = str(tmp_path / "manifest.json")
+    build_manifest(path, module_path)
+    registry = Registry()
+    registry.mappings.add_lazy(NodeManifest(path, "key").lazy_module(module_path))
+    assert sorted(name for name, _ in registry.mappings.items()) == ["ModelNode", "StaticNode"]
+    assert len(registry.imports) == 1
+
+
+def test_failed_import_drops_lazy_names(tmp_path, module_path):
+    path = str(tmp_path / "manifest.json")
+    build_manifest(path, module_path)
+    registry = Registry()
+    registry.mappings.add_lazy(NodeManifest(path, "key").lazy_module(module_path))
+    os.rename(module_path, module_path + ".moved")
+    with pytest.raises(KeyError):
+        registry.mappings["StaticNode"]
+    assert "ModelNode" not in registry.mappings
+
+
+def test_manifest_invalidation(tmp_path, module_path):
+    path = str(tmp_path / "manifest.json")
+    build_manifest(path, module_path)
+    assert NodeManifest(path, "key").lazy_module(module_path) is not None
+    # Another ComfyUI version or set of custom nodes
+    assert NodeManifest(path, "other").lazy_module(module_path) is None
+    # The module source changed
+    with open(module_path, "w") as f:
+        f.write(MODULE_SOURCE.replace("VALUE", "2"))
+    assert NodeManifest(path, "key").lazy_module(module_path) is None
+
+
+def test_manifest_key_follows_custom_nodes(tmp_path):
+    base = tmp_path / "comfy"
+    (base / "comfy").mkdir(parents=True)
+    custom_nodes = tmp_path / "custom_nodes"
+    custom_nodes.mkdir()
+    key = manifest_key(str(base), [str(custom_nodes)])
+    assert manifest_key(str(base), [str(custom_nodes)]) == key
+    (custom_nodes / "my_nodes.py").write_text("")
+    assert manifest_key(str(base), [str(custom_nodes)]) != key
+
+
+def test_info_cache_keeps_static_builtin_nodes(tmp_path, module_path, monkeypatch):
+    registry = Registry()
+    asyncio.run(registry.load(module_path, "comfy_extras"))
+    cache = NodeInfoCache()
+    static_cls = registry.mappings["StaticNode"]
+    info = cache.get("StaticNode", static_cls, registry.display_names)
+    assert cache.get("StaticNode", static_cls, registry.display_names) is info
+
+    checkpoints = tmp_path / "checkpoints"
+    checkpoints.mkdir()
+    monkeypatch.setitem(folder_paths.folder_names_and_paths, "checkpoints", ([str(checkpoints)], {".safetensors"}))
+    monkeypatch.setattr(folder_paths, "filename_list_cache", {})
+    model_cls = registry.mappings["ModelNode"]
+    (checkpoints / "a.safetensors").write_text("")
+    assert cache.get("ModelNode", model_cls, {})["input"]["required"]["name"][0] == ["a.safetensors"]
+    (checkpoints / "b.safetensors").write_text("")
+    folder_paths.filename_list_cache.clear()
+    assert cache.get("ModelNode", model_cls, {})["input"]["required"]["name"][0] == ["a.safetensors", "b.safetensors"]
+
+    # Custom nodes can build their inputs from anything, they are never cached
+    static_cls.RELATIVE_PYTHON_MODULE = "custom_nodes.my_nodes"
+    cache.clear()
+    assert cache.get("StaticNode", static_cls, {}) is not cache.get("StaticNode", static_cls, {})
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import torch
+from unittest.mock import patch, MagicMock
+
+from comfy_execution import tensor_hashing
+from comfy_execution.tensor_hashing import hash_content
+
+# Mock nodes module to prevent CUDA initialization during import
+with patch.dict('sys.modules', {'nodes': MagicMock()}):
+    from comfy_execution.caching import Unhashable, to_hashable
+
+
+@pytest.fixture(autouse=True)
+def clear_memo():
+    tensor_hashing.clear_memo()
+    yield
+    tensor_hashing.clear_memo()
+
+
+def test_equal_tensors_hash_equal():
+    a = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+    assert hash_content(a) == hash_content(a.clone())
+    assert hash(to_hashable([a, 1])) == hash(to_hashable([a.clone(), 1]))
+
+
+def test_dtype_shape_and_content_distinguish():
+    a = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+    assert hash_content(a) != hash_content(a.reshape(4, 3))
+    assert hash_content(a) != hash_content(a.to(torch.float64))
+    b = a.clone()
+    b[1, 1] = -1
+    assert hash_content(a) != hash_content(b)
+
+
+def test_views_hash_logical_contents():
+    a = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+    assert hash_content(a.t()) == hash_content(a.t().contiguous())
+    assert hash_content(a[1]) == hash_content(torch.tensor([4.0, 5.0, 6.0, 7.0]))
+
+
+def test_in_place_write_invalidates_memo():
+    a = torch.zeros(8)
+    before = hash_content(a)
+    a.add_(1)
+    assert hash_content(a) != before
+    assert hash_content(a) == hash_content(torch.ones(8))
+
+
+def test_memo_skips_rehash(monkeypatch):
+    a = torch.randn(16)
+    first = hash_content(a)
+    calls = []
+    monkeypatch.setattr(tensor_hashing, "_digest_tensor", lambda t: calls.append(t) or "x")
+    assert hash_content(a) == first
+    assert calls == []
+
+
+def test_large_tensors_are_hashed_in_full():
+    a = torch.zeros(3 * 1024 * 1024, dtype=torch.float32)
+    b = a.clone()
+    b[1234567] = 1
+    assert hash_content(a) != hash_content(b)
+
+
+def test_inference_tensors():
+    with torch.inference_mode():
+        a = torch.arange(12, dtype=torch.float32)
+        first = hash_content(a)
+        assert first is not None
+        assert first == hash_content(a.clone())
+        assert isinstance(to_hashable(a), tuple)
+        a.add_(1)
+        assert hash_content(a) != first
+    assert hash_content(a) == hash_content(torch.arange(1, 13, dtype=torch.float32))
+
+
+def test_sampling_is_opt_in(monkeypatch):
+    monkeypatch.setattr(tensor_hashing, "FULL_HASH_MAX_BYTES", 64)
+    monkeypatch.setattr(tensor_hashing, "SAMPLED_HASH_ELEMENTS", 8)
+    monkeypatch.setattr(tensor_hashing, "SAMPLED_HASH_EDGE_ELEMENTS", 2)
+    a = torch.arange(1024, dtype=torch.float32)
+    b = a.clone()
+    b[-1] = -1
+    assert hash_content(a) == hash_content(a.clone())
+    assert hash_content(a) != hash_content(b)
+
+
+def test_numpy_arrays():
+    a = np.arange(6, dtype=np.int32).reshape(2, 3)
+    assert hash_content(a) == hash_content(a.copy())
+    assert hash_content(a) != hash_content(a.astype(np.int64))
+    assert hash_content(a) != hash_content(torch.from_numpy(a))
+    assert hash_content(np.array([object()])) is None
+
+
+def test_other_objects_remain_unhashable():
+    assert isinstance(to_hashable(object()), Unhashable)
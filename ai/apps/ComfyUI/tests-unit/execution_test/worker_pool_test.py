@@ -0,0 +1,201 @@
+import threading
+import time
+
+import pytest
+import torch
+
+import comfy.cli_args
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths
+from comfy_execution.worker_pool import AffinityScheduler, BenchmarkServer, PromptWorkerPool, BENCHMARK_NODES, loader_signatures, benchmark_prompt
+from execution import CacheType, PromptQueue
+
+
+class QueueServer:
+    def queue_updated(self):
+        pass
+
+
+def item(number, model, seed=0):
+    return (number, f"prompt-{number}", benchmark_prompt(model, seed, 1, 0.0), {}, ["3"], {})
+
+
+def test_loader_signatures():
+    signatures = loader_signatures(benchmark_prompt("a.safetensors", 1, 20, 0.0))
+    assert len(signatures) == 1
+    assert list(signatures.values()) == [10]
+    assert loader_signatures(benchmark_prompt("a.safetensors", 2, 5, 0.0)) == signatures
+    assert loader_signatures(benchmark_prompt("b.safetensors", 1, 20, 0.0)) != signatures
+    assert list(loader_signatures({"1": {"class_type": "EmptyLatentImage", "inputs": {"width": 512}}}).values()) == [1]
+
+
+def test_prompts_follow_their_models():
+    scheduler = AffinityScheduler()
+    a, b = item(0, "a.safetensors"), item(1, "b.safetensors")
+    # Nothing loaded: oldest prompt first
+    assert scheduler.choose([0, 1], [a, b]) == (0, 0)
+    scheduler.started(0, a)
+    # The later prompt using the loaded model jumps ahead
+    assert scheduler.choose([0, 1], [b, item(2, "a.safetensors")]) == (1, 0)
+    # No match anywhere: the least recently used worker
+    assert scheduler.choose([0, 1], [b]) == (0, 1)
+    scheduler.started(1, b)
+
+    queue = [item(4, "a.safetensors"), item(5, "b.safetensors"), item(6, "a.safetensors")]
+    assert scheduler.choose([1], queue) == (1, 1)
+    assert scheduler.choose([0], [queue[0], queue[2]]) == (0, 0)
+
+
+def test_skipped_prompts_are_not_starved():
+    scheduler = AffinityScheduler(max_skips=2)
+    scheduler.started(0, item(0, "a.safetensors"))
+    waiting = item(1, "b.safetensors")
+    for number in range(2, 4):
+        assert scheduler.choose([0], [waiting, item(number, "a.safetensors")]) == (1, 0)
+    assert scheduler.choose([0], [waiting, item(9, "a.safetensors")]) == (0, 0)
+
+
+def test_fifo_without_affinity():
+    scheduler = AffinityScheduler(affinity=False)
+    scheduler.started(0, item(0, "a.safetensors"))
+    assert scheduler.choose([0], [item(1, "b.safetensors"), item(2, "a.safetensors")]) == (0, 0)
+
+
+def test_get_with():
+    q = PromptQueue(QueueServer())
+    for number in range(3):
+        q.put(item(number, "a.safetensors"))
+    seen = []
+
+    def choose(candidates):
+        seen.append([c[0] for c in candidates])
+        return len(candidates) - 1
+
+    queue_item, item_id = q.get_with(choose, window=2)
+    assert seen == [[0, 1]]
+    assert queue_item[0] == 1
+    assert q.get_tasks_remaining() == 3
+    q.task_done(item_id, {}, None)
+    assert [q.get(timeout=0)[0][0] for _ in range(2)] == [0, 2]
+
+    assert q.get_with(choose, timeout=0.01) is None
+    result = []
+    thread = threading.Thread(target=lambda: result.append(q.get_with(lambda candidates: 0, timeout=5)))
+    thread.start()
+    q.put(item(7, "b.safetensors"))
+    thread.join()
+    assert result[0][0][0] == 7
+
+
+def test_workers_save_images_before_nodes_return(monkeypatch):
+    monkeypatch.setattr(comfy.cli_args.args, "async_image_save", True)
+    pool = PromptWorkerPool(PromptQueue(QueueServer()), QueueServer(), 2, CacheType.CLASSIC, {})
+    assert pool.settings()["args"]["async_image_save"] is False
+    assert comfy.cli_args.args.async_image_save
+
+
+ROUTE_NODES = '''
+from server import PromptServer
+
+@PromptServer.instance.routes.get("/route_nodes")
+async def route(request):
+    pass
+
+PromptServer.instance.app.router.add_get("/route_nodes_app", route)
+PromptServer.instance.loop.call_soon_threadsafe(lambda: None)
+
+class RouteNode:
+    RETURN_TYPES = ()
+    FUNCTION = "run"
+    OUTPUT_NODE = True
+    CATEGORY = "benchmark"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {}}
+
+    def run(self):
+        return {"ui": {"route": [True]}}
+
+NODE_CLASS_MAPPINGS = {"RouteNode": RouteNode}
+'''
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture(scope="module")
+def pool(tmp_path_factory):
+    custom_nodes = tmp_path_factory.mktemp("custom_nodes")
+    (custom_nodes / "bench_nodes.py").write_text(BENCHMARK_NODES)
+    (custom_nodes / "route_nodes.py").write_text(ROUTE_NODES)
+    output = str(tmp_path_factory.mktemp("output"))
+    # Other tests reload comfy.cli_args, and restarted workers read the current args
+    if not torch.cuda.is_available():
+        comfy.cli_args.args.cpu = True
+    with pytest.MonkeyPatch.context() as m:
+        m.setitem(folder_paths.folder_names_and_paths, "custom_nodes", ([str(custom_nodes)], set()))
+        m.setattr(folder_paths, "output_directory", output)
+        m.setattr(folder_paths, "temp_directory", output)
+        server = BenchmarkServer()
+        prompt_queue = PromptQueue(server)
+        pool = PromptWorkerPool(prompt_queue, server, 2, CacheType.CLASSIC, {"lru": 0, "ram": 0, "disk": 0},
+                                init_api_nodes=False, torch_threads=1)
+        pool.start()
+    assert pool.wait_ready(timeout=300)
+    yield pool
+    pool.stop()
+
+
+def run_prompt(pool, number, prompt, outputs=("3",)):
+    prompt_id = f"real-{number}"
+    pool.prompt_queue.put((number, prompt_id, prompt, {}, list(outputs), {}))
+    return prompt_id
+
+
+def history(pool, prompt_id):
+    wait_for(lambda: prompt_id in pool.prompt_queue.get_history())
+    return pool.prompt_queue.get_history()[prompt_id]
+
+
+def test_pool_runs_prompts(pool):
+    prompt_ids = [run_prompt(pool, i, benchmark_prompt(f"{'ab'[i % 2]}.safetensors", i, 2, 0.5)) for i in range(4)]
+    prompt_ids.append(run_prompt(pool, 4, {"1": {"class_type": "RouteNode", "inputs": {}}}, outputs=["1"]))
+    results = [history(pool, prompt_id) for prompt_id in prompt_ids]
+    assert [result["status"]["status_str"] for result in results] == ["success"] * 5
+    assert "mean" in results[0]["outputs"]["3"]
+    assert results[4]["outputs"]["1"] == {"route": [True]}
+    # Both workers got prompts, and each loads the model its prompts share
+    assert set(pool.scheduler.last_started) == {0, 1}
+    assert pool.missing_node_types == []
+
+
+def test_interrupt(pool):
+    prompt_id = run_prompt(pool, 10, benchmark_prompt("c.safetensors", 0, 2, 3.0))
+    wait_for(lambda: any(w.running is not None for w in pool.workers))
+    time.sleep(0.5)
+    pool.prompt_queue.interrupt(prompt_id)
+    result = history(pool, prompt_id)
+    assert not result["status"]["completed"]
+    assert "execution_interrupted" in [event for event, _ in result["status"]["messages"]]
+
+
+def test_dead_worker_is_restarted(pool):
+    prompt_id = run_prompt(pool, 20, benchmark_prompt("d.safetensors", 0, 2, 60.0))
+    wait_for(lambda: any(w.running is not None for w in pool.workers))
+    worker = next(w for w in pool.workers if w.running is not None)
+    process = worker.process
+    process.kill()
+    result = history(pool, prompt_id)
+    assert not result["status"]["completed"]
+    assert pool.wait_ready(timeout=300)
+    assert worker.process is not process
+    result = history(pool, run_prompt(pool, 21, benchmark_prompt("d.safetensors", 1, 2, 0.0)))
+    assert result["status"]["completed"]
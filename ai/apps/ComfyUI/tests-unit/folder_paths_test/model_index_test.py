@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import shutil
+
+import pytest
+
+import folder_paths
+from app.model_index import ModelFolderIndex, benchmark_tree
+
+EXTS = folder_paths.supported_pt_extensions
+MODES = ["poll"] + (["inotify"] if sys.platform.startswith("linux") else [])
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w"):
+        pass
+
+
+def scanned(*roots):
+    """The listing get_filename_list_ builds with a full recursive_search."""
+    files = set()
+    for root in roots:
+        files.update(folder_paths.filter_files_extensions(folder_paths.recursive_search(root, excluded_dir_names=[".git"])[0], EXTS))
+    return sorted(files)
+
+
+def wait_for(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.02)
+    return check()
+
+
+@pytest.fixture(params=MODES)
+def index(request):
+    index = ModelFolderIndex(request.param, poll_interval=0.05)
+    assert index.mode == request.param
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = str(tmp_path / "models")
+    for name in ["a.safetensors", "b.ckpt", "notes.txt", "sub/c.pt", "sub/deeper/d.pth", ".git/e.safetensors", "sub/.git/f.bin"]:
+        touch(os.path.join(root, name))
+    return root
+
+
+def test_initial_listing_matches_recursive_search(index, tree, tmp_path):
+    other = str(tmp_path / "other")
+    touch(os.path.join(other, "z.safetensors"))
+    touch(os.path.join(other, "a.safetensors"))
+    missing = str(tmp_path / "missing")
+    assert index.filename_list("checkpoints", [tree, other, missing], EXTS) == scanned(tree, other, missing)
+    assert index.filename_list("configs", [tree], [".txt"]) == ["notes.txt"]
+    assert "sub" + os.sep + "c.pt" in index.filename_list("all", [tree], set())
+
+
+def test_changes_are_applied(index, tree):
+    def current():
+        return index.filename_list("checkpoints", [tree], EXTS)
+    assert current() == scanned(tree)
+
+    touch(os.path.join(tree, "new.safetensors"))
+    os.makedirs(os.path.join(tree, "added", "inner"))
+    touch(os.path.join(tree, "added", "inner", "g.safetensors"))
+    os.remove(os.path.join(tree, "b.ckpt"))
+    assert wait_for(lambda: current() == scanned(tree))
+    assert os.path.join("added", "inner", "g.safetensors") in current()
+
+    os.rename(os.path.join(tree, "sub"), os.path.join(tree, "moved"))
+    assert wait_for(lambda: current() == scanned(tree))
+    assert os.path.join("moved", "deeper", "d.pth") in current()
+
+    touch(os.path.join(tree, "moved", "deeper", "h.bin"))
+    shutil.rmtree(os.path.join(tree, "added"))
+    assert wait_for(lambda: current() == scanned(tree))
+    assert os.path.join("moved", "deeper", "h.bin") in current()
+
+
+def test_root_created_and_removed(index, tmp_path):
+    root = str(tmp_path / "late")
+    assert index.filename_list("loras", [root], EXTS) == []
+    touch(os.path.join(root, "x.safetensors"))
+    assert index.filename_list("loras", [root], EXTS) == ["x.safetensors"]
+    shutil.rmtree(root)
+    assert wait_for(lambda: index.filename_list("loras", [root], EXTS) == [])
+
+
+@pytest.fixture
+def indexed_folder(tree, monkeypatch):
+    monkeypatch.setitem(folder_paths.folder_names_and_paths, "checkpoints", ([tree], EXTS))
+    folder_paths.enable_model_index()
+    yield tree
+    folder_paths.disable_model_index()
+
+
+def test_get_filename_list_uses_index(indexed_folder, monkeypatch):
+    assert folder_paths.get_filename_list("checkpoints") == scanned(indexed_folder)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("model folder was scanned")
+
+    monkeypatch.setattr(folder_paths, "recursive_search", fail)
+    monkeypatch.setattr(folder_paths.os.path, "getmtime", fail)
+    listing = folder_paths.get_filename_list("checkpoints")
+    listing.append("mutated")
+    assert "mutated" not in folder_paths.get_filename_list("checkpoints")
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("dirs", [100, 400])
+def test_lookup_benchmark(tmp_path, dirs):
+    root = str(tmp_path / "models")
+    count = benchmark_tree(root, dirs, 100)
+    lookups = 20
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        # A cache miss: the full rescan get_filename_list_ does
+        scanned(root)
+    rescan = (time.perf_counter() - start) / lookups
+
+    for mode in MODES:
+        index = ModelFolderIndex(mode)
+        try:
+            start = time.perf_counter()
+            files = index.filename_list("bench", [root], EXTS)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(lookups):
+                index.filename_list("bench", [root], EXTS)
+            lookup = (time.perf_counter() - start) / lookups
+        finally:
+            index.close()
+        assert len(files) == count
+        print(f"\n{count} files, {mode}: rescan {rescan * 1000:.1f} ms, index first scan {first * 1000:.1f} ms, lookup {lookup * 1000:.4f} ms")  # noqa: T201
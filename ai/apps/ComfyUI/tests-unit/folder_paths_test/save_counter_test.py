@@ -0,0 +1,168 @@
+import os
+import time
+
+import pytest
+
+import folder_paths
+from folder_paths import create_save_file, get_save_image_path
+
+
+def listdir_counter(folder, filename):
+    """The original get_save_image_path counter: a full listing parsed per call."""
+    def map_filename(name):
+        prefix_len = len(filename)
+        prefix = name[:prefix_len + 1]
+        try:
+            digits = int(name[prefix_len + 1:].split('_')[0])
+        except:
+            digits = 0
+        return digits, prefix
+    try:
+        return max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(folder))))[0] + 1
+    except ValueError:
+        return 1
+
+
+def touch(folder, name):
+    with open(os.path.join(folder, name), "w"):
+        pass
+
+
+def bump_mtime(folder):
+    # Make sure the directory mtime changes even on coarse timestamp filesystems
+    stat = os.stat(folder)
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    folder_paths.save_counter_indexes.clear()
+    yield str(tmp_path)
+    folder_paths.save_counter_indexes.clear()
+
+
+def save(output_dir, prefix, count=1, ext="png"):
+    full_output_folder, filename, counter, _, _ = get_save_image_path(prefix, output_dir)
+    first = counter
+    for i in range(count):
+        _, counter, f = create_save_file(full_output_folder, filename, counter, ext)
+        f.close()
+        counter += 1
+    return first
+
+
+def test_counters_follow_saves(output_dir):
+    assert save(output_dir, "ComfyUI", count=3) == 1
+    assert save(output_dir, "ComfyUI") == 4
+    assert save(output_dir, "Other") == 1
+    assert save(output_dir, "sub/ComfyUI") == 1
+    assert save(output_dir, "ComfyUI") == 5
+
+
+def test_matches_listing_for_mixed_names(output_dir):
+    names = ["ComfyUI_00007_.png", "ComfyUI_00012_.webp", "ComfyUI_abc.png", "ComfyUIx_00099_.png",
+             "Comfy_00050_.png", "ComfyUI", "ComfyUI_00003_0001.png", "notes.txt"]
+    for name in names:
+        touch(output_dir, name)
+    for prefix in ["ComfyUI", "Comfy", "ComfyUIx", "notes", "missing"]:
+        assert get_save_image_path(prefix, output_dir)[2] == listdir_counter(output_dir, prefix)
+
+
+def test_external_changes_are_picked_up(output_dir):
+    assert save(output_dir, "ComfyUI", count=2) == 1
+    touch(output_dir, "ComfyUI_00040_.png")
+    bump_mtime(output_dir)
+    assert get_save_image_path("ComfyUI", output_dir)[2] == 41
+
+    os.remove(os.path.join(output_dir, "ComfyUI_00040_.png"))
+    bump_mtime(output_dir)
+    assert get_save_image_path("ComfyUI", output_dir)[2] == 3
+
+
+def test_unchanged_folder_is_not_listed(output_dir, monkeypatch):
+    save(output_dir, "ComfyUI", count=2)
+    assert get_save_image_path("ComfyUI", output_dir)[2] == 3
+
+    def fail(path):
+        raise AssertionError("folder was listed")
+
+    monkeypatch.setattr(folder_paths.os, "listdir", fail)
+    assert get_save_image_path("ComfyUI", output_dir)[2] == 3
+    assert get_save_image_path("Other", output_dir)[2] == 1
+
+
+def test_saves_do_not_list_the_folder(output_dir, monkeypatch):
+    for i in range(5000):
+        touch(output_dir, f"ComfyUI_{i + 1:05}_.png")
+    assert save(output_dir, "ComfyUI") == 5001
+
+    def fail(path):
+        raise AssertionError("folder was listed")
+
+    monkeypatch.setattr(folder_paths.os, "listdir", fail)
+    for i in range(20):
+        assert save(output_dir, "ComfyUI") == 5002 + i
+
+
+def test_missed_foreign_file_is_not_overwritten(output_dir):
+    full_output_folder, filename, counter, _, _ = get_save_image_path("ComfyUI", output_dir)
+    # Another process saves while we do, before our note_saved
+    with open(os.path.join(full_output_folder, f"{filename}_{counter + 1:05}_.png"), "wb") as f:
+        f.write(b"foreign")
+    file, _, f = create_save_file(full_output_folder, filename, counter, "png")
+    f.close()
+
+    full_output_folder, filename, counter, _, _ = get_save_image_path("ComfyUI", output_dir)
+    file, counter, f = create_save_file(full_output_folder, filename, counter, "png")
+    f.close()
+    assert file == f"{filename}_{counter:05}_.png" and counter == 3
+    with open(os.path.join(full_output_folder, f"{filename}_00002_.png"), "rb") as f:
+        assert f.read() == b"foreign"
+    assert get_save_image_path("ComfyUI", output_dir)[2] == 4
+
+
+def test_concurrent_indexes_never_truncate(output_dir):
+    # Two prompt workers, each with its own index, are handed the same counter
+    counters = [folder_paths.SaveCounterIndex(output_dir).next_counter("ComfyUI") for _ in range(2)]
+    assert counters == [1, 1]
+    saved = []
+    for data, counter in zip([b"first", b"second"], counters):
+        file, counter, f = create_save_file(output_dir, "ComfyUI", counter, "png")
+        with f:
+            f.write(data)
+        saved.append((file, counter))
+    assert saved == [("ComfyUI_00001_.png", 1), ("ComfyUI_00002_.png", 2)]
+    with open(os.path.join(output_dir, "ComfyUI_00001_.png"), "rb") as f:
+        assert f.read() == b"first"
+    assert get_save_image_path("ComfyUI", output_dir)[2] == 3
+
+
+def test_missing_folder_is_created(output_dir):
+    full_output_folder, _, counter, subfolder, _ = get_save_image_path("new/ComfyUI", output_dir)
+    assert counter == 1
+    assert subfolder == "new"
+    assert os.path.isdir(full_output_folder)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("folder_size", [1000, 10000, 20000])
+def test_save_latency_benchmark(output_dir, folder_size):
+    for i in range(folder_size):
+        touch(output_dir, f"ComfyUI_{i + 1:05}_.png")
+
+    saves = 20
+    start = time.perf_counter()
+    for _ in range(saves):
+        counter = listdir_counter(output_dir, "ComfyUI")
+        touch(output_dir, f"ComfyUI_{counter:05}_.png")
+    listing = (time.perf_counter() - start) / saves
+
+    # The first save lists the folder once to pick up the files written above
+    save(output_dir, "ComfyUI")
+    start = time.perf_counter()
+    for _ in range(saves):
+        counter = save(output_dir, "ComfyUI")
+    indexed = (time.perf_counter() - start) / saves
+
+    assert counter == folder_size + 2 * saves + 1
+    print(f"\n{folder_size} files: listing {listing * 1000:.2f} ms/save, indexed {indexed * 1000:.3f} ms/save")  # noqa: T201
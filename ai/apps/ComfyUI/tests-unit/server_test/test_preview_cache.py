@@ -0,0 +1,123 @@
+"""Tests for the /view preview transcoding cache"""
+
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app import preview_cache
+from app.preview_cache import PreviewCache, is_not_modified
+
+pytestmark = pytest.mark.asyncio  # Apply asyncio mark to all tests
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    path = tmp_path / "image.png"
+    Image.new("RGBA", (32, 16), (255, 0, 0, 128)).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def render_calls(monkeypatch):
+    calls = []
+    original = preview_cache.render_preview
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(preview_cache, "render_preview", counting)
+    return calls
+
+
+async def test_preview_formats(image_file):
+    cache = PreviewCache()
+    jpeg = await cache.get(image_file, "jpeg;50", "")
+    assert jpeg.content_type == "image/jpeg"
+    assert Image.open(BytesIO(jpeg.body)).mode == "RGB"
+
+    # explicit alpha channels always fall back to webp
+    webp = await cache.get(image_file, "jpeg;50", "rgba")
+    assert webp.content_type == "image/webp"
+
+    rgb = await cache.get(image_file, None, "rgb")
+    assert rgb.content_type == "image/png"
+    assert Image.open(BytesIO(rgb.body)).mode == "RGB"
+
+    alpha = await cache.get(image_file, None, "a")
+    assert Image.open(BytesIO(alpha.body)).getchannel("A").getpixel((0, 0)) == 128
+
+
+async def test_repeated_requests_hit_cache(image_file, render_calls):
+    cache = PreviewCache()
+    first = await cache.get(image_file, "webp;90", "rgba")
+    second = await cache.get(image_file, "webp;90", "rgba")
+    assert first is second
+    assert len(render_calls) == 1
+
+    await cache.get(image_file, "webp;80", "rgba")
+    assert len(render_calls) == 2
+
+
+async def test_concurrent_requests_share_one_render(image_file, render_calls):
+    cache = PreviewCache()
+    results = await asyncio.gather(*[cache.get(image_file, "webp", "rgba") for _ in range(8)])
+    assert all(result is results[0] for result in results)
+    assert len(render_calls) == 1
+    assert cache.pending == {}
+
+
+async def test_modified_file_is_rerendered(image_file, render_calls):
+    cache = PreviewCache()
+    first = await cache.get(image_file, "webp", "rgba")
+    Image.new("RGBA", (8, 8)).save(image_file)
+    stat = os.stat(image_file)
+    os.utime(image_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = await cache.get(image_file, "webp", "rgba")
+    assert first.etag != second.etag
+    assert len(render_calls) == 2
+
+
+async def test_cache_is_size_bounded(image_file):
+    cache = PreviewCache()
+    preview = await cache.get(image_file, "webp;90", "rgba")
+    cache.clear()
+    cache.max_bytes = len(preview.body) * 2
+    for quality in range(90, 95):
+        await cache.get(image_file, f"webp;{quality}", "rgba")
+    assert cache.total_bytes <= cache.max_bytes
+    assert len(cache.entries) < 5
+
+
+async def test_render_errors_propagate(tmp_path):
+    path = tmp_path / "broken.png"
+    path.write_bytes(b"not an image")
+    cache = PreviewCache()
+    with pytest.raises(Exception):
+        await cache.get(str(path), "webp", "rgba")
+    assert cache.pending == {}
+    assert cache.entries == {}
+
+
+async def test_conditional_requests(image_file):
+    cache = PreviewCache()
+    preview = await cache.get(image_file, "webp", "rgba")
+    assert is_not_modified({"If-None-Match": preview.etag}, preview)
+    assert is_not_modified({"If-None-Match": f'"other", {preview.etag}'}, preview)
+    assert not is_not_modified({"If-None-Match": '"other"'}, preview)
+    assert is_not_modified({"If-Modified-Since": preview.last_modified}, preview)
+    assert not is_not_modified({"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}, preview)
+    assert not is_not_modified({}, preview)
+
+
+async def test_validator_needs_no_render(image_file, render_calls):
+    cache = PreviewCache()
+    validator = cache.validator(image_file, "webp", "rgba")
+    assert is_not_modified({"If-None-Match": validator.etag}, validator)
+    assert render_calls == []
+    preview = await cache.get(image_file, "webp", "rgba", validator)
+    assert (preview.etag, preview.last_modified) == (validator.etag, validator.last_modified)
+    assert cache.validator(image_file, "webp", "rgba") == validator
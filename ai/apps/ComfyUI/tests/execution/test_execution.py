@@ -155,6 +155,7 @@ class TestExecution:
         { "extra_args" : [], "should_cache_results" : True },
         { "extra_args" : ["--cache-lru", 0], "should_cache_results" : True },
         { "extra_args" : ["--cache-lru", 100], "should_cache_results" : True },
+        { "extra_args" : ["--cache-disk", 1], "should_cache_results" : True },
         { "extra_args" : ["--cache-none"], "should_cache_results" : False },
     ])
     def server(self, args_pytest, request):
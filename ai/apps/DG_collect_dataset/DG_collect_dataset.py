@@ -1,4 +1,5 @@
 import argparse
+import json
 import sys
 import os
 import importlib
@@ -21,6 +22,7 @@ if core_dir not in sys.path:
     sys.path.append(core_dir)
 
 import utils
+from manifest import MANIFEST_DIR, dir_signature
 
 STEPS = {
     1: "01_setup_scrape",
@@ -32,7 +34,54 @@ STEPS = {
     7: "07_summary"
 }
 
-def run_pipeline(slug, display_name, trigger, only_step=None):
+# --- STEP GRAPH ---
+# Directories (utils.DIRS keys) each step reads. A step whose inputs, outputs
+# and config are unchanged since its last run is skipped; inside a step the
+# per-file manifests (core/manifest.py) limit work to added/changed files.
+# Step 1 has no local inputs (it scrapes) and always runs.
+STEP_INPUTS = {
+    2: ["scrape"],
+    3: ["crop"],
+    4: ["validate", "scrape"],
+    5: ["clean"],
+    6: ["caption", "clean"],
+    7: ["publish"],
+}
+STEP_OUTPUTS = {2: "crop", 3: "validate", 4: "clean", 5: "caption", 6: "publish", 7: "summary"}
+# Steps with outputs outside the project expose them as external_outputs(slug)
+STEP_EXTERNAL_OUTPUTS = [6]
+
+def helper_modules():
+    """The core modules that aren't steps (face_index, manifest, consensus, ...), shared by the steps."""
+    return sorted(f for f in os.listdir(core_dir) if f.endswith(".py") and f[:-3] not in STEPS.values())
+
+def step_signature(slug, step_num):
+    """Fingerprint of a step's inputs, outputs, config and code (stat only, no reads)."""
+    path = utils.get_project_path(slug)
+    dirs = [path / utils.DIRS[d] for d in STEP_INPUTS[step_num] + [STEP_OUTPUTS[step_num]]]
+    if step_num in STEP_EXTERNAL_OUTPUTS:
+        dirs += importlib.import_module(STEPS[step_num]).external_outputs(slug)
+    sources = [STEPS[step_num] + ".py"] + helper_modules()
+    return dir_signature(dirs, extra={
+        'config': utils.load_config(slug),
+        'code': {name: os.stat(os.path.join(core_dir, name)).st_mtime_ns for name in sources},
+        'env': os.environ.get("DG_FACE_DETECTOR"),
+    })
+
+def load_pipeline_state(slug):
+    state_path = utils.get_project_path(slug) / MANIFEST_DIR / "pipeline.json"
+    if not state_path.exists(): return {}
+    try:
+        with open(state_path, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_pipeline_state(slug, state):
+    state_path = utils.get_project_path(slug) / MANIFEST_DIR / "pipeline.json"
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(state_path, 'w') as f: json.dump(state, f, indent=4)
+
+def run_pipeline(slug, display_name, trigger, only_step=None, force=False):
     print(f"==========================================")
     print(f"🚀 PIPELINE START: {display_name}")
     print(f"🔑 Trigger Identity: {trigger}")
@@ -54,11 +103,17 @@ def run_pipeline(slug, display_name, trigger, only_step=None):
     else:
         step_nums = sorted(STEPS.keys())
 
+    state = load_pipeline_state(slug)
     for step_num in step_nums:
         module_name = STEPS.get(step_num)
         if not os.path.exists(os.path.join(core_dir, module_name + ".py")):
             continue
 
+        tracked = step_num in STEP_INPUTS
+        if tracked and not force and state.get(module_name) == step_signature(slug, step_num):
+            print(f"\n--> [{module_name}] Step {step_num} up to date, skipping.")
+            continue
+
         print(f"\n--> [{module_name}] Running Step {step_num}...")
         try:
             module = importlib.import_module(module_name)
@@ -66,6 +121,16 @@ def run_pipeline(slug, display_name, trigger, only_step=None):
                 module.run(slug)
             else:
                 print(f"❌ Error: {module_name} missing 'run(slug)' function.")
+                continue
+
+            # Steps report failures by returning early, so only a step that
+            # left outputs behind is remembered as done
+            out_dir = utils.get_project_path(slug) / utils.DIRS[STEP_OUTPUTS[step_num]] if tracked else None
+            if tracked and out_dir.exists() and any(out_dir.iterdir()):
+                state[module_name] = step_signature(slug, step_num)
+            else:
+                state.pop(module_name, None)
+            save_pipeline_state(slug, state)
         except Exception as e:
             print(f"❌ CRITICAL ERROR in {module_name}: {e}")
             import traceback
@@ -79,6 +144,7 @@ def main():
     parser.add_argument("name", help="Name of the person (e.g. 'Theresa May')")
     parser.add_argument("--trigger", default=None, help="Trigger word (Defaults to Obfuscated ID)")
     parser.add_argument("--only-step", help="Run only a specific step number (1-7)")
+    parser.add_argument("--force", action="store_true", help="Run steps even if their inputs are unchanged")
 
     args = parser.parse_args()
     
@@ -100,7 +166,7 @@ def main():
             # Uses the utils helper to ensure consistency
             trigger = utils.obfuscate_trigger(raw_name)
 
-    run_pipeline(slug, display_name, trigger, args.only_step)
+    run_pipeline(slug, display_name, trigger, args.only_step, args.force)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
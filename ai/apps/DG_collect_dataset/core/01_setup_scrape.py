@@ -2,7 +2,6 @@ import sys
 import os
 import time
 import json
-import requests
 from urllib.parse import quote_plus
 from pathlib import Path
 from typing import List
@@ -12,6 +11,8 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+from manifest import MANIFEST_DIR
+from downloader import ImageDownloader, ALLOWED_EXTENSIONS
 
 # Ensure Playwright is available
 try:
@@ -22,25 +23,13 @@ except ImportError:
     subprocess.run([sys.executable, "-m", "playwright", "install"], check=True)
     from playwright.sync_api import sync_playwright, TimeoutError
 
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
-
 # --- ANTI-HANG CONFIG (Section XXV) ---
 MAX_STALEMATE_COUNT = 3      # Stop after 3 failed scrolls (was 15)
 SCROLL_DELAY = 1.5           # Seconds between scrolls (was 2)
 PAGE_LOAD_TIMEOUT = 15000    # 15 seconds for page load (was 120s)
 DOWNLOAD_TIMEOUT = 5         # 5 seconds for image download
 
-def download_image(url, save_path):
-    try:
-        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=DOWNLOAD_TIMEOUT)
-        if response.status_code == 200:
-            with open(save_path, 'wb') as f:
-                f.write(response.content)
-            return True
-    except: pass
-    return False
-
-def scrape_bing_playwright(query, limit, save_dir, prefix, start_idx=1):
+def scrape_bing_playwright(query, limit, downloader):
     print(f"--> Launching Playwright for Bing: '{query}'")
     search_url = f"https://www.bing.com/images/search?q={quote_plus(query)}&form=HDRSC3&first=1"
     
@@ -56,7 +45,8 @@ def scrape_bing_playwright(query, limit, save_dir, prefix, start_idx=1):
         time.sleep(SCROLL_DELAY)
         
         urls = []
-        seen = set()
+        # URLs fetched (or given up on) in earlier runs don't count towards the limit
+        seen = downloader.known_urls()
         stagnation_counter = 0
         
         print(f"--> Scrolling to find {limit} images...")
@@ -105,19 +95,7 @@ def scrape_bing_playwright(query, limit, save_dir, prefix, start_idx=1):
         browser.close()
         
     print(f"\n--> Downloading {len(urls)} images...")
-    
-    saved = 0
-    idx = start_idx
-    for url in urls:
-        if saved >= limit: break
-        ext = os.path.splitext(url)[1].lower()
-        if ext not in ALLOWED_EXTENSIONS: ext = ".jpg"
-        ext = ext.split('?')[0]
-        filename = f"{prefix}_{idx:04d}{ext}"
-        if download_image(url, save_dir / filename):
-            saved += 1
-            idx += 1
-            print(f"    Downloaded: {filename} [{saved}/{limit}]", end='\r')
+    saved = downloader.download(urls, limit)
     print(f"\n✅ Downloaded images.")
     return saved
 
@@ -149,14 +127,24 @@ def run(slug):
         print(f"✅ Found {len(existing)} images, skipping scrape.")
         return
 
-    # 5. Run scrape using the single query
+    downloader = ImageDownloader(scrape_dir, slug, str(path / MANIFEST_DIR / "scrape_urls.json"),
+                                 timeout=DOWNLOAD_TIMEOUT)
     downloaded = len(existing)
+
+    # 5. Resume URLs collected by an interrupted run before searching again
+    pending = downloader.pending_urls()
+    if pending:
+        print(f"--> Resuming {len(pending)} pending downloads...")
+        downloaded += downloader.download(pending, limit - downloaded)
+
+    # 6. Run scrape using the single query
     for query in queries:
         remaining = limit - downloaded
         if remaining <= 0:
             break
-        saved = scrape_bing_playwright(query, remaining, scrape_dir, slug, start_idx=downloaded + 1)
+        saved = scrape_bing_playwright(query, remaining, downloader)
         downloaded += saved
+    downloader.close()
     if downloaded == 0:
         print(f"❌ No images were scraped for {name}. Please check the query or try a different name.")
     else:
@@ -4,13 +4,14 @@ import cv2
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
-from insightface.app import FaceAnalysis
 
 # --- BOOTSTRAP ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+from face_index import FaceIndex, primary_face
+from manifest import StepManifest
 
 def get_crop_coords(img_shape, bbox, mode="face"):
     h, w, _ = img_shape
@@ -65,53 +66,69 @@ def run(slug):
     path = utils.get_project_path(slug)
     in_dir = path / utils.DIRS['scrape']
     out_dir = path / utils.DIRS['crop']
+
+    print(f"✂️  [02_crop] Running logic: Face (Hair-to-Chin) & Body (Upper Third)...")
     
-    if out_dir.exists():
+    index = FaceIndex(path)
+    manifest = StepManifest(path, 'crop', params={'detector': index.detector.name})
+
+    # Only crops recorded in the manifest are kept across runs
+    if manifest.is_new and out_dir.exists():
         import shutil
         shutil.rmtree(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"✂️  [02_crop] Running logic: Face (Hair-to-Chin) & Body (Upper Third)...")
-    
-    try:
-        app = FaceAnalysis(name='buffalo_l', root='/mnt/c/AI/models/insightface')
-        app.prepare(ctx_id=0, det_size=(640, 640))
-    except Exception as e:
-        print(f"❌ InsightFace Error: {e}")
-        return
-
     files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
+    todo = manifest.plan({f: [in_dir / f] for f in files})
+    print(f"   -> {len(todo)} new/changed, {len(files) - len(todo)} up to date")
     
     count = 0
-    for f in tqdm(files, desc="Cropping"):
-        img = cv2.imread(str(in_dir / f))
-        if img is None: continue
-
-        faces = app.get(img)
-        base_name = os.path.splitext(f)[0]
-
-        # --- FALLBACK LOGIC ---
-        if not faces:
-            # FIX: If no face found, force a Center Square Crop.
-            # Never save a non-square image.
-            square_img = force_center_square(img)
-            cv2.imwrite(str(out_dir / f"body_{base_name}.jpg"), square_img)
-            count += 1
-            continue
-
-        primary = max(faces, key=lambda x: (x.bbox[2]-x.bbox[0]) * (x.bbox[3]-x.bbox[1]))
-
-        # 1. Body Crop
-        by1, by2, bx1, bx2 = get_crop_coords(img.shape, primary.bbox, "body")
-        cv2.imwrite(str(out_dir / f"body_{base_name}.jpg"), img[by1:by2, bx1:bx2])
-
-        # 2. Face Crop
-        fy1, fy2, fx1, fx2 = get_crop_coords(img.shape, primary.bbox, "face")
-        cv2.imwrite(str(out_dir / f"face_{base_name}.jpg"), img[fy1:fy2, fx1:fx2])
-        
-        count += 2
-
-    print(f"✅ Generated {count} images in {out_dir}")
+    with manifest:
+        for f in tqdm(todo, desc="Cropping"):
+            img = cv2.imread(str(in_dir / f))
+            if img is None:
+                manifest.record(f, [])
+                continue
+
+            try:
+                _, faces = index.analyze(in_dir / f, img)
+            except Exception as e:
+                print(f"❌ InsightFace Error: {e}")
+                index.close()
+                return
+            base_name = os.path.splitext(f)[0]
+
+            # --- FALLBACK LOGIC ---
+            if not faces:
+                # FIX: If no face found, force a Center Square Crop.
+                # Never save a non-square image.
+                square_img = force_center_square(img)
+                body_path = out_dir / f"body_{base_name}.jpg"
+                cv2.imwrite(str(body_path), square_img)
+                manifest.record(f, [body_path])
+                count += 1
+                continue
+
+            primary = primary_face(faces)
+
+            # 1. Body Crop
+            by1, by2, bx1, bx2 = get_crop_coords(img.shape, primary.bbox, "body")
+            body_path = out_dir / f"body_{base_name}.jpg"
+            cv2.imwrite(str(body_path), img[by1:by2, bx1:bx2])
+            # Later steps read the crop's faces from this image's analysis
+            index.register_crop(in_dir / f, body_path, by1, by2, bx1, bx2)
+
+            # 2. Face Crop
+            fy1, fy2, fx1, fx2 = get_crop_coords(img.shape, primary.bbox, "face")
+            face_path = out_dir / f"face_{base_name}.jpg"
+            cv2.imwrite(str(face_path), img[fy1:fy2, fx1:fx2])
+            index.register_crop(in_dir / f, face_path, fy1, fy2, fx1, fx2)
+
+            manifest.record(f, [body_path, face_path])
+            count += 2
+
+    index.close()
+    print(f"✅ Generated {count} images in {out_dir} ({manifest.removed} orphans removed, faces: {index.stats()})")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
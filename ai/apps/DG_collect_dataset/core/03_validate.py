@@ -4,16 +4,16 @@ import sys
 import shutil
 import numpy as np
 from pathlib import Path
-from insightface.app import FaceAnalysis
-from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
-import cv2
 
 # --- BOOTSTRAP ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+from face_index import FaceIndex, primary_face
+from manifest import StepManifest
+from consensus import THRESHOLD, identity_consensus, write_report
 
 def run(slug):
     """
@@ -27,8 +27,8 @@ def run(slug):
     out_dir.mkdir(parents=True, exist_ok=True)
 
     print(f"🧐 [03_validate] Calculating Identity Consensus for {slug}...")
-    app = FaceAnalysis(name='buffalo_l', root='/mnt/c/AI/models/insightface')
-    app.prepare(ctx_id=0, det_size=(640, 640))
+    # Crops registered by step 02 reuse the analysis of their source image
+    index = FaceIndex(path)
 
     files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png'))])
     embeddings = []
@@ -36,36 +36,47 @@ def run(slug):
 
     # 1. Extraction Pass
     for f in tqdm(files, desc="Analyzing Identities"):
-        img = cv2.imread(str(in_dir / f))
-        if img is None: continue
-        faces = app.get(img)
+        _, faces = index.analyze(in_dir / f)
         if faces:
             # Assume Step 2 already centered the subject
-            primary = max(faces, key=lambda x: (x.bbox[2]-x.bbox[0]) * (x.bbox[3]-x.bbox[1]))
+            primary = primary_face(faces)
             embeddings.append(primary.normed_embedding)
             valid_files.append(f)
 
+    index.close()
+    print(f"   Faces: {index.stats()}")
+
     if not embeddings:
         print("❌ No faces found to validate.")
         return
 
     # 2. Consensus Calculation
-    # The 'Master Face' is the average embedding of the set
-    master_vector = np.mean(embeddings, axis=0).reshape(1, -1)
+    # The 'Master Face' is the dominant identity of the set, re-estimated
+    # from its inliers so outliers can't drag it off target
+    result = identity_consensus(np.stack(embeddings), threshold=THRESHOLD)
+    report_path = path / "03_validate_report.csv"
+    write_report(report_path, valid_files, result)
+    print(f"   Identity support: {result.support:.0%} of faces | Report: {report_path}")
     
     # 3. Filtering Pass
-    kept_count = 0
-    for f, emb in zip(valid_files, embeddings):
-        score = cosine_similarity(emb.reshape(1, -1), master_vector)[0][0]
-        
-        # Threshold: 0.45 is usually safe for distinct subjects
-        if score > 0.45:
-            shutil.copy2(in_dir / f, out_dir / f)
-            kept_count += 1
+    kept = []
+    for f, score, keep in zip(valid_files, result.scores, result.keep):
+        if keep:
+            kept.append(f)
         else:
             print(f"   🗑️ Outlier Removed: {f} (Score: {score:.2f})")
 
-    print(f"✅ Validation Complete. Kept {kept_count}/{len(files)} images in {out_dir}")
+    # 4. Sync: copy new/changed keepers, drop files that are no longer kept
+    with StepManifest(path, 'validate', params={'threshold': THRESHOLD}) as manifest:
+        if manifest.is_new:
+            shutil.rmtree(out_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+        todo = manifest.plan({f: [in_dir / f] for f in kept})
+        for f in todo:
+            shutil.copy2(in_dir / f, out_dir / f)
+            manifest.record(f, [out_dir / f])
+
+    print(f"✅ Validation Complete. Kept {len(kept)}/{len(files)} images in {out_dir} ({len(todo)} copied, {manifest.removed} removed)")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -25,6 +25,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+from manifest import StepManifest
 
 def is_square_image(img_path):
     img = cv2.imread(str(img_path))
@@ -50,35 +51,46 @@ def run(slug):
     validate_dir = path / utils.DIRS.get('validate', '03_validate')
     clean_dir = path / utils.DIRS.get('clean', '04_clean')
 
-    if clean_dir.exists(): shutil.rmtree(clean_dir)
-    clean_dir.mkdir(parents=True, exist_ok=True)
-
     if not validate_dir.exists():
         print(f"\u274c Error: Validation folder missing: {validate_dir}")
         return
 
     print(f"\u2728 [04_clean] Merging Body & Face data for {slug} (square only)...")
 
-    valid_files = [f for f in os.listdir(validate_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
+    valid_files = sorted([f for f in os.listdir(validate_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
     count = 0
-    for f_name in tqdm(valid_files, desc="Merging Persistence"):
-        src_path = validate_dir / f_name
-        if not is_square_image(src_path):
-            print(f"[SKIP] Non-square image skipped: {f_name}")
-            continue
-        shutil.copy2(src_path, clean_dir / f_name)
+    with StepManifest(path, 'clean') as manifest:
+        if manifest.is_new and clean_dir.exists(): shutil.rmtree(clean_dir)
+        clean_dir.mkdir(parents=True, exist_ok=True)
 
-        # 2. Extract original filename to find the body counterpart
-        raw_id = f_name.replace("face_", "").replace("body_", "")
-        body_source = scrape_dir / raw_id
-        if body_source.exists() and is_square_image(body_source):
-            shutil.copy2(body_source, clean_dir / f"body_{raw_id}")
-            count += 2
-        else:
-            count += 1
+        # Each validated file is rebuilt when it or its scraped original changes
+        sources = {}
+        for f_name in valid_files:
+            raw_id = f_name.replace("face_", "").replace("body_", "")
+            sources[f_name] = [validate_dir / f_name, scrape_dir / raw_id]
+        todo = manifest.plan(sources)
+
+        for f_name in tqdm(todo, desc="Merging Persistence"):
+            src_path = validate_dir / f_name
+            if not is_square_image(src_path):
+                print(f"[SKIP] Non-square image skipped: {f_name}")
+                manifest.record(f_name, [])
+                continue
+            shutil.copy2(src_path, clean_dir / f_name)
+            outputs = [clean_dir / f_name]
+
+            # 2. Extract original filename to find the body counterpart
+            raw_id = f_name.replace("face_", "").replace("body_", "")
+            body_source = scrape_dir / raw_id
+            if body_source.exists() and is_square_image(body_source):
+                shutil.copy2(body_source, clean_dir / f"body_{raw_id}")
+                outputs.append(clean_dir / f"body_{raw_id}")
+                count += 2
+            else:
+                count += 1
+            manifest.record(f_name, outputs)
 
-    print(f"\u2705 Clean Complete: {count} total square images ready for Step 5.")
-    print(f"✅ Clean Complete: {count} total images ready for Step 5.")
+    print(f"\u2705 Clean Complete: {count} square images updated, {len(valid_files) - len(todo)} up to date, {manifest.removed} removed.")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -1,12 +1,9 @@
 import sys
 import os
 import re
-import torch
 import shutil
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
-from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor, BitsAndBytesConfig
-from qwen_vl_utils import process_vision_info
 from tqdm import tqdm
 
 # --- BOOTSTRAP ---
@@ -14,9 +11,12 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+from manifest import StepManifest
+from caption_engine import CaptionEngine, get_backend
 
 # --- CONFIGURATION ---
 BATCH_SIZE = 4
+SAVE_EVERY = 10  # batches between manifest checkpoints
 QWEN_PATH = "/mnt/c/AI/models/LLM/Qwen2.5-VL-3B-Instruct"
 
 def get_caption_prompt(trigger):
@@ -61,88 +61,82 @@ def run(slug):
     out_dir = path / utils.DIRS.get('caption', '05_caption')
     out_dir.mkdir(parents=True, exist_ok=True)
     
-    if not os.path.exists(QWEN_PATH):
-        print(f"❌ Error: Model not found at {QWEN_PATH}")
-        return
+    files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
+    manifest = StepManifest(path, 'caption', params={'trigger': trigger, 'model': QWEN_PATH, 'prompt': get_caption_prompt(trigger)})
+    todo = manifest.plan({f: [in_dir / f] for f in files})
+
+    # Adopt captions made before the manifest existed (or edited by hand) when the image is unchanged
+    for f in list(todo):
+        dst_img = out_dir / f
+        dst_txt = out_dir / (os.path.splitext(f)[0] + ".txt")
+        if f not in manifest.entries and dst_img.exists() and dst_txt.exists() \
+                and manifest.file_digest(dst_img) == manifest.file_digest(in_dir / f):
+            manifest.record(f, [dst_img, dst_txt])
+            todo.remove(f)
 
     print(f"📝 [05_caption] Batch Engine (Batch: {BATCH_SIZE})")
     print(f"   -> Using Abstract Trigger: '{trigger}'")
+    print(f"   -> {len(todo)} to caption, {len(files) - len(todo)} up to date, {manifest.removed} removed")
 
-    bnb_config = BitsAndBytesConfig(
-        load_in_4bit=True,
-        bnb_4bit_compute_dtype=torch.float16,
-        bnb_4bit_quant_type="nf4"
-    )
+    if not todo:
+        manifest.save()
+        print(f"✅ Success. Captions saved to: {out_dir}")
+        return
+
+    standin = os.environ.get("DG_CAPTION_BACKEND") == "standin"
+    if not standin and not os.path.exists(QWEN_PATH):
+        print(f"❌ Error: Model not found at {QWEN_PATH}")
+        manifest.save()
+        return
 
     try:
-        model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
-            QWEN_PATH, quantization_config=bnb_config, device_map="auto"
-        )
-        processor = AutoProcessor.from_pretrained(QWEN_PATH)
+        backend = get_backend(QWEN_PATH, get_caption_prompt(trigger))
     except Exception as e:
         print(f"❌ Error loading model: {e}")
+        manifest.save()
         return
 
-    files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
-    
-    # Batches
-    batches = [files[i:i + BATCH_SIZE] for i in range(0, len(files), BATCH_SIZE)]
-    print(f"   -> Processing {len(files)} images in {len(batches)} batches...")
+    # Size-sorted batches, prepared one step ahead of generation
+    engine = CaptionEngine(backend, batch_size=BATCH_SIZE)
+    print(f"   -> Processing {len(todo)} images in {-(-len(todo) // BATCH_SIZE)} batches...")
 
     io_executor = ThreadPoolExecutor(max_workers=4)
-
-    for batch_files in tqdm(batches, desc="Batch Inference"):
-        batch_messages = []
-        
-        # Prepare Batch
-        for f in batch_files:
-            img_path = in_dir / f
-            messages = [{
-                "role": "user", 
-                "content": [
-                    {"type": "image", "image": str(img_path), "max_pixels": 768*768}, 
-                    {"type": "text", "text": get_caption_prompt(trigger)}
-                ]
-            }]
-            batch_messages.append(messages)
-
-        # Tokenize & Generate
-        texts = [processor.apply_chat_template(msg, tokenize=False, add_generation_prompt=True) for msg in batch_messages]
-        image_inputs_list = []
-        for msg in batch_messages:
-            imgs, _ = process_vision_info(msg)
-            image_inputs_list.extend(imgs)
-
-        inputs = processor(
-            text=texts,
-            images=image_inputs_list,
-            padding=True,
-            return_tensors="pt"
-        ).to(model.device)
-
-        generated_ids = model.generate(**inputs, max_new_tokens=96)
-        
-        generated_ids_trimmed = [
-            out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-        ]
-        output_texts = processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)
-
-        # Save
-        for i, raw_text in enumerate(output_texts):
-            filename = batch_files[i]
-            final_caption = clean_and_force_trigger(raw_text, trigger)
-            
-            src_img = in_dir / filename
-            dst_img = out_dir / filename
-            dst_txt = out_dir / (os.path.splitext(filename)[0] + ".txt")
-            
-            io_executor.submit(shutil.copy2, src_img, dst_img)
-            
-            def write_txt(p, c):
-                with open(p, "w", encoding="utf-8") as f: f.write(c)
-            io_executor.submit(write_txt, dst_txt, final_caption)
-
-    io_executor.shutdown(wait=True)
+    # (filename, outputs, write futures) of captions not recorded yet
+    pending = []
+
+    def write_txt(p, c):
+        with open(p, "w", encoding="utf-8") as f: f.write(c)
+
+    def flush():
+        """Waits for the pending writes and records their keys; a failed write raises and stays unrecorded."""
+        while pending:
+            filename, outputs, futures = pending.pop(0)
+            for future in futures:
+                future.result()
+            manifest.record(filename, outputs)
+
+    with manifest:
+        try:
+            for done, (src_img, raw_text) in enumerate(tqdm(engine.run([in_dir / f for f in todo]), total=len(todo), desc="Batch Inference"), 1):
+                filename = src_img.name
+                final_caption = clean_and_force_trigger(raw_text, trigger)
+
+                dst_img = out_dir / filename
+                dst_txt = out_dir / (os.path.splitext(filename)[0] + ".txt")
+
+                pending.append((filename, [dst_img, dst_txt], [
+                    io_executor.submit(shutil.copy2, src_img, dst_img),
+                    io_executor.submit(write_txt, dst_txt, final_caption),
+                ]))
+
+                # Checkpoint so an interrupted run resumes where it stopped
+                if done % (BATCH_SIZE * SAVE_EVERY) == 0:
+                    flush()
+                    manifest.save()
+        finally:
+            # Only captions whose files are on disk go into the manifest
+            io_executor.shutdown(wait=True)
+            flush()
     print(f"✅ Success. Captions saved to: {out_dir}")
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 # core/06_publish.py
 import sys
 import os
+import errno
 import shutil
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
 # --- BOOTSTRAP ---
@@ -10,10 +12,63 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+from manifest import StepManifest
 
 # --- CONFIGURATION ---
 RESOLUTIONS = [256, 512, 1024]
 TEMPLATE_DIR = Path(current_dir) / "templates"
+PUBLISH_WORKERS = os.cpu_count() or 1
+FICLONE = 0x40049409  # linux/fs.h ioctl: share the source file's blocks (btrfs/xfs reflink)
+WIN_MOUNT_APP = Path("/mnt/c/AI/apps/musubi-tuner")  # Windows C: drive mount point
+
+def resize_image(job):
+    """
+    Process pool worker: decodes the source once and writes every target
+    resolution, largest first. job = (src_path, [(res, out_path), ...]).
+    """
+    src_path, targets = job
+    with Image.open(src_path) as img:
+        # JPEGs can be decoded at a reduced scale that still covers the largest target
+        largest = max(res for res, _ in targets)
+        img.draft("RGB", (largest, largest))
+        img = img.convert("RGB")
+        for res, out_path in sorted(targets, reverse=True):
+            # Replace rather than overwrite: deployed hard links keep the old file
+            if os.path.lexists(out_path):
+                os.unlink(out_path)
+            img.resize((res, res), Image.LANCZOS).save(out_path, quality=95)
+    return src_path
+
+def deploy_file(src, dst):
+    """
+    Places src at dst as a hard link, else a reflink, else a copy (e.g. across
+    the WSL/Windows filesystem boundary). dst is replaced, never written
+    through, so files linked from an earlier run are not modified in place.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+        return "link"
+    except OSError:
+        pass
+    try:
+        import fcntl
+        with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        shutil.copystat(src, dst)
+        return "reflink"
+    except (ImportError, OSError) as e:
+        if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM):
+            raise
+    shutil.copy2(src, dst)
+    return "copy"
+
+def write_text(path, text):
+    if os.path.lexists(path):
+        os.unlink(path)
+    with open(path, 'w', encoding='utf-8') as tf:
+        tf.write(text)
 
 def read_template(filename):
     """Reads a training script template file in full."""
@@ -38,6 +93,18 @@ num_repeats = 1
 resolution = [{resolution},{resolution}]
 '''
 
+def external_outputs(slug):
+    """
+    What this step writes outside the project: the Musubi resolution trees and
+    TOMLs, under the WSL app and the Windows mount. The orchestrator adds them
+    to the step signature so deleting them triggers a republish.
+    """
+    outputs = []
+    for app in (Path(utils.MUSUBI_PATHS['wsl_app']), WIN_MOUNT_APP):
+        outputs += [app / "files" / "datasets" / slug / str(res) for res in RESOLUTIONS]
+        outputs += [app / "files" / "tomls" / f"{slug}_{system}.toml" for system in ("win", "linux")]
+    return outputs
+
 def run(slug):
     """
     Step 06: Publish & Cache-Fix Deployment.
@@ -57,16 +124,12 @@ def run(slug):
 
     # Prepare the project-local publish root
     publish_root = path / utils.DIRS.get('publish', '06_publish')
-    if publish_root.exists():
-        shutil.rmtree(publish_root)
-    publish_root.mkdir(parents=True, exist_ok=True)
 
     # Musubi destination paths (both WSL and Windows mount)
     musubi_wsl_app = Path(utils.MUSUBI_PATHS['wsl_app'])
     musubi_dataset_root = musubi_wsl_app / "files" / "datasets" / slug
     
-    # Windows C: drive mount point
-    win_mount_app = Path("/mnt/c/AI/apps/musubi-tuner")
+    win_mount_app = WIN_MOUNT_APP
     win_dataset_root = win_mount_app / "files" / "datasets" / slug if win_mount_app.exists() else None
 
     # 1. Multi-Resolution Image Loop
@@ -75,8 +138,30 @@ def run(slug):
         print(f"❌ Error: No images found in source {src_dir}")
         return
 
+    fallback_cap = config.get('trigger', 'Scottington')
+    manifest = StepManifest(path, 'publish', params={
+        'resolutions': RESOLUTIONS,
+        'fallback_caption': fallback_cap,
+        'musubi': str(musubi_dataset_root),
+        'win': str(win_dataset_root),
+    })
+    if manifest.is_new and publish_root.exists():
+        shutil.rmtree(publish_root)
+    publish_root.mkdir(parents=True, exist_ok=True)
+
+    # Images and captions are tracked separately: a caption edit only redeploys the caption
+    captions = {os.path.splitext(f)[0] + ".txt": f for f in files}
+    sources = {f: [src_dir / f] for f in files}
+    sources.update({txt: [src_dir / txt] for txt in captions})
+    todo = manifest.plan(sources)
+    todo_images = [k for k in todo if k not in captions]
+    todo_captions = [k for k in todo if k in captions]
+    print(f"   -> {len(todo_images)} images and {len(todo_captions)} captions new/changed, "
+          f"{len(sources) - len(todo)} files up to date")
+
+    res_dirs = {}
     for res in RESOLUTIONS:
-        print(f"   -> Processing {res}px resolution and isolating cache subfolder...")
+        print(f"   -> Preparing {res}px resolution and isolating cache subfolder...")
         local_res_dir = publish_root / str(res)
         musubi_res_dir = musubi_dataset_root / str(res)
         musubi_cache_dir = musubi_dataset_root / f"{res}_cache"
@@ -86,40 +171,54 @@ def run(slug):
         musubi_cache_dir.mkdir(parents=True, exist_ok=True)
         
         # Also create Windows mount directories if accessible
+        win_res_dir = None
         if win_dataset_root:
             win_res_dir = win_dataset_root / str(res)
             win_cache_dir = win_dataset_root / f"{res}_cache"
             win_res_dir.mkdir(parents=True, exist_ok=True)
             win_cache_dir.mkdir(parents=True, exist_ok=True)
-        
-        for f in files:
-            # Sync Image: Resize and save to project then copy to Musubi locations
-            with Image.open(src_dir / f) as img:
-                img = img.convert("RGB")
-                img.resize((res, res), Image.LANCZOS).save(local_res_dir / f, quality=95)
-            
-            # Deploy to WSL location
-            shutil.copy2(local_res_dir / f, musubi_res_dir / f)
-            
-            # Deploy to Windows mount if accessible
-            if win_dataset_root:
-                shutil.copy2(local_res_dir / f, win_res_dir / f)
-            
-            # Caption Sync (Critical: Every image MUST have a .txt for batches to initialize)
-            txt = os.path.splitext(f)[0] + ".txt"
-            if (src_dir / txt).exists():
-                shutil.copy2(src_dir / txt, local_res_dir / txt)
-                shutil.copy2(src_dir / txt, musubi_res_dir / txt)
-                if win_dataset_root:
-                    shutil.copy2(src_dir / txt, win_res_dir / txt)
-            else:
-                # Force fallback caption if missing to avoid "No training items" error
-                fallback_cap = config.get('trigger', 'Scottington')
-                with open(musubi_res_dir / txt, 'w', encoding='utf-8') as tf:
-                    tf.write(fallback_cap)
-                if win_dataset_root:
-                    with open(win_res_dir / txt, 'w', encoding='utf-8') as tf:
-                        tf.write(fallback_cap)
+        res_dirs[res] = (local_res_dir, musubi_res_dir, win_res_dir)
+
+    deployed = {}
+    with manifest:
+        # Sync Images: one decode per image fanned out to every resolution, then deploy to Musubi locations
+        jobs = [(str(src_dir / f), [(res, str(res_dirs[res][0] / f)) for res in RESOLUTIONS]) for f in todo_images]
+        if jobs:
+            with ProcessPoolExecutor(max_workers=min(PUBLISH_WORKERS, len(jobs))) as pool:
+                for f, _ in zip(todo_images, pool.map(resize_image, jobs, chunksize=8)):
+                    outputs = []
+                    for res in RESOLUTIONS:
+                        local_res_dir, musubi_res_dir, win_res_dir = res_dirs[res]
+                        outputs.append(local_res_dir / f)
+                        for target_dir in (musubi_res_dir, win_res_dir):
+                            if target_dir:
+                                how = deploy_file(local_res_dir / f, target_dir / f)
+                                deployed[how] = deployed.get(how, 0) + 1
+                                outputs.append(target_dir / f)
+                    manifest.record(f, outputs)
+
+        # Caption Sync (Critical: Every image MUST have a .txt for batches to initialize)
+        for txt in todo_captions:
+            outputs = []
+            for res in RESOLUTIONS:
+                local_res_dir, musubi_res_dir, win_res_dir = res_dirs[res]
+                targets = [d for d in (musubi_res_dir, win_res_dir) if d]
+                if (src_dir / txt).exists():
+                    deploy_file(src_dir / txt, local_res_dir / txt)
+                    outputs.append(local_res_dir / txt)
+                    for target_dir in targets:
+                        deploy_file(local_res_dir / txt, target_dir / txt)
+                else:
+                    # Force fallback caption if missing to avoid "No training items" error
+                    for target_dir in targets:
+                        write_text(target_dir / txt, fallback_cap)
+                outputs += [target_dir / txt for target_dir in targets]
+            manifest.record(txt, outputs)
+
+    if deployed:
+        print(f"   -> Deployed images: " + ", ".join(f"{n} {how}" for how, n in sorted(deployed.items())))
+    if manifest.removed:
+        print(f"   -> Removed {manifest.removed} orphaned files")
 
     # 2. TOML Generation (Both Linux and Windows)
     # Windows paths with forward slashes for TOML compatibility
@@ -1,6 +1,9 @@
 import os
 import sys
+import json
 import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 
 # --- BOOTSTRAP ---
@@ -9,10 +12,133 @@ if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
 
+# --- COMPACT LAYOUT ---
+THUMB_W = 64
+THUMB_H = 84  # 64px image + 20px for text label
+PADDING = 4
+PAGE_COLS = 32
+PAGE_ROWS = 32  # 1024 thumbnails per contact sheet page
+NEAR_DUP_BITS = 6  # dHash Hamming distance that counts as a near-duplicate
+WORKERS = min(8, (os.cpu_count() or 1) + 2)
+
+def dhash(img):
+    """64-bit difference hash of a PIL image."""
+    px = list(img.convert("L").resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits
+
+def load_entry(in_dir, filename):
+    """
+    Thread pool worker: everything the report needs from one image, read once.
+    JPEGs are draft-decoded straight at thumbnail scale.
+    """
+    entry = {"file": filename, "thumb": None, "size": None, "hash": None, "caption": None, "error": None}
+    try:
+        with Image.open(in_dir / filename) as img:
+            entry["size"] = img.size
+            img.draft("RGB", (THUMB_W, THUMB_W))
+            thumb = img.convert("RGB").resize((THUMB_W, THUMB_W), Image.Resampling.LANCZOS)
+        entry["thumb"] = thumb
+        entry["hash"] = dhash(thumb)
+    except Exception as e:
+        entry["error"] = str(e)
+
+    txt_path = in_dir / (os.path.splitext(filename)[0] + ".txt")
+    if txt_path.exists():
+        with open(txt_path, 'r', encoding='utf-8') as cf:
+            entry["caption"] = cf.read().strip()
+    return entry
+
+def near_duplicate_clusters(hashes, max_bits=NEAR_DUP_BITS):
+    """
+    Groups files whose dHashes differ in at most max_bits bits. The 64 bits
+    are split into max_bits + 1 bands, so any such pair agrees exactly on at
+    least one band; pairs sharing a band bucket are verified and union-found.
+    """
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    bands = max_bits + 1
+    edges = [round(64 * b / bands) for b in range(bands + 1)]
+    for lo, hi in zip(edges, edges[1:]):
+        mask = (1 << (hi - lo)) - 1
+        buckets = {}
+        for i, h in enumerate(hashes):
+            buckets.setdefault((h >> lo) & mask, []).append(i)
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    i, j = members[a], members[b]
+                    if find(i) != find(j) and bin(hashes[i] ^ hashes[j]).count("1") <= max_bits:
+                        parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+class SheetWriter:
+    """Fills one page canvas at a time and saves it as soon as it is full."""
+    def __init__(self, out_dir, slug, count):
+        self.out_dir = out_dir
+        self.slug = slug
+        self.per_page = PAGE_COLS * PAGE_ROWS
+        self.pages = math.ceil(count / self.per_page)
+        self.count = count
+        self.page = None
+        self.saved = []
+        try:
+            self.font = ImageFont.load_default()
+        except Exception:
+            self.font = None
+
+    def _new_page(self, index):
+        remaining = min(self.per_page, self.count - index)
+        cols = min(PAGE_COLS, math.ceil(math.sqrt(remaining)))
+        rows = math.ceil(remaining / cols)
+        self.cols = cols
+        sheet_w = (cols * THUMB_W) + ((cols + 1) * PADDING)
+        sheet_h = (rows * THUMB_H) + ((rows + 1) * PADDING)
+        self.page = Image.new('RGB', (sheet_w, sheet_h), (30, 30, 30))
+        self.draw = ImageDraw.Draw(self.page)
+
+    def add(self, index, entry):
+        slot = index % self.per_page
+        if slot == 0:
+            self._new_page(index)
+        row, col = divmod(slot, self.cols)
+        x = PADDING + (col * (THUMB_W + PADDING))
+        y = PADDING + (row * (THUMB_H + PADDING))
+        if entry["thumb"] is not None:
+            self.page.paste(entry["thumb"], (x, y))
+        # Draw Filename (Truncated), e.g. "face_001..."
+        if self.font:
+            self.draw.text((x + 2, y + 66), entry["file"][:8], fill=(200, 200, 200), font=self.font)
+        if slot == self.per_page - 1 or index == self.count - 1:
+            self._save()
+
+    def _save(self):
+        if self.pages == 1:
+            save_path = self.out_dir / f"{self.slug}_compact_summary.jpg"
+        else:
+            save_path = self.out_dir / f"{self.slug}_compact_summary_p{len(self.saved) + 1:03d}.jpg"
+        self.page.save(save_path, quality=50, optimize=True)
+        self.saved.append(save_path)
+        self.page = None
+
 def run(slug):
     """
     Step 07: Dataset Visual Reporting
-    Generates a high-density 64x64 contact sheet and text summary.
+    Generates paginated 64x64 contact sheets, a text summary and dataset stats
+    in a single pass over the published images.
     """
     config = utils.load_config(slug)
     path = utils.get_project_path(slug)
@@ -35,77 +161,77 @@ def run(slug):
         print("⚠️  No images found to summarize.")
         return
 
-    # --- COMPACT LAYOUT LOGIC ---
-    THUMB_W = 64
-    THUMB_H = 84  # 64px image + 20px for text label
-    PADDING = 4
-    
-    # Calculate Grid
+    # Pages of an earlier, larger run would otherwise linger
+    for old_sheet in out_dir.glob(f"{slug}_compact_summary*.jpg"):
+        old_sheet.unlink()
+
     count = len(files)
-    cols = math.ceil(math.sqrt(count))
-    rows = math.ceil(count / cols)
-    
-    sheet_w = (cols * THUMB_W) + ((cols + 1) * PADDING)
-    sheet_h = (rows * THUMB_H) + ((rows + 1) * PADDING)
-    
-    # Create Canvas
-    sheet = Image.new('RGB', (sheet_w, sheet_h), (30, 30, 30))
-    draw = ImageDraw.Draw(sheet)
-    
-    # Load Font (Fallback if necessary)
-    try:
-        font = ImageFont.load_default()
-    except:
-        font = None
+    sheets = SheetWriter(out_dir, slug, count)
+    print(f"   Pages: {sheets.pages} | Total Images: {count}")
 
-    print(f"   Grid: {rows}x{cols} | Total Images: {count}")
+    resolutions = Counter()
+    caption_words = []
+    missing_captions = []
+    hashes, hashed_files = [], []
 
-    for i, f in enumerate(files):
-        row, col = divmod(i, cols)
-        
-        x = PADDING + (col * (THUMB_W + PADDING))
-        y = PADDING + (row * (THUMB_H + PADDING))
-        
-        try:
-            # Load and Resize
-            img = Image.open(in_dir / f).convert("RGB")
-            img = img.resize((THUMB_W, THUMB_W), Image.Resampling.LANCZOS)
-            
-            # Paste Image
-            sheet.paste(img, (x, y))
-            
-            # Draw Filename (Truncated)
-            # e.g. "face_001..."
-            label = f[:8]
-            if font:
-                draw.text((x + 2, y + 66), label, fill=(200, 200, 200), font=font)
-                
-        except Exception as e:
-            print(f"   Error processing thumbnail {f}: {e}")
-
-    # Save JPG (Compact Quality)
-    save_path = out_dir / f"{slug}_compact_summary.jpg"
-    sheet.save(save_path, quality=50, optimize=True)
-    
-    # Generate Text Summary (Full Audit Log)
+    # Text Summary (Full Audit Log) is written alongside the sheets
     txt_path = out_dir / f"{slug}_caption_summary.txt"
-    with open(txt_path, "w", encoding="utf-8") as f:
+    with open(txt_path, "w", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=WORKERS) as pool:
         f.write(f"--- DATASET REPORT: {config.get('name', slug)} ---\n")
         f.write(f"Trigger: {config.get('trigger', 'Unknown')}\n")
         f.write(f"Total Images: {count}\n")
         f.write("-" * 30 + "\n\n")
-        
-        for filename in files:
-            # Try to find matching text file
-            txt_name = os.path.splitext(filename)[0] + ".txt"
-            caption = "[No Caption Found]"
-            if (in_dir / txt_name).exists():
-                with open(in_dir / txt_name, 'r', encoding='utf-8') as cf:
-                    caption = cf.read().strip()
-            
-            f.write(f"IMAGE: {filename}\nCAPTION: {caption}\n\n")
-
-    print(f"✅ Summary Saved:\n   Visual: {save_path}\n   Text:   {txt_path}")
+
+        # Decode in chunks of one page so memory stays bounded by a page of thumbnails
+        for page_start in range(0, count, sheets.per_page):
+            chunk = files[page_start:page_start + sheets.per_page]
+            for i, entry in enumerate(pool.map(lambda name: load_entry(in_dir, name), chunk), page_start):
+                if entry["error"]:
+                    print(f"   Error processing thumbnail {entry['file']}: {entry['error']}")
+                sheets.add(i, entry)
+
+                if entry["size"]:
+                    resolutions[f"{entry['size'][0]}x{entry['size'][1]}"] += 1
+                if entry["hash"] is not None:
+                    hashes.append(entry["hash"])
+                    hashed_files.append(entry["file"])
+                if entry["caption"] is None:
+                    missing_captions.append(entry["file"])
+                else:
+                    caption_words.append(len(entry["caption"].split()))
+
+                caption = entry["caption"] if entry["caption"] is not None else "[No Caption Found]"
+                f.write(f"IMAGE: {entry['file']}\nCAPTION: {caption}\n\n")
+                entry["thumb"] = None
+
+    # Machine-readable stats
+    clusters = [[hashed_files[i] for i in group] for group in near_duplicate_clusters(hashes)]
+    caption_words.sort()
+    stats = {
+        "name": config.get('name', slug),
+        "trigger": config.get('trigger'),
+        "images": count,
+        "resolutions": dict(resolutions.most_common()),
+        "captions": {
+            "count": len(caption_words),
+            "missing": missing_captions,
+            "words": {
+                "min": caption_words[0] if caption_words else 0,
+                "median": caption_words[len(caption_words) // 2] if caption_words else 0,
+                "max": caption_words[-1] if caption_words else 0,
+                "mean": round(sum(caption_words) / len(caption_words), 2) if caption_words else 0,
+                "histogram": dict(sorted(Counter(10 * (n // 10) for n in caption_words).items())),
+            },
+        },
+        "near_duplicates": {"max_bits": NEAR_DUP_BITS, "clusters": clusters},
+    }
+    stats_path = out_dir / f"{slug}_dataset_stats.json"
+    with open(stats_path, "w", encoding="utf-8") as sf:
+        json.dump(stats, sf, indent=2)
+
+    print(f"✅ Summary Saved:\n   Visual: {', '.join(str(p) for p in sheets.saved)}\n   Text:   {txt_path}\n   Stats:  {stats_path}")
+    if clusters:
+        print(f"   ⚠️ {len(clusters)} near-duplicate groups ({sum(len(c) for c in clusters)} images)")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
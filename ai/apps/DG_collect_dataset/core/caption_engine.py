@@ -0,0 +1,190 @@
+# core/caption_engine.py
+"""
+Batch caption engine for 05_caption.
+
+- Images are batched by size: sorted by the number of vision tokens they
+  will produce (then aspect ratio), so the images of a batch pad to about
+  the same length.
+- A background thread prepares (decodes, templates, tokenizes) the next
+  batches while the current one generates on the GPU.
+- Backends are pluggable: QwenBackend runs Qwen2.5-VL, StandInBackend is a
+  CPU-only stand-in for tests and dry runs (DG_CAPTION_BACKEND=standin).
+
+Usage:
+    engine = CaptionEngine(QwenBackend(path, prompt), batch_size=4)
+    for image_path, text in engine.run(paths):
+        ...
+"""
+import os
+import queue
+import threading
+from PIL import Image
+
+PREFETCH_BATCHES = 2
+PATCH_PIXELS = 28 * 28  # Qwen2.5-VL: one vision token per 28x28 patch after merging
+
+
+def image_size(path):
+    """(width, height) from the image header, without decoding pixels."""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except OSError:
+        return (0, 0)
+
+
+def vision_tokens(size, max_pixels):
+    w, h = size
+    pixels = w * h
+    if pixels > max_pixels:
+        pixels = max_pixels
+    return pixels // PATCH_PIXELS
+
+
+def size_sorted_batches(paths, batch_size, max_pixels):
+    """Splits paths into batches of similar token count and aspect ratio."""
+    def key(path):
+        w, h = image_size(path)
+        return (vision_tokens((w, h), max_pixels), round(w / h, 2) if h else 0, str(path))
+    ordered = sorted(paths, key=key)
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
+class QwenBackend:
+    """
+    Qwen2.5-VL captioning (4-bit). prepare() is CPU work run ahead on the prefetch thread.
+
+    The fast tokenizer inside the processor can't be used from two threads at
+    once ("Already borrowed"), so tokenizing in prepare() and decoding in
+    generate() hold processor_lock; image loading and generation don't.
+    """
+    def __init__(self, model_path, prompt, max_pixels=768 * 768, max_new_tokens=96):
+        import torch
+        from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor, BitsAndBytesConfig
+
+        bnb_config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_compute_dtype=torch.float16,
+            bnb_4bit_quant_type="nf4"
+        )
+        self.model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
+            model_path, quantization_config=bnb_config, device_map="auto"
+        )
+        self.processor = AutoProcessor.from_pretrained(model_path)
+        self.processor_lock = threading.Lock()
+        self.prompt = prompt
+        self.max_pixels = max_pixels
+        self.max_new_tokens = max_new_tokens
+
+    def prepare(self, paths):
+        from qwen_vl_utils import process_vision_info
+
+        batch_messages = []
+        for img_path in paths:
+            batch_messages.append([{
+                "role": "user",
+                "content": [
+                    {"type": "image", "image": str(img_path), "max_pixels": self.max_pixels},
+                    {"type": "text", "text": self.prompt}
+                ]
+            }])
+
+        image_inputs_list = []
+        for msg in batch_messages:
+            imgs, _ = process_vision_info(msg)
+            image_inputs_list.extend(imgs)
+
+        with self.processor_lock:
+            texts = [self.processor.apply_chat_template(msg, tokenize=False, add_generation_prompt=True) for msg in batch_messages]
+            return self.processor(
+                text=texts,
+                images=image_inputs_list,
+                padding=True,
+                return_tensors="pt"
+            )
+
+    def generate(self, inputs):
+        inputs = inputs.to(self.model.device)
+        generated_ids = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+        generated_ids_trimmed = [
+            out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
+        ]
+        with self.processor_lock:
+            return self.processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)
+
+
+class StandInBackend:
+    """Deterministic CPU backend: 'captions' each image with its size and mean color."""
+    max_pixels = 768 * 768
+
+    def __init__(self, prompt=""):
+        self.prompt = prompt
+
+    def prepare(self, paths):
+        prepared = []
+        for path in paths:
+            with Image.open(path) as img:
+                img = img.convert("RGB")
+                img.thumbnail((64, 64))
+                pixels = list(img.getdata())
+            mean = tuple(sum(c) // len(pixels) for c in zip(*pixels))
+            prepared.append((image_size(path), mean))
+        return prepared
+
+    def generate(self, prepared):
+        return [f"a {w}x{h} image, mean color {mean}" for (w, h), mean in prepared]
+
+
+def get_backend(model_path, prompt, name=None):
+    name = name or os.environ.get("DG_CAPTION_BACKEND", "qwen")
+    if name == "standin":
+        return StandInBackend(prompt)
+    return QwenBackend(model_path, prompt)
+
+
+class CaptionEngine:
+    def __init__(self, backend, batch_size=4, prefetch=PREFETCH_BATCHES):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+
+    def batches(self, paths):
+        return size_sorted_batches(paths, self.batch_size, getattr(self.backend, "max_pixels", 768 * 768))
+
+    def run(self, paths):
+        """Yields (path, raw caption) per image; batches are prepared on a background thread."""
+        batches = self.batches(paths)
+        ready = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def producer():
+            try:
+                for batch in batches:
+                    if stop.is_set():
+                        return
+                    ready.put((batch, self.backend.prepare(batch), None))
+            except Exception as e:
+                ready.put((None, None, e))
+                return
+            ready.put(None)
+
+        thread = threading.Thread(target=producer, name="caption_prefetch", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    break
+                batch, prepared, error = item
+                if error is not None:
+                    raise error
+                for path, text in zip(batch, self.backend.generate(prepared)):
+                    yield path, text
+        finally:
+            # Unblock the producer if the consumer stops early
+            stop.set()
+            while thread.is_alive():
+                try:
+                    ready.get(timeout=0.1)
+                except queue.Empty:
+                    pass
@@ -0,0 +1,225 @@
+# core/downloader.py
+"""
+Concurrent, deduplicating image downloader for the scrape step.
+
+- One pooled requests.Session shared by a bounded thread pool.
+- Per-host limits: at most PER_HOST_CONNECTIONS requests in flight and
+  HOST_INTERVAL seconds between request starts to the same host.
+- Bodies are streamed to a .part file while being hashed; an image whose
+  sha1 matches one already in the folder is dropped instead of saved.
+- Every URL's outcome is kept in a JSON manifest, so a rerun retries failures
+  and URLs that were collected but never fetched, and skips the rest.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+MAX_WORKERS = 8
+PER_HOST_CONNECTIONS = 2
+HOST_INTERVAL = 0.25
+MAX_ATTEMPTS = 2
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = "Mozilla/5.0"
+
+
+def url_extension(url):
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    return ext if ext in ALLOWED_EXTENSIONS else ".jpg"
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class HostLimiter:
+    """Caps concurrent requests per host and spaces out their start times."""
+    def __init__(self, connections=PER_HOST_CONNECTIONS, interval=HOST_INTERVAL):
+        self.connections = connections
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.next_start = {}
+
+    def acquire(self, host):
+        with self.lock:
+            slot = self.slots.setdefault(host, threading.Semaphore(self.connections))
+        slot.acquire()
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        self.slots[host].release()
+
+
+class ImageDownloader:
+    """
+    Downloads images into save_dir as {prefix}_{idx:04d}{ext}.
+
+    Usage:
+        downloader = ImageDownloader(scrape_dir, slug, manifest_path)
+        saved = downloader.download(urls, limit)
+    """
+    def __init__(self, save_dir, prefix, manifest_path, max_workers=MAX_WORKERS,
+                 timeout=5, limiter=None):
+        self.save_dir = save_dir
+        self.prefix = prefix
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.limiter = limiter or HostLimiter()
+        self.lock = threading.RLock()
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.urls = {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    self.urls = json.load(f)
+            except (OSError, ValueError):
+                self.urls = {}
+
+        # Content hashes of everything already on disk
+        self.hashes = {}
+        self.next_idx = 1
+        for name in sorted(os.listdir(save_dir)):
+            if os.path.splitext(name)[1].lower() in ALLOWED_EXTENSIONS:
+                self.hashes[file_sha1(os.path.join(save_dir, name))] = name
+                self._bump_index(name)
+
+    def _bump_index(self, name):
+        stem = os.path.splitext(name)[0]
+        if stem.startswith(self.prefix + "_") and stem[len(self.prefix) + 1:].isdigit():
+            self.next_idx = max(self.next_idx, int(stem[len(self.prefix) + 1:]) + 1)
+
+    def close(self):
+        self.session.close()
+
+    def known_urls(self):
+        """URLs that need no further work (saved, duplicate or out of retries)."""
+        return {u for u, e in self.urls.items()
+                if e['status'] in ('saved', 'duplicate') or e.get('attempts', 0) >= MAX_ATTEMPTS}
+
+    def pending_urls(self):
+        """URLs collected earlier that were never fetched or can still be retried."""
+        known = self.known_urls()
+        return [u for u in self.urls if u not in known]
+
+    def save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with self.lock:
+            data = json.dumps(self.urls, indent=1)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, self.manifest_path)
+
+    def add_urls(self, urls):
+        """Records collected URLs as pending so an interrupted run can resume them."""
+        with self.lock:
+            for url in urls:
+                self.urls.setdefault(url, {'status': 'pending', 'attempts': 0})
+        self.save_manifest()
+
+    def download(self, urls, limit):
+        """Fetches urls until limit new images are saved. Returns the number saved."""
+        self.add_urls(urls)
+        known = self.known_urls()
+        todo = [u for u in dict.fromkeys(urls) if u not in known]
+        self.saved = 0
+        self.limit = limit
+        if not todo or limit <= 0:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._fetch, url) for url in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                url, status, name = future.result()
+                if done % 20 == 0:
+                    self.save_manifest()
+                if status == 'saved':
+                    print(f"    Downloaded: {name} [{self.saved}/{limit}]", end='\r')
+                if self.saved >= limit:
+                    for f in futures:
+                        f.cancel()
+        self.save_manifest()
+        return self.saved
+
+    def _fetch(self, url):
+        with self.lock:
+            if self.saved >= self.limit:
+                return url, 'skipped', None
+            entry = self.urls[url]
+            entry['attempts'] = entry.get('attempts', 0) + 1
+
+        host = urlparse(url).netloc
+        part = os.path.join(self.save_dir, f".{hashlib.sha1(url.encode()).hexdigest()}.part")
+        self.limiter.acquire(host)
+        try:
+            h = hashlib.sha1()
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    return self._finish(url, 'failed', error=f"HTTP {response.status_code}")
+                size = 0
+                with open(part, 'wb') as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        h.update(chunk)
+                        size += len(chunk)
+            if size == 0:
+                return self._finish(url, 'failed', error="empty response", part=part)
+        except (requests.RequestException, OSError) as e:
+            return self._finish(url, 'failed', error=str(e), part=part)
+        finally:
+            self.limiter.release(host)
+
+        digest = h.hexdigest()
+        with self.lock:
+            if digest in self.hashes:
+                result = self._finish(url, 'duplicate', name=self.hashes[digest], digest=digest, part=part)
+            elif self.saved >= self.limit:
+                # Over the limit: leave it pending for a later run
+                self.urls[url] = {'status': 'pending', 'attempts': self.urls[url]['attempts'] - 1}
+                result = (url, 'skipped', None)
+                os.remove(part)
+            else:
+                name = f"{self.prefix}_{self.next_idx:04d}{url_extension(url)}"
+                self.next_idx += 1
+                os.replace(part, os.path.join(self.save_dir, name))
+                self.hashes[digest] = name
+                self.saved += 1
+                result = self._finish(url, 'saved', name=name, digest=digest)
+        return result
+
+    def _finish(self, url, status, name=None, digest=None, error=None, part=None):
+        if part and os.path.exists(part):
+            os.remove(part)
+        with self.lock:
+            entry = self.urls[url]
+            entry['status'] = status
+            for key, value in (('file', name), ('sha1', digest), ('error', error)):
+                if value is not None:
+                    entry[key] = value
+                else:
+                    entry.pop(key, None)
+        return url, status, name
@@ -0,0 +1,182 @@
+# core/manifest.py
+"""
+Incremental step manifests.
+
+Every step keeps a manifest at <project>/.manifests/<step>.json. For each
+input key (usually the source file name) it records a digest of the files the
+key was built from plus the output files it produced. A rerun then only
+processes keys whose inputs changed or whose outputs went missing, and deletes
+the outputs of keys whose inputs are gone (orphans).
+
+File digests are cached by (size, mtime) so unchanged files are not reread.
+
+Usage:
+    with StepManifest(path, "crop", params={...}) as manifest:
+        todo = manifest.plan({f: [in_dir / f] for f in files})
+        for f in todo:
+            ...
+            manifest.record(f, [out_dir / f])
+"""
+import os
+import json
+import hashlib
+from pathlib import Path
+
+MANIFEST_DIR = ".manifests"
+
+
+def _sha1(data):
+    return hashlib.sha1(data.encode() if isinstance(data, str) else data).hexdigest()
+
+
+class StepManifest:
+    def __init__(self, project_path, step, params=None):
+        self.root = Path(project_path)
+        self.path = self.root / MANIFEST_DIR / f"{step}.json"
+        # Changing a step's parameters (trigger, thresholds, ...) rebuilds all of its outputs
+        self.params = _sha1(json.dumps(params or {}, sort_keys=True, default=str))
+
+        data = {}
+        # A step without a manifest can't tell its outputs from stale files yet
+        self.is_new = not self.path.exists()
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        self.entries = data.get('entries', {})
+        self._stat_cache = data.get('files', {})
+        self._used_stats = {}
+        self._digests = {}
+        self.removed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Saved even when the step fails, so finished keys are not redone
+        self.save()
+
+    # --- DIGESTS ---
+
+    def _rel(self, path):
+        path = Path(path)
+        try:
+            return str(path.resolve().relative_to(self.root.resolve()))
+        except ValueError:
+            return str(path.resolve())
+
+    def _abs(self, rel):
+        return self.root / rel if not os.path.isabs(rel) else Path(rel)
+
+    def file_digest(self, path):
+        """sha1 of a file's bytes, reused while its size and mtime are unchanged. None if missing."""
+        key = self._rel(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        cached = self._stat_cache.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            digest = cached[2]
+        else:
+            h = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+        self._used_stats[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def inputs_digest(self, inputs):
+        parts = [self.params] + [f"{self._rel(p)}:{self.file_digest(p) or '-'}" for p in inputs]
+        return _sha1("\n".join(parts))
+
+    # --- PLANNING ---
+
+    def plan(self, inputs_by_key):
+        """
+        Takes {key: [input paths]} for every key the step should produce and
+        returns the keys that need (re)processing, in the given order. Outputs
+        of keys that are no longer present are deleted.
+        """
+        for key in [k for k in self.entries if k not in inputs_by_key]:
+            self.discard(key)
+
+        todo = []
+        for key, inputs in inputs_by_key.items():
+            digest = self.inputs_digest(inputs)
+            self._digests[key] = digest
+            entry = self.entries.get(key)
+            if (entry is None or entry['digest'] != digest
+                    or not all(self._abs(o).exists() for o in entry['outputs'])):
+                todo.append(key)
+        return todo
+
+    def record(self, key, outputs):
+        """Stores the outputs a key produced; outputs of its previous run that were not rewritten are deleted."""
+        digest = self._digests.get(key)
+        if digest is None:
+            raise KeyError(f"record() for '{key}' without plan()")
+        outputs = [self._rel(o) for o in outputs]
+        old = self.entries.get(key)
+        self.entries[key] = {'digest': digest, 'outputs': outputs}
+        if old:
+            for rel in set(old['outputs']) - set(outputs):
+                self._remove(rel)
+
+    def discard(self, key):
+        """Deletes a key's outputs and forgets it."""
+        entry = self.entries.pop(key, None)
+        if entry:
+            for rel in entry['outputs']:
+                self._remove(rel)
+
+    def outputs(self):
+        """Every output currently recorded, as paths."""
+        return [self._abs(o) for e in self.entries.values() for o in e['outputs']]
+
+    def _remove(self, rel):
+        # Keys may share an output (e.g. 04_clean's body_ copies)
+        if any(rel in e['outputs'] for e in self.entries.values()):
+            return
+        p = self._abs(rel)
+        if p.exists():
+            p.unlink()
+            self.removed += 1
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries, 'files': self._used_stats}, f)
+        os.replace(tmp, self.path)
+
+
+def dir_signature(dirs, extra=None):
+    """
+    Cheap fingerprint of directory trees and files (names, sizes and mtimes,
+    no reads), used by the orchestrator to skip steps whose inputs did not
+    change.
+    """
+    h = hashlib.sha1(json.dumps(extra or {}, sort_keys=True, default=str).encode())
+    for d in dirs:
+        d = Path(d)
+        h.update(f"#{d}\n".encode())
+        if d.is_file():
+            st = d.stat()
+            h.update(f"{st.st_size}:{st.st_mtime_ns}\n".encode())
+            continue
+        if not d.exists():
+            continue
+        for dirpath, dirnames, filenames in os.walk(d):
+            dirnames.sort()
+            for name in sorted(filenames):
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, name), d)
+                h.update(f"{rel}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
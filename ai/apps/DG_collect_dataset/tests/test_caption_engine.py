@@ -0,0 +1,202 @@
+import importlib
+import json
+import threading
+
+import pytest
+from PIL import Image
+
+import utils
+from caption_engine import CaptionEngine, StandInBackend, size_sorted_batches
+from manifest import StepManifest
+
+
+def write_image(path, size, color=(0, 0, 0)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, color).save(path)
+    return path
+
+
+@pytest.fixture
+def images(tmp_path):
+    sizes = [(512, 512), (32, 32), (512, 128), (32, 32), (512, 512), (128, 512), (32, 32), (512, 128)]
+    return [write_image(tmp_path / "in" / f"{i}.png", size, (i * 10, 0, 0)) for i, size in enumerate(sizes)]
+
+
+class RecordingBackend(StandInBackend):
+    """Stand-in that logs its prepare/generate calls and can fail one of them."""
+    def __init__(self, fail_prepare=None, fail_generate=None):
+        super().__init__()
+        self.events = []
+        self.paths = []
+        self.lock = threading.Lock()
+        self.fail_prepare = fail_prepare
+        self.fail_generate = fail_generate
+
+    def prepare(self, paths):
+        with self.lock:
+            index = sum(1 for e in self.events if e[0] == "prepare")
+            self.events.append(("prepare", index))
+            self.paths.extend(p.name for p in paths)
+        if index == self.fail_prepare:
+            raise RuntimeError("prepare failed")
+        return index, super().prepare(paths)
+
+    def generate(self, prepared):
+        index, prepared = prepared
+        with self.lock:
+            self.events.append(("generate", index))
+        if index == self.fail_generate:
+            raise RuntimeError("generate failed")
+        return super().generate(prepared)
+
+
+def test_batches_are_size_sorted(images):
+    batches = size_sorted_batches(images, 2, 768 * 768)
+    sizes = [{Image.open(p).size for p in batch} for batch in batches]
+    assert sizes == [{(32, 32)}, {(32, 32), (128, 512)}, {(512, 128)}, {(512, 512)}]
+
+    engine = CaptionEngine(StandInBackend(), batch_size=2)
+    results = list(engine.run(images))
+    assert [path for path, _ in results] == [p for batch in batches for p in batch]
+    for path, text in results:
+        w, h = Image.open(path).size
+        assert text.startswith(f"a {w}x{h} image")
+
+
+def test_batches_are_prepared_ahead(images):
+    backend = RecordingBackend()
+    prepared_next = threading.Event()
+    prepare = backend.prepare
+
+    def prepare_and_signal(paths):
+        result = prepare(paths)
+        if result[0] == 1:
+            prepared_next.set()
+        return result
+
+    backend.prepare = prepare_and_signal
+    generate = backend.generate
+    ahead = []
+
+    def generate_after_prefetch(prepared):
+        if prepared[0] == 0:
+            # Batch 1 is prepared while batch 0 generates
+            ahead.append(prepared_next.wait(timeout=5))
+        with backend.lock:
+            started = sum(1 for e in backend.events if e[0] == "prepare")
+        # At most this batch, the queued one (prefetch=1) and one waiting to be queued
+        ahead.append(started - prepared[0] <= 3)
+        return generate(prepared)
+
+    backend.generate = generate_after_prefetch
+    results = list(CaptionEngine(backend, batch_size=2, prefetch=1).run(images))
+    assert len(results) == len(images)
+    assert all(ahead)
+    assert [e for e in backend.events if e[0] == "generate"] == [("generate", i) for i in range(4)]
+
+
+def test_backend_errors_propagate(images):
+    backend = RecordingBackend(fail_prepare=2)
+    results = []
+    with pytest.raises(RuntimeError, match="prepare failed"):
+        for item in CaptionEngine(backend, batch_size=2).run(images):
+            results.append(item)
+    assert len(results) == 4
+
+    with pytest.raises(RuntimeError, match="generate failed"):
+        list(CaptionEngine(RecordingBackend(fail_generate=0), batch_size=2).run(images))
+
+
+def test_unreadable_image_propagates(images, tmp_path):
+    broken = tmp_path / "in" / "broken.png"
+    broken.write_bytes(b"not a png")
+    with pytest.raises(OSError):
+        list(CaptionEngine(StandInBackend(), batch_size=2).run(images + [broken]))
+
+
+def test_stopping_early_ends_the_prefetch_thread(images):
+    before = {t for t in threading.enumerate() if t.name == "caption_prefetch"}
+    run = CaptionEngine(StandInBackend(), batch_size=1, prefetch=1).run(images)
+    next(run)
+    run.close()
+    assert {t for t in threading.enumerate() if t.name == "caption_prefetch"} == before
+
+
+# --- 05_caption ---
+
+@pytest.fixture
+def project(tmp_path, monkeypatch, images):
+    monkeypatch.setenv("DG_CAPTION_BACKEND", "standin")
+    monkeypatch.setattr(utils, "LINUX_PROJECTS_ROOT", tmp_path / "projects")
+    path = utils.get_project_path("someone")
+    clean = path / utils.DIRS["clean"]
+    clean.mkdir(parents=True)
+    for image in images:
+        image.rename(clean / image.name)
+    (path / "project_config.json").write_text(json.dumps({"name": "Someone", "trigger": "s0m3"}))
+
+    step = importlib.import_module("05_caption")
+    backend = RecordingBackend()
+    monkeypatch.setattr(step, "get_backend", lambda *args: backend)
+    monkeypatch.setattr(step, "BATCH_SIZE", 2)
+    return step, path, backend
+
+
+def recorded(path):
+    with open(path / ".manifests" / "caption.json", encoding="utf-8") as f:
+        return json.load(f)["entries"]
+
+
+def test_captions_resume_from_the_manifest(project):
+    step, path, backend = project
+    backend.fail_generate = 2
+    with pytest.raises(RuntimeError, match="generate failed"):
+        step.run("someone")
+    first = set(recorded(path))
+    assert len(first) == 4
+    for key in first:
+        assert (path / utils.DIRS["caption"] / key).exists()
+        assert (path / utils.DIRS["caption"] / key.replace(".png", ".txt")).read_text().startswith("s0m3, a ")
+
+    backend.events.clear()
+    backend.paths.clear()
+    backend.fail_generate = None
+    step.run("someone")
+    assert len(recorded(path)) == 8
+    assert set(backend.paths) == set(recorded(path)) - first
+
+    backend.paths.clear()
+    step.run("someone")
+    assert backend.paths == []
+
+
+def test_checkpoints_wait_for_caption_writes(project, monkeypatch):
+    step, path, _ = project
+    monkeypatch.setattr(step, "SAVE_EVERY", 1)
+    saves = []
+    original = StepManifest.save
+
+    def checked_save(manifest):
+        for output in manifest.outputs():
+            assert output.exists(), f"{output} recorded before it was written"
+        saves.append(len(manifest.entries))
+        original(manifest)
+
+    monkeypatch.setattr(StepManifest, "save", checked_save)
+    step.run("someone")
+    assert saves[:4] == [2, 4, 6, 8]
+
+
+def test_failed_writes_are_not_recorded(project, monkeypatch):
+    step, path, _ = project
+    copy2 = step.shutil.copy2
+
+    def failing_copy(src, dst):
+        if src.name == "3.png":
+            raise OSError("disk full")
+        return copy2(src, dst)
+
+    monkeypatch.setattr(step.shutil, "copy2", failing_copy)
+    with pytest.raises(OSError, match="disk full"):
+        step.run("someone")
+    assert "3.png" not in recorded(path)
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+import pytest
+
+from consensus import THRESHOLD, identity_consensus, synthetic_embeddings
+
+METHODS = ["trimmed", "medoid"]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_outliers_are_rejected(method):
+    X, is_subject = synthetic_embeddings(300, subject=0.6, other=0.0)
+    result = identity_consensus(X, method=method)
+    assert np.array_equal(result.keep, is_subject)
+    assert result.support == pytest.approx(0.6)
+    assert result.scores[~is_subject].max() < THRESHOLD < result.scores[is_subject].min()
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_second_identity_is_rejected(method):
+    X, is_subject = synthetic_embeddings(300, subject=0.4, other=0.35)
+    result = identity_consensus(X, method=method)
+    assert np.array_equal(result.keep, is_subject)
+    # The plain mean sits between the two identities and keeps both
+    assert identity_consensus(X, method="mean").keep[~is_subject].sum() > 0
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_dominant_identity_wins(method):
+    # The second identity has more images than the first
+    X, is_first = synthetic_embeddings(300, subject=0.35, other=0.4)
+    result = identity_consensus(X, method=method)
+    assert not result.keep[is_first].any()
+    assert result.keep.sum() == 120
+    assert result.support == pytest.approx(0.4)
+
+
+@pytest.mark.parametrize("method", METHODS + ["mean"])
+def test_empty_and_single(method):
+    result = identity_consensus(np.zeros((0, 512), dtype=np.float32), method=method)
+    assert result.keep.shape == (0,)
+    assert result.support == 0.0
+
+    X, _ = synthetic_embeddings(1)
+    result = identity_consensus(X, method=method)
+    assert result.keep.tolist() == [True]
+    assert result.scores[0] == pytest.approx(1.0)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n", [1000, 10000, 50000])
+def test_consensus_benchmark(n):
+    X, is_subject = synthetic_embeddings(n)
+    timings = []
+    for method in ["mean"] + METHODS:
+        start = time.perf_counter()
+        result = identity_consensus(X, method=method)
+        elapsed = time.perf_counter() - start
+        timings.append(f"{method} {elapsed * 1000:.1f} ms (accuracy {np.mean(result.keep == is_subject):.3f})")
+    print(f"\n{n} embeddings: " + ", ".join(timings))  # noqa: T201
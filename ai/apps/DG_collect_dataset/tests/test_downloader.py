@@ -0,0 +1,131 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import MAX_ATTEMPTS, HostLimiter, ImageDownloader, file_sha1
+
+BODIES = {
+    "/a.png": b"image a" * 100,
+    "/copy_of_a.png": b"image a" * 100,
+    "/b.webp": b"image b" * 100,
+    "/c": b"image c" * 100,
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        body = BODIES.get(self.path)
+        # /flaky fails on the first request only
+        if self.path == "/flaky.png":
+            body = b"flaky" * 100 if self.server.requests[self.path] > 1 else None
+        if body is None:
+            self.send_error(503 if self.path == "/flaky.png" else 404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.requests = Counter()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def downloader(tmp_path, max_workers=4):
+    return ImageDownloader(str(tmp_path / "scrape"), "slug", str(tmp_path / "meta" / "urls.json"),
+                           max_workers=max_workers, limiter=HostLimiter(interval=0))
+
+
+@pytest.fixture
+def scrape(tmp_path):
+    (tmp_path / "scrape").mkdir()
+    return tmp_path
+
+
+def test_duplicates_are_dropped(server, scrape):
+    urls = [url(server, p) for p in ("/a.png", "/copy_of_a.png", "/b.webp", "/c")]
+    d = downloader(scrape)
+    assert d.download(urls, limit=10) == 3
+    d.close()
+
+    files = sorted((scrape / "scrape").iterdir())
+    assert sorted(p.stem for p in files) == ["slug_0001", "slug_0002", "slug_0003"]
+    assert sorted(p.suffix for p in files) == [".jpg", ".png", ".webp"]
+    assert {file_sha1(str(p)) for p in files} == {
+        hashlib.sha1(BODIES[path]).hexdigest() for path in ("/a.png", "/b.webp", "/c")}
+
+    statuses = Counter(entry["status"] for entry in d.urls.values())
+    assert statuses == {"saved": 3, "duplicate": 1}
+    # Files already in the folder count too
+    d = downloader(scrape)
+    assert d.next_idx == 4
+    assert d.download([url(server, "/c")] * 2, limit=10) == 0
+
+
+def test_manifest_skips_finished_urls(server, scrape):
+    urls = [url(server, p) for p in ("/a.png", "/copy_of_a.png", "/b.webp")]
+    d = downloader(scrape)
+    d.download(urls, limit=10)
+    d.close()
+    with open(scrape / "meta" / "urls.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert set(manifest) == set(urls)
+    assert manifest[urls[0]]["sha1"] == manifest[urls[1]]["sha1"]
+
+    requests_before = sum(server.requests.values())
+    d = downloader(scrape)
+    assert d.download(urls, limit=10) == 0
+    assert d.pending_urls() == []
+    assert sum(server.requests.values()) == requests_before
+
+
+def test_limit_leaves_urls_pending(server, scrape):
+    urls = [url(server, p) for p in ("/a.png", "/b.webp", "/c")]
+    d = downloader(scrape, max_workers=1)
+    assert d.download(urls, limit=1) == 1
+    d.close()
+
+    d = downloader(scrape)
+    assert len(d.pending_urls()) == 2
+    assert d.download(d.pending_urls(), limit=10) == 2
+
+
+def test_failures_are_retried_on_rerun(server, scrape):
+    flaky, missing = url(server, "/flaky.png"), url(server, "/missing.png")
+    d = downloader(scrape)
+    assert d.download([flaky, missing], limit=10) == 0
+    assert d.urls[flaky] == {"status": "failed", "attempts": 1, "error": "HTTP 503"}
+    d.close()
+
+    d = downloader(scrape)
+    assert sorted(d.pending_urls()) == sorted([flaky, missing])
+    assert d.download(d.pending_urls(), limit=10) == 1
+    assert d.urls[flaky]["status"] == "saved"
+    assert d.urls[missing] == {"status": "failed", "attempts": MAX_ATTEMPTS, "error": "HTTP 404"}
+    d.close()
+
+    # Out of attempts: not requested again
+    d = downloader(scrape)
+    assert d.pending_urls() == []
+    assert d.download([missing], limit=10) == 0
+    assert server.requests["/missing.png"] == MAX_ATTEMPTS
+    assert server.requests["/flaky.png"] == 2
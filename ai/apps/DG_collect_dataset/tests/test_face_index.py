@@ -0,0 +1,64 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+import face_index
+from face_index import FaceIndex, StandInDetector
+
+
+def write_image(path, seed, size=(96, 128)):
+    img = np.random.default_rng(seed).integers(0, 256, (*size, 3), dtype=np.uint8)
+    cv2.imwrite(str(path), img)
+    return img
+
+
+def test_analysis_is_cached_across_runs(tmp_path):
+    image = tmp_path / "a.png"
+    write_image(image, 0)
+    with FaceIndex(tmp_path, StandInDetector()) as index:
+        img, faces = index.analyze(image)
+        assert img is not None and len(faces) == 1
+        _, again = index.analyze(image)
+        assert (index.hits, index.misses) == (1, 1)
+    with FaceIndex(tmp_path, StandInDetector()) as index:
+        img, cached = index.analyze(image)
+        assert img is None
+        assert (index.hits, index.misses) == (1, 0)
+        np.testing.assert_allclose(cached[0].normed_embedding, faces[0].normed_embedding)
+
+
+def test_crops_use_the_source_analysis(tmp_path, monkeypatch):
+    source = tmp_path / "source.png"
+    img = write_image(source, 1)
+    hashed = []
+    original = face_index.file_hash
+    monkeypatch.setattr(face_index, "file_hash", lambda path: hashed.append(str(path)) or original(path))
+    with FaceIndex(tmp_path, StandInDetector()) as index:
+        _, faces = index.analyze(source)
+        for i, (y1, y2, x1, x2) in enumerate([(8, 88, 16, 112), (0, 96, 10, 120)]):
+            crop = tmp_path / f"crop_{i}.png"
+            cv2.imwrite(str(crop), img[y1:y2, x1:x2])
+            index.register_crop(source, crop, y1, y2, x1, x2)
+            _, crop_faces = index.analyze(crop)
+            np.testing.assert_allclose(crop_faces[0].bbox, faces[0].bbox - [x1, y1, x1, y1])
+        assert index.misses == 1
+    # The source is hashed once, each crop once
+    assert hashed.count(str(source)) == 1
+    assert len(hashed) == 3
+
+
+def test_writes_are_committed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(face_index, "COMMIT_EVERY", 2)
+    index = FaceIndex(tmp_path, StandInDetector())
+    for i in range(5):
+        write_image(tmp_path / f"{i}.png", i)
+        index.analyze(tmp_path / f"{i}.png")
+    # What another connection sees if this process dies now
+    with sqlite3.connect(index.path) as db:
+        assert db.execute("SELECT COUNT(*) FROM faces").fetchone()[0] == 4
+    index.close()
+    with sqlite3.connect(index.path) as db:
+        assert db.execute("SELECT COUNT(*) FROM faces").fetchone()[0] == 5
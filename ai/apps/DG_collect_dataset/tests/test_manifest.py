@@ -0,0 +1,106 @@
+import importlib
+import os
+import shutil
+
+import pytest
+
+import utils
+from manifest import StepManifest, dir_signature
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def run_step(project, inputs, params=None):
+    """A toy step: copies each input to out/ and returns the keys it (re)processed."""
+    with StepManifest(project, "copy", params=params) as manifest:
+        todo = manifest.plan({p.name: [p] for p in inputs})
+        for key in todo:
+            out = write(project / "out" / key, (project / "in" / key).read_text())
+            manifest.record(key, [out])
+    return todo
+
+
+def test_unchanged_inputs_are_skipped(tmp_path):
+    inputs = [write(tmp_path / "in" / name, name) for name in ("a.txt", "b.txt")]
+    assert run_step(tmp_path, inputs) == ["a.txt", "b.txt"]
+    assert run_step(tmp_path, inputs) == []
+
+
+def test_changes_invalidate_keys(tmp_path):
+    inputs = [write(tmp_path / "in" / name, name) for name in ("a.txt", "b.txt", "c.txt")]
+    run_step(tmp_path, inputs)
+
+    write(inputs[0], "edited")
+    (tmp_path / "out" / "b.txt").unlink()
+    assert run_step(tmp_path, inputs) == ["a.txt", "b.txt"]
+    assert (tmp_path / "out" / "a.txt").read_text() == "edited"
+
+    # Same contents with a new mtime is rehashed but not redone
+    bump_mtime(inputs[2])
+    assert run_step(tmp_path, inputs) == []
+
+    assert run_step(tmp_path, inputs, params={"threshold": 0.5}) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_orphans_are_removed(tmp_path):
+    inputs = [write(tmp_path / "in" / name, name) for name in ("a.txt", "b.txt")]
+    run_step(tmp_path, inputs)
+    with StepManifest(tmp_path, "copy") as manifest:
+        manifest.plan({"a.txt": [inputs[0]]})
+        assert manifest.removed == 1
+    assert not (tmp_path / "out" / "b.txt").exists()
+    assert (tmp_path / "out" / "a.txt").exists()
+
+
+def test_record_needs_plan(tmp_path):
+    with StepManifest(tmp_path, "copy") as manifest:
+        with pytest.raises(KeyError):
+            manifest.record("a.txt", [])
+
+
+def test_dir_signature_covers_files(tmp_path):
+    toml = write(tmp_path / "tomls" / "x.toml", "a")
+    first = dir_signature([tmp_path / "data", toml])
+    assert dir_signature([tmp_path / "data", toml]) == first
+    bump_mtime(toml)
+    assert dir_signature([tmp_path / "data", toml]) != first
+    toml.unlink()
+    assert dir_signature([tmp_path / "data", toml]) != first
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    # Importing the orchestrator must not re-exec into its venv
+    monkeypatch.setenv("VIRTUAL_ENV", os.environ.get("VIRTUAL_ENV", "test"))
+    module = importlib.import_module("DG_collect_dataset")
+    core_copy = tmp_path / "core"
+    shutil.copytree(module.core_dir, core_copy, ignore=shutil.ignore_patterns("__pycache__", "templates"))
+    monkeypatch.setattr(module, "core_dir", str(core_copy))
+    monkeypatch.setattr(utils, "LINUX_PROJECTS_ROOT", tmp_path / "projects")
+    monkeypatch.setitem(utils.MUSUBI_PATHS, "wsl_app", str(tmp_path / "musubi"))
+    return module
+
+
+def test_step_signature_covers_helpers(pipeline, tmp_path):
+    first = pipeline.step_signature("someone", 3)
+    assert pipeline.step_signature("someone", 3) == first
+    bump_mtime(tmp_path / "core" / "face_index.py")
+    assert pipeline.step_signature("someone", 3) != first
+    assert "manifest.py" in pipeline.helper_modules()
+    assert "03_validate.py" not in pipeline.helper_modules()
+
+
+def test_publish_signature_covers_musubi_outputs(pipeline, tmp_path):
+    dataset = write(tmp_path / "musubi" / "files" / "datasets" / "someone" / "256" / "a.png", "x")
+    first = pipeline.step_signature("someone", 6)
+    shutil.rmtree(dataset.parent)
+    assert pipeline.step_signature("someone", 6) != first
@@ -0,0 +1,191 @@
+import errno
+import fcntl
+import importlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+import utils
+
+publish = importlib.import_module("06_publish")
+
+
+def write_image(path, size, color=(200, 40, 40), fmt=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, color).save(path, format=fmt)
+    return path
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts Image.open calls and full conversions (decodes)."""
+    counts = {"open": 0, "convert": 0}
+    open_image = Image.open
+    convert = Image.Image.convert
+
+    def counting_open(*args, **kwargs):
+        counts["open"] += 1
+        return open_image(*args, **kwargs)
+
+    def counting_convert(self, *args, **kwargs):
+        counts["convert"] += 1
+        return convert(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image, "open", counting_open)
+    monkeypatch.setattr(Image.Image, "convert", counting_convert)
+    return counts
+
+
+def test_resize_decodes_once_for_all_resolutions(tmp_path, decodes):
+    src = write_image(tmp_path / "src.jpg", (2048, 1536), fmt="JPEG")
+    targets = [(res, str(tmp_path / f"{res}.jpg")) for res in publish.RESOLUTIONS]
+    assert publish.resize_image((str(src), targets)) == str(src)
+    assert decodes == {"open": 1, "convert": 1}
+
+    for res, out_path in targets:
+        with Image.open(out_path) as img:
+            assert img.size == (res, res)
+
+
+def test_resize_replaces_linked_outputs(tmp_path):
+    src = write_image(tmp_path / "src.png", (64, 64))
+    out = write_image(tmp_path / "256.png", (8, 8), color=(0, 0, 0))
+    os.link(out, tmp_path / "deployed.png")
+    publish.resize_image((str(src), [(256, str(out))]))
+    with Image.open(tmp_path / "deployed.png") as img:
+        assert img.size == (8, 8)
+    with Image.open(out) as img:
+        assert img.size == (256, 256)
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.png"
+    path.write_bytes(b"image bytes")
+    return path
+
+
+def fail_with(code):
+    def fail(*args, **kwargs):
+        raise OSError(code, os.strerror(code))
+    return fail
+
+
+def test_deploy_links_when_possible(tmp_path, src):
+    dst = tmp_path / "dst.png"
+    dst.write_bytes(b"old")
+    assert publish.deploy_file(src, dst) == "link"
+    assert os.path.samefile(src, dst)
+
+
+def test_deploy_falls_back_to_reflink(tmp_path, src, monkeypatch):
+    monkeypatch.setattr(os, "link", fail_with(errno.EXDEV))
+    clones = []
+
+    def clone(fd, request, src_fd):
+        assert request == publish.FICLONE
+        clones.append(src_fd)
+        os.write(fd, os.read(src_fd, 1024))
+
+    monkeypatch.setattr(fcntl, "ioctl", clone)
+    dst = tmp_path / "dst.png"
+    assert publish.deploy_file(src, dst) == "reflink"
+    assert len(clones) == 1
+    assert dst.read_bytes() == b"image bytes"
+    assert os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+
+
+@pytest.mark.parametrize("code", [errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM])
+def test_deploy_falls_back_to_copy(tmp_path, src, monkeypatch, code):
+    monkeypatch.setattr(os, "link", fail_with(errno.EXDEV))
+    monkeypatch.setattr(fcntl, "ioctl", fail_with(code))
+    dst = tmp_path / "dst.png"
+    assert publish.deploy_file(src, dst) == "copy"
+    assert dst.read_bytes() == b"image bytes"
+    assert not os.path.samefile(src, dst)
+
+
+def test_deploy_raises_unexpected_reflink_errors(tmp_path, src, monkeypatch):
+    monkeypatch.setattr(os, "link", fail_with(errno.EXDEV))
+    monkeypatch.setattr(fcntl, "ioctl", fail_with(errno.ENOSPC))
+    with pytest.raises(OSError) as e:
+        publish.deploy_file(src, tmp_path / "dst.png")
+    assert e.value.errno == errno.ENOSPC
+
+
+def test_deploy_does_not_write_through_links(tmp_path, src, monkeypatch):
+    dst = tmp_path / "dst.png"
+    publish.deploy_file(src, dst)
+    other = tmp_path / "other.png"
+    other.write_bytes(b"other bytes")
+    monkeypatch.setattr(os, "link", fail_with(errno.EXDEV))
+    monkeypatch.setattr(fcntl, "ioctl", fail_with(errno.EOPNOTSUPP))
+    assert publish.deploy_file(other, dst) == "copy"
+    assert src.read_bytes() == b"image bytes"
+    assert dst.read_bytes() == b"other bytes"
+
+
+# --- run ---
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "LINUX_PROJECTS_ROOT", tmp_path / "projects")
+    monkeypatch.setitem(utils.MUSUBI_PATHS, "wsl_app", str(tmp_path / "musubi"))
+    monkeypatch.setattr(publish, "WIN_MOUNT_APP", tmp_path / "no_windows_mount")
+    # Resize in threads so the calls can be recorded
+    monkeypatch.setattr(publish, "ProcessPoolExecutor", ThreadPoolExecutor)
+    resized = []
+    resize_image = publish.resize_image
+
+    def recording_resize(job):
+        resized.append(os.path.basename(job[0]))
+        return resize_image(job)
+
+    monkeypatch.setattr(publish, "resize_image", recording_resize)
+
+    path = utils.get_project_path("someone")
+    (path / "project_config.json").parent.mkdir(parents=True)
+    (path / "project_config.json").write_text(json.dumps({"name": "Someone", "trigger": "s0m3"}))
+    caption_dir = path / utils.DIRS["caption"]
+    for i in range(3):
+        write_image(caption_dir / f"{i}.png", (300, 200), (i * 60, 0, 0))
+        (caption_dir / f"{i}.txt").write_text(f"s0m3, image {i}")
+    return path, caption_dir, resized
+
+
+def test_second_run_skips_unchanged_images(project, tmp_path):
+    path, caption_dir, resized = project
+    publish.run("someone")
+    assert sorted(resized) == ["0.png", "1.png", "2.png"]
+    musubi = tmp_path / "musubi" / "files" / "datasets" / "someone"
+    for res in publish.RESOLUTIONS:
+        assert sorted(os.listdir(musubi / str(res))) == ["0.png", "0.txt", "1.png", "1.txt", "2.png", "2.txt"]
+        assert os.path.samefile(musubi / str(res) / "1.png", path / utils.DIRS["publish"] / str(res) / "1.png")
+
+    resized.clear()
+    publish.run("someone")
+    assert resized == []
+
+    # A caption edit redeploys only the caption, a new image only resizes that image
+    (caption_dir / "1.txt").write_text("s0m3, edited")
+    write_image(caption_dir / "3.png", (300, 200))
+    publish.run("someone")
+    assert resized == ["3.png"]
+    for res in publish.RESOLUTIONS:
+        assert (musubi / str(res) / "1.txt").read_text() == "s0m3, edited"
+        assert (musubi / str(res) / "3.txt").read_text() == "s0m3"
+
+
+def test_removed_images_are_unpublished(project, tmp_path):
+    path, caption_dir, resized = project
+    publish.run("someone")
+    (caption_dir / "2.png").unlink()
+    (caption_dir / "2.txt").unlink()
+    publish.run("someone")
+    musubi = tmp_path / "musubi" / "files" / "datasets" / "someone"
+    for res in publish.RESOLUTIONS:
+        assert not (musubi / str(res) / "2.png").exists()
+        assert not (path / utils.DIRS["publish"] / str(res) / "2.png").exists()
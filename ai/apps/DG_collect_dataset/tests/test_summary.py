@@ -0,0 +1,158 @@
+import importlib
+import json
+import math
+import random
+
+import pytest
+from PIL import Image
+
+import utils
+
+summary = importlib.import_module("07_summary")
+
+
+def flip(h, bits):
+    for bit in bits:
+        h ^= 1 << bit
+    return h
+
+
+def as_sets(clusters):
+    return {frozenset(c) for c in clusters}
+
+
+def pairwise_clusters(hashes, max_bits):
+    """Reference: union of every pair within max_bits, compared directly."""
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            if bin(hashes[i] ^ hashes[j]).count("1") <= max_bits:
+                parent[find(i)] = find(j)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def test_clusters_at_the_bit_boundary():
+    rng = random.Random(0)
+    base = rng.getrandbits(64)
+    # One flipped bit in each of the first NEAR_DUP_BITS bands still leaves one band equal
+    spread = [round(64 * b / (summary.NEAR_DUP_BITS + 1)) for b in range(summary.NEAR_DUP_BITS + 1)]
+    within = flip(base, spread[:summary.NEAR_DUP_BITS])
+    beyond = flip(base, spread)
+    assert summary.near_duplicate_clusters([base, within]) == [[0, 1]]
+    assert summary.near_duplicate_clusters([base, beyond]) == []
+    assert summary.near_duplicate_clusters([base, flip(base, range(summary.NEAR_DUP_BITS))]) == [[0, 1]]
+    assert summary.near_duplicate_clusters([base, flip(base, range(summary.NEAR_DUP_BITS + 1))]) == []
+    assert summary.near_duplicate_clusters([base, base]) == [[0, 1]]
+
+
+def test_clusters_are_transitive():
+    a = 0
+    b = flip(a, range(0, 6))
+    c = flip(b, range(32, 38))
+    assert summary.near_duplicate_clusters([a, c, b]) == [[0, 1, 2]]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_clusters_match_pairwise_comparison(seed):
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(40)]
+    for i in range(40):
+        distance = rng.choice([summary.NEAR_DUP_BITS - 1, summary.NEAR_DUP_BITS, summary.NEAR_DUP_BITS + 1])
+        hashes.append(flip(hashes[i], rng.sample(range(64), distance)))
+    rng.shuffle(hashes)
+    for max_bits in (summary.NEAR_DUP_BITS, 3, 10):
+        expected = as_sets(pairwise_clusters(hashes, max_bits))
+        assert as_sets(summary.near_duplicate_clusters(hashes, max_bits)) == expected
+    assert summary.near_duplicate_clusters([]) == []
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(summary, "PAGE_COLS", 3)
+    monkeypatch.setattr(summary, "PAGE_ROWS", 2)
+    return 6
+
+
+def entry(i):
+    return {"file": f"face_{i:03d}.png", "thumb": Image.new("RGB", (summary.THUMB_W, summary.THUMB_W), (i, i, i))}
+
+
+@pytest.mark.parametrize("count", [1, 5, 6, 7, 12, 13])
+def test_sheet_pages(tmp_path, small_pages, count):
+    sheets = summary.SheetWriter(tmp_path, "someone", count)
+    assert sheets.pages == math.ceil(count / small_pages)
+    for i in range(count):
+        sheets.add(i, entry(i))
+    assert len(sheets.saved) == sheets.pages
+    if sheets.pages == 1:
+        assert [p.name for p in sheets.saved] == ["someone_compact_summary.jpg"]
+    else:
+        assert [p.name for p in sheets.saved] == [f"someone_compact_summary_p{n:03d}.jpg" for n in range(1, sheets.pages + 1)]
+
+    # Full pages use every column, the last page is sized to what is left
+    last = count - small_pages * (sheets.pages - 1)
+    cols = min(summary.PAGE_COLS, math.ceil(math.sqrt(last)))
+    rows = math.ceil(last / cols)
+    with Image.open(sheets.saved[-1]) as img:
+        assert img.size == (cols * summary.THUMB_W + (cols + 1) * summary.PADDING,
+                            rows * summary.THUMB_H + (rows + 1) * summary.PADDING)
+    if sheets.pages > 1:
+        with Image.open(sheets.saved[0]) as img:
+            assert img.size == (3 * summary.THUMB_W + 4 * summary.PADDING, 2 * summary.THUMB_H + 3 * summary.PADDING)
+
+
+# --- run ---
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "LINUX_PROJECTS_ROOT", tmp_path / "projects")
+    path = utils.get_project_path("someone")
+    path.mkdir(parents=True)
+    (path / "project_config.json").write_text(json.dumps({"name": "Someone", "trigger": "s0m3"}))
+    in_dir = path / "06_publish" / "256"
+    in_dir.mkdir(parents=True)
+    return path, in_dir
+
+
+def test_run_writes_stats(project, small_pages):
+    path, in_dir = project
+    rng = random.Random(0)
+    for i in range(7):
+        # Random noise, so no two images are near-duplicates by accident
+        img = Image.frombytes("L", (32, 32), bytes(rng.getrandbits(8) for _ in range(32 * 32)))
+        img.convert("RGB").save(in_dir / f"img_{i}.png")
+    Image.open(in_dir / "img_0.png").save(in_dir / "img_0_copy.png")
+    Image.new("RGB", (48, 32)).save(in_dir / "wide.png")
+    captions = {"img_0": "s0m3 " * 4, "img_1": "s0m3 " * 15, "img_2": "s0m3 " * 25, "wide": "s0m3"}
+    for name, text in captions.items():
+        (in_dir / f"{name}.txt").write_text(text)
+    out_dir = path / utils.DIRS["summary"]
+    out_dir.mkdir()
+    (out_dir / "someone_compact_summary_p009.jpg").write_bytes(b"stale page")
+
+    summary.run("someone")
+    with open(out_dir / "someone_dataset_stats.json", encoding="utf-8") as f:
+        stats = json.load(f)
+    assert stats["name"] == "Someone"
+    assert stats["trigger"] == "s0m3"
+    assert stats["images"] == 9
+    assert stats["resolutions"] == {"32x32": 8, "48x32": 1}
+    assert stats["captions"]["count"] == 4
+    assert stats["captions"]["missing"] == ["img_0_copy.png", "img_3.png", "img_4.png", "img_5.png", "img_6.png"]
+    assert stats["captions"]["words"] == {"min": 1, "median": 15, "max": 25, "mean": 11.25,
+                                          "histogram": {"0": 2, "10": 1, "20": 1}}
+    assert stats["near_duplicates"] == {"max_bits": summary.NEAR_DUP_BITS, "clusters": [["img_0.png", "img_0_copy.png"]]}
+
+    assert sorted(p.name for p in out_dir.glob("*.jpg")) == ["someone_compact_summary_p001.jpg", "someone_compact_summary_p002.jpg"]
+    report = (out_dir / "someone_caption_summary.txt").read_text(encoding="utf-8")
+    assert "Total Images: 9" in report
+    assert "IMAGE: img_3.png\nCAPTION: [No Caption Found]" in report
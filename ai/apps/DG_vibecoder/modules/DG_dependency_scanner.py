@@ -12,14 +12,23 @@ Purpose:
 
 Output:
   Generates a manifest.json in the target directory.
+
+Caching:
+  Extracted imports are cached per file, keyed by (path, mtime, size), in one
+  manifest per top-level directory of the scan target under
+  ~/.cache/DG_vibecoder/scan (override with DG_SCAN_CACHE_DIR). Rescans only
+  parse changed files and only rewrite the manifests of changed subtrees.
+  Files that fail to parse are not cached. Cold scans parse in a process pool.
 """
 
 import os
 import sys
 import json
 import ast
+import hashlib
 import platform
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 # ============================================================
 # CONFIG / MAPPINGS
@@ -44,14 +53,22 @@ PYPI_MAP = {
 
 CRITICAL_GPU_MODULES = {"torch", "tensorflow", "jax", "diffusers"}
 
+SKIP_DIRS = (".venv", "__pycache__", ".git")
+CONFIG_FILES = ("requirements.txt", "pyproject.toml", "environment.yml")
+
+CACHE_DIR = Path(os.environ.get("DG_SCAN_CACHE_DIR", Path.home() / ".cache" / "DG_vibecoder" / "scan"))
+CACHE_VERSION = 1
+# Below this many files to parse, a process pool costs more than it saves
+POOL_MIN_FILES = 64
+
 # ============================================================
 # SCANNERS
 # ============================================================
 
-def get_imports_from_file(filepath):
+def _parse_imports(filepath):
     """
-    Parses a .py file using AST to extract all imported module names.
-    Returns a set of top-level module names.
+    Returns (imports, error) for a .py file. Runs in pool workers, so it
+    reports errors instead of printing them.
     """
     imports = set()
     try:
@@ -67,9 +84,77 @@ def get_imports_from_file(filepath):
                     imports.add(node.module.split('.')[0])
     except Exception as e:
         # verifying syntax errors or decoding issues don't crash the scanner
-        print(f"[WARN] AST parse failed for {filepath.name}: {e}")
-    
-    return imports
+        return sorted(imports), str(e)
+    return sorted(imports), None
+
+def get_imports_from_file(filepath):
+    """
+    Parses a .py file using AST to extract all imported module names.
+    Returns a set of top-level module names.
+    """
+    imports, error = _parse_imports(filepath)
+    if error:
+        print(f"[WARN] AST parse failed for {filepath.name}: {error}")
+    return set(imports)
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class ScanCache:
+    """
+    Per-directory import cache: {relative path: [mtime_ns, size, imports]}.
+    One manifest per top-level directory of a scan, so an unchanged app is
+    neither reparsed nor rewritten.
+    """
+    def __init__(self, directory: Path):
+        self.directory = directory
+        key = hashlib.sha1(str(directory.resolve()).encode()).hexdigest()[:16]
+        self.path = CACHE_DIR / f"{directory.name}-{key}.json"
+        self.entries = {}
+        self.seen = set()
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get(self, rel, stat):
+        self.seen.add(rel)
+        entry = self.entries.get(rel)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        return None
+
+    def put(self, rel, stat, imports):
+        self.entries[rel] = [stat.st_mtime_ns, stat.st_size, imports]
+        self.dirty = True
+
+    def save(self):
+        # Files that disappeared since the last scan
+        for rel in [r for r in self.entries if r not in self.seen]:
+            del self.entries[rel]
+            self.dirty = True
+        if not self.dirty:
+            return
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "directory": str(self.directory), "files": self.entries}, f)
+        os.replace(tmp, self.path)
+
+def parse_files(paths, workers=None):
+    """Yields (path, imports, error) for each path, in a process pool when there are many."""
+    if len(paths) < POOL_MIN_FILES or (workers or os.cpu_count() or 1) < 2:
+        for p in paths:
+            yield (p,) + _parse_imports(p)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for p, result in zip(paths, pool.map(_parse_imports, paths, chunksize=32)):
+            yield (p,) + result
 
 def scan_directory(target_dir: Path):
     """
@@ -87,39 +172,60 @@ def scan_directory(target_dir: Path):
     }
 
     all_imports = set()
-    has_requirements_txt = False
-    has_pyproject = False
 
-    # 1. Walk and Parse
-    for root, _, files in os.walk(target_dir):
-        if ".venv" in root or "__pycache__" in root or ".git" in root:
-            continue
-            
-        for file in files:
-            fpath = Path(root) / file
+    # 1. Walk (skipped folders are pruned, not descended into) and look up the cache
+    caches = {}
+    to_parse = []
+    for root, dirs, files in os.walk(target_dir):
+        dirs[:] = sorted(d for d in dirs if not any(skip in d for skip in SKIP_DIRS))
+        root_path = Path(root)
+        rel_root = root_path.relative_to(target_dir)
+        # One cache per top-level directory; files directly in the target share one
+        top = target_dir / rel_root.parts[0] if rel_root.parts else target_dir
+        cache = caches.get(top)
+        if cache is None:
+            cache = caches[top] = ScanCache(top)
+
+        for file in sorted(files):
+            fpath = root_path / file
             
             # Check for config files
-            if file == "requirements.txt":
-                scan_data["config_files"].append("requirements.txt")
-                has_requirements_txt = True
-            elif file == "pyproject.toml":
-                scan_data["config_files"].append("pyproject.toml")
-                has_pyproject = True
-            elif file == "environment.yml":
-                scan_data["config_files"].append("environment.yml")
+            if file in CONFIG_FILES:
+                scan_data["config_files"].append(file)
 
             # Parse Code
             if file.endswith(".py"):
-                file_imports = get_imports_from_file(fpath)
-                all_imports.update(file_imports)
+                try:
+                    stat = fpath.stat()
+                except OSError:
+                    continue
+                rel = str(fpath.relative_to(top))
+                cached = cache.get(rel, stat)
+                if cached is not None:
+                    all_imports.update(cached)
+                else:
+                    to_parse.append((fpath, cache, rel, stat))
+
+    # 2. Parse new/changed files
+    parsed = parse_files([item[0] for item in to_parse])
+    for (fpath, cache, rel, stat), (_, imports, error) in zip(to_parse, parsed):
+        if error:
+            # Not cached, so the warning shows on every scan until the file is fixed
+            print(f"[WARN] AST parse failed for {fpath.name}: {error}")
+        else:
+            cache.put(rel, stat, imports)
+        all_imports.update(imports)
+    for cache in caches.values():
+        cache.save()
+    print(f"[SCAN] {len(to_parse)} files parsed, cache: {sum(len(c.seen) for c in caches.values()) - len(to_parse)} hits")
 
-    # 2. Filter Standard Library (Best Effort)
+    # 3. Filter Standard Library (Best Effort)
     # We compare against sys.stdlib_module_names if available (Py3.10+)
     if hasattr(sys, 'stdlib_module_names'):
         stdlib = sys.stdlib_module_names
         all_imports = {i for i in all_imports if i not in stdlib}
     
-    # 3. Analyze Imports
+    # 4. Analyze Imports
     scan_data["detected_imports"] = sorted(list(all_imports))
     
     # Check GPU
@@ -0,0 +1,7 @@
+import os
+import sys
+
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (app_dir, os.path.join(app_dir, "modules")):
+    if path not in sys.path:
+        sys.path.append(path)
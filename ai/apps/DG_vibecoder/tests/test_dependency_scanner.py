@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import DG_dependency_scanner as scanner
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(scanner, "CACHE_DIR", tmp_path / "cache")
+    app = tmp_path / "app"
+    (app / "core").mkdir(parents=True)
+    (app / "main.py").write_text("import torch\nfrom core import util\n")
+    (app / "core" / "util.py").write_text("import cv2\nimport os.path\n")
+    (app / "core" / "io.py").write_text("from PIL import Image\n")
+    (app / "requirements.txt").write_text("torch\n")
+    return app
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Names of the files the scanner parses."""
+    names = []
+    parse = scanner._parse_imports
+
+    def recording_parse(filepath):
+        names.append(filepath.name)
+        return parse(filepath)
+
+    monkeypatch.setattr(scanner, "_parse_imports", recording_parse)
+    return names
+
+
+def test_rescan_hits_the_cache(app, parsed):
+    first = scanner.scan_directory(app)
+    assert sorted(parsed) == ["io.py", "main.py", "util.py"]
+    assert first["detected_imports"] == ["PIL", "core", "cv2", "torch"]
+    assert first["gpu_required"]
+    assert first["config_files"] == ["requirements.txt"]
+
+    parsed.clear()
+    assert scanner.scan_directory(app) == first
+    assert parsed == []
+
+
+def test_changed_files_are_reparsed(app, parsed):
+    scanner.scan_directory(app)
+    util = app / "core" / "util.py"
+    stat = util.stat()
+
+    # Same size, newer mtime
+    util.write_text("import cv3\nimport os.path\n")
+    os.utime(util, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    parsed.clear()
+    assert "cv3" in scanner.scan_directory(app)["detected_imports"]
+    assert parsed == ["util.py"]
+
+    # Same mtime, different size
+    stat = util.stat()
+    util.write_text("import yaml\n")
+    os.utime(util, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    parsed.clear()
+    assert "yaml" in scanner.scan_directory(app)["detected_imports"]
+    assert parsed == ["util.py"]
+
+
+def test_removed_files_leave_the_cache(app):
+    scanner.scan_directory(app)
+    (app / "core" / "io.py").unlink()
+    scanner.scan_directory(app)
+    assert list(scanner.ScanCache(app / "core").entries) == ["util.py"]
+
+
+def test_parse_failures_warn_on_every_scan(app, parsed, capsys):
+    (app / "broken.py").write_text("import numpy\ndef broken(:\n")
+    scanner.scan_directory(app)
+    assert "[WARN] AST parse failed for broken.py" in capsys.readouterr().out
+
+    parsed.clear()
+    scanner.scan_directory(app)
+    assert parsed == ["broken.py"]
+    assert "[WARN] AST parse failed for broken.py" in capsys.readouterr().out
+
+
+def test_process_pool_matches_serial_parse(app, monkeypatch):
+    for i in range(40):
+        (app / "core" / f"mod_{i}.py").write_text(f"import pkg_{i % 7}\nfrom lib_{i % 3}.sub import x\n")
+    (app / "core" / "broken.py").write_text("import (\n")
+    paths = sorted(app.rglob("*.py"))
+
+    serial = list(scanner.parse_files(paths, workers=1))
+    monkeypatch.setattr(scanner, "POOL_MIN_FILES", 0)
+    pooled = list(scanner.parse_files(paths, workers=2))
+    assert pooled == serial
+    assert sum(1 for _, _, error in serial if error) == 1
@@ -1,4 +1,4 @@
-cat <<EOF > ~/workspace/deadlygraphics/ai/apps/DG_videoscraper/DG_videoscraper.py
+cat <<'EOF' > ~/workspace/deadlygraphics/ai/apps/DG_videoscraper/DG_videoscraper.py
 # Script Name: DG_videoscraper.py
 # Description: Smart video downloader. Strict H.264 verification. Correct filenames.
 
@@ -14,9 +14,16 @@ import platform
 import time
 import subprocess
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- Configuration ---
 DEFAULT_CHECKLIST = "scrapervideo_checklist.txt"
+DEFAULT_LEDGER = "scrapervideo_ledger.json"
+DEFAULT_WORKERS = 3
+# uc.Chrome patches the shared chromedriver binary and webdriver-manager
+# writes its cache on startup, so browsers are launched one at a time
+BROWSER_START_LOCK = threading.Lock()
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
 def log(msg):
@@ -83,6 +90,32 @@ def save_cookies_safe(driver):
         tf.close(); return tf.name
     except: return None
 
+def probe_file(filepath):
+    """
+    One ffprobe call for all streams. Returns {'video': codec, 'audio': codec,
+    'width': px, 'height': px, 'duration': seconds} (None when absent).
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "stream=index,codec_type,codec_name,width,height:format=duration",
+        "-of", "json",
+        filepath
+    ]
+    probe = json.loads(subprocess.check_output(cmd).decode() or "{}")
+    info = {"video": None, "audio": None, "width": None, "height": None, "duration": None}
+    for stream in probe.get("streams", []):
+        kind = stream.get("codec_type")
+        # First stream of each type, like -select_streams v:0 / a:0
+        if kind in ("video", "audio") and info[kind] is None:
+            info[kind] = stream.get("codec_name")
+            if kind == "video":
+                info["width"], info["height"] = stream.get("width"), stream.get("height")
+    duration = probe.get("format", {}).get("duration")
+    if duration not in (None, "N/A"):
+        info["duration"] = float(duration)
+    return info
+
 def verify_file(filepath):
     """Checks if file exists and is valid H.264/AAC MP4."""
     if not os.path.exists(filepath):
@@ -90,27 +123,10 @@ def verify_file(filepath):
         return False
         
     try:
-        cmd = [
-            "ffprobe", 
-            "-v", "error", 
-            "-select_streams", "v:0", 
-            "-show_entries", "stream=codec_name", 
-            "-of", "default=noprint_wrappers=1:nokey=1", 
-            filepath
-        ]
-        video_codec = subprocess.check_output(cmd).decode().strip()
-        
-        cmd_audio = [
-            "ffprobe", 
-            "-v", "error", 
-            "-select_streams", "a:0", 
-            "-show_entries", "stream=codec_name", 
-            "-of", "default=noprint_wrappers=1:nokey=1", 
-            filepath
-        ]
-        audio_codec = subprocess.check_output(cmd_audio).decode().strip()
-
-        log(f"🔍 Verification: Video={video_codec}, Audio={audio_codec}")
+        info = probe_file(filepath)
+        video_codec, audio_codec = info["video"] or "", info["audio"] or ""
+
+        log(f"🔍 Verification: Video={video_codec} {info['width']}x{info['height']}, Audio={audio_codec}, Duration={info['duration']}s")
         
         if video_codec == "h264" and audio_codec == "aac":
             log("✅ PROVEN: Valid H.264/AAC MP4. Premiere Safe.")
@@ -162,8 +178,12 @@ def download_file(url, output_dir, cookie_file=None, referer=None, title=None):
     log(f"Downloading (H.264 Priority): {url}")
     try:
         with yt_dlp.YoutubeDL(opts) as ydl: 
-            ydl.download([url])
-        
+            info = ydl.extract_info(url, download=True)
+
+        # The hook reports each downloaded part; the merged file is the final one
+        downloads = (info or {}).get('requested_downloads') or []
+        if downloads and downloads[-1].get('filepath'):
+            filename_found = downloads[-1]['filepath']
         if filename_found:
              return verify_file(filename_found)
         return False
@@ -265,7 +285,8 @@ def attempt_chrome_sniff(url):
         opts = uc.ChromeOptions()
         opts.add_argument('--no-sandbox'); opts.add_argument('--headless=new')
         opts.add_argument('--disable-dev-shm-usage'); opts.add_argument('--mute-audio')
-        driver = uc.Chrome(options=opts)
+        with BROWSER_START_LOCK:
+            driver = uc.Chrome(options=opts)
         return run_vdh_logic(driver, url)
     except Exception as e: log(f"Chrome fail: {e}"); return None, None, None
     finally: 
@@ -299,44 +320,117 @@ def attempt_opera_sniff(url):
                 if token: os.environ['GH_TOKEN'] = token
             except: pass
 
-        driver_path = OperaDriverManager().install()
-        driver = webdriver.Chrome(service=Service(driver_path), options=opts)
+        with BROWSER_START_LOCK:
+            driver_path = OperaDriverManager().install()
+            driver = webdriver.Chrome(service=Service(driver_path), options=opts)
         return run_vdh_logic(driver, url)
     except Exception as e: log(f"Opera fail: {e}"); return None, None, None
     finally:
         if driver: driver.quit()
 
+# --- JOB RUNNER ---
+
+class JobLedger:
+    """
+    Persistent done/failed record per checklist URL, so reruns skip finished
+    entries. Saved after every job; safe to share between worker threads.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f: self.entries = json.load(f)
+            except (OSError, ValueError):
+                log(f"⚠️ Ledger unreadable, starting fresh: {path}")
+
+    def status(self, url):
+        with self.lock:
+            return self.entries.get(url, {}).get("status")
+
+    def record(self, url, ok, error=None):
+        with self.lock:
+            entry = self.entries.setdefault(url, {"attempts": 0})
+            entry["status"] = "done" if ok else "failed"
+            entry["attempts"] += 1
+            entry["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            if error: entry["error"] = error
+            else: entry.pop("error", None)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f: json.dump(self.entries, f, indent=2)
+            os.replace(tmp, self.path)
+
+def process_url(url, output_dir):
+    """Direct/YouTube download first, then browser sniffing. Returns True on success."""
+    if attempt_direct_or_youtube(url, output_dir): return True
+    
+    s_url, cookie, title = attempt_chrome_sniff(url)
+    if s_url: 
+        if download_file(s_url, output_dir, cookie, url, title):
+            if cookie: os.remove(cookie)
+            return True
+        
+    s_url, cookie, title = attempt_opera_sniff(url)
+    if s_url:
+        if download_file(s_url, output_dir, cookie, url, title):
+            if cookie: os.remove(cookie)
+            return True
+        
+    log("❌ All methods failed.")
+    return False
+
+def run_jobs(urls, output_dir, ledger, workers=DEFAULT_WORKERS, retry_failed=True, process=process_url):
+    """
+    Runs process(url, output_dir) for every URL not yet done, at most
+    workers at a time. Returns {url: True/False} for the URLs it ran.
+    """
+    todo = []
+    for url in dict.fromkeys(urls):
+        status = ledger.status(url)
+        if status == "done" or (status == "failed" and not retry_failed):
+            log(f"Skipping ({status}): {url[:60]}")
+            continue
+        todo.append(url)
+
+    results = {}
+    if not todo: return results
+    print(f"🚀 Processing {len(todo)} URLs ({workers} at a time)...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process, url, output_dir): url for url in todo}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                ok, error = bool(future.result()), None
+            except Exception as e:
+                ok, error = False, str(e)
+            ledger.record(url, ok, error)
+            results[url] = ok
+            log(f"{'✅ Done' if ok else '❌ Failed'}: {url[:60]}")
+    return results
+
 def main():
+    parser = argparse.ArgumentParser(description="DG video scraper")
+    parser.add_argument("--checklist", default=DEFAULT_CHECKLIST)
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER)
+    parser.add_argument("--output-dir", default="downloads")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent downloads")
+    parser.add_argument("--skip-failed", action="store_true", help="Don't retry URLs that failed before")
+    args = parser.parse_args()
+
     check_and_install_dependencies()
-    if not os.path.exists(DEFAULT_CHECKLIST):
-        with open(DEFAULT_CHECKLIST, "w") as f: f.write("# URLs here\n")
+    if not os.path.exists(args.checklist):
+        with open(args.checklist, "w") as f: f.write("# URLs here\n")
     
-    with open(DEFAULT_CHECKLIST, "r") as f:
+    with open(args.checklist, "r") as f:
         urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
-    if not urls: log(f"No URLs in {DEFAULT_CHECKLIST}."); sys.exit(0)
+    if not urls: log(f"No URLs in {args.checklist}."); sys.exit(0)
 
-    output_dir = "downloads"
-    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(args.output_dir, exist_ok=True)
     
-    print(f"🚀 Processing {len(urls)} URLs...")
-    for url in urls:
-        print(f"\n--- Processing: {url[:40]}... ---")
-        
-        if attempt_direct_or_youtube(url, output_dir): continue
-        
-        s_url, cookie, title = attempt_chrome_sniff(url)
-        if s_url: 
-            if download_file(s_url, output_dir, cookie, url, title):
-                if cookie: os.remove(cookie)
-                continue
-            
-        s_url, cookie, title = attempt_opera_sniff(url)
-        if s_url:
-            if download_file(s_url, output_dir, cookie, url, title):
-                if cookie: os.remove(cookie)
-                continue
-            
-        log("❌ All methods failed.")
+    ledger = JobLedger(args.ledger)
+    results = run_jobs(urls, args.output_dir, ledger, workers=max(1, args.workers), retry_failed=not args.skip_failed)
+    print(f"\n📋 {sum(results.values())} done, {len(results) - sum(results.values())} failed, {len(urls) - len(results)} skipped. Ledger: {args.ledger}")
 
 if __name__ == "__main__":
     main()
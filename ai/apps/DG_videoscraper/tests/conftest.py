@@ -0,0 +1,21 @@
+import importlib.util
+import os
+import subprocess
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTALL_DIR = os.path.join("workspace", "deadlygraphics", "ai", "apps", "DG_videoscraper")
+
+
+@pytest.fixture(scope="session")
+def scraper(tmp_path_factory):
+    """DG_videoscraper as written by its installer heredoc into a scratch HOME."""
+    home = tmp_path_factory.mktemp("home")
+    os.makedirs(home / INSTALL_DIR)
+    subprocess.run(["bash", os.path.join(APP_DIR, "DG_videoscraper.py")], check=True,
+                   env={"HOME": str(home), "PATH": os.environ.get("PATH", "")})
+    spec = importlib.util.spec_from_file_location("DG_videoscraper", home / INSTALL_DIR / "DG_videoscraper.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
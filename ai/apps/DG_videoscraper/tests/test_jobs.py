@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import time
+
+from conftest import APP_DIR
+
+
+def test_installer_writes_the_script_unchanged(scraper):
+    """The installer is a heredoc: the installed script must be its body byte for byte."""
+    with open(os.path.join(APP_DIR, "DG_videoscraper.py"), "rb") as f:
+        installer = f.read()
+    body = installer.split(b"\n", 1)[1]
+    body = body[:body.rindex(b"\nEOF")] + b"\n"
+    with open(scraper.__file__, "rb") as f:
+        assert f.read() == body
+
+
+def test_ledger_persists(scraper, tmp_path):
+    path = str(tmp_path / "ledger.json")
+    ledger = scraper.JobLedger(path)
+    assert ledger.status("a") is None
+    ledger.record("a", False, "timeout")
+    ledger.record("a", True)
+    ledger.record("b", False, "404")
+
+    reloaded = scraper.JobLedger(path)
+    assert reloaded.status("a") == "done"
+    assert reloaded.status("b") == "failed"
+    with open(path) as f:
+        entries = json.load(f)
+    assert entries["a"]["attempts"] == 2
+    assert "error" not in entries["a"]
+    assert entries["b"]["error"] == "404"
+
+
+def test_unreadable_ledger_starts_fresh(scraper, tmp_path):
+    path = tmp_path / "ledger.json"
+    path.write_text("{not json")
+    ledger = scraper.JobLedger(str(path))
+    assert ledger.entries == {}
+    ledger.record("a", True)
+    assert json.loads(path.read_text())["a"]["status"] == "done"
+
+
+def test_run_jobs(scraper, tmp_path):
+    ledger = scraper.JobLedger(str(tmp_path / "ledger.json"))
+    ledger.record("done", True)
+    ledger.record("failed", False)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def process(url, output_dir):
+        assert output_dir == "out"
+        with lock:
+            running.append(url)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(url)
+        if url == "raises":
+            raise RuntimeError("boom")
+        return url != "bad"
+
+    urls = ["done", "failed", "ok1", "ok2", "ok1", "bad", "raises"]
+    results = scraper.run_jobs(urls, "out", ledger, workers=2, retry_failed=False, process=process)
+    assert results == {"ok1": True, "ok2": True, "bad": False, "raises": False}
+    assert max(peak) == 2
+    assert ledger.entries["raises"]["error"] == "boom"
+
+    # Only the failures are run again
+    results = scraper.run_jobs(urls, "out", ledger, workers=2, process=process)
+    assert results == {"failed": True, "bad": False, "raises": False}
+    assert ledger.entries["bad"]["attempts"] == 2
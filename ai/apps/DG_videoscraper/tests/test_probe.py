@@ -0,0 +1,27 @@
+import shutil
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not shutil.which("ffmpeg") or not shutil.which("ffprobe"), reason="needs ffmpeg and ffprobe")
+
+
+def test_probe_file(scraper, tmp_path):
+    clip = str(tmp_path / "clip.mp4")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=2:size=160x120:rate=10",
+                    "-f", "lavfi", "-i", "sine=duration=2", "-c:v", "libx264", "-c:a", "aac", "-shortest", clip], check=True)
+    info = scraper.probe_file(clip)
+    assert info["video"] == "h264"
+    assert info["audio"] == "aac"
+    assert (info["width"], info["height"]) == (160, 120)
+    assert info["duration"] == pytest.approx(2, abs=0.1)
+    assert scraper.verify_file(clip)
+
+
+def test_probe_file_without_audio(scraper, tmp_path):
+    clip = str(tmp_path / "silent.mp4")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=1:size=64x48:rate=10",
+                    "-c:v", "libx264", clip], check=True)
+    info = scraper.probe_file(clip)
+    assert info["audio"] is None
+    assert (info["video"], info["width"], info["height"]) == ("h264", 64, 48)